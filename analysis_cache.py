@@ -0,0 +1,161 @@
+import hashlib
+import json
+import logging
+import os
+import re
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisCache:
+    """LRU-кэш результатов разбора файлов
+
+    Ключ записи - SHA-256 содержимого файла; дополнительно запись можно
+    найти по ``file_unique_id`` Telegram, не скачивая файл повторно.
+    Запись - JSON-совместимый словарь (данные по периодам и готовые
+    отчеты). Память ограничена ``max_bytes`` по размеру сериализованных
+    записей; при ``disk_dir`` записи дублируются на диск и переживают
+    перезапуск, объем диска ограничен ``disk_max_bytes``.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, disk_dir=None, disk_max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._aliases = {}
+        self._total = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def digest(data):
+        """SHA-256 содержимого файла"""
+        return hashlib.sha256(data).hexdigest()
+
+    def resolve(self, file_unique_id):
+        """Возвращает ключ записи по file_unique_id, если файл уже встречался"""
+        if not file_unique_id:
+            return None
+        digest = self._aliases.get(file_unique_id)
+        if digest is None and self.disk_dir:
+            try:
+                with open(self._alias_path(file_unique_id), encoding='utf-8') as f:
+                    digest = f.read().strip() or None
+            except OSError:
+                return None
+        return digest
+
+    def get(self, digest):
+        """Возвращает запись по ключу или None"""
+        entry = self._entries.get(digest)
+        if entry is not None:
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return entry
+
+        entry = self._load(digest)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._store(digest, entry)
+        return entry
+
+    def put(self, digest, entry, file_unique_id=None):
+        """Сохраняет запись и связывает ее с file_unique_id"""
+        self._store(digest, entry)
+        self._save(digest, entry)
+        self.add_alias(digest, file_unique_id)
+
+    def add_alias(self, digest, file_unique_id):
+        if not file_unique_id or self._aliases.get(file_unique_id) == digest:
+            return
+        self._aliases[file_unique_id] = digest
+        if self.disk_dir:
+            try:
+                with open(self._alias_path(file_unique_id), 'w', encoding='utf-8') as f:
+                    f.write(digest)
+            except OSError as e:
+                logger.warning("Не удалось сохранить ссылку на кэш: %s", e)
+
+    def get_report(self, digest, name):
+        """Готовый отчет из записи или None"""
+        entry = self._entries.get(digest)
+        if entry is None:
+            return None
+        return entry.get('reports', {}).get(name)
+
+    def put_report(self, digest, name, report):
+        """Добавляет отчет к существующей записи"""
+        entry = self._entries.get(digest)
+        if entry is None:
+            return
+        entry.setdefault('reports', {})[name] = report
+        self._store(digest, entry)
+        self._save(digest, entry)
+
+    def _store(self, digest, entry):
+        size = len(json.dumps(entry, ensure_ascii=False).encode('utf-8'))
+        self._total += size - self._sizes.get(digest, 0)
+        self._sizes[digest] = size
+        self._entries[digest] = entry
+        self._entries.move_to_end(digest)
+
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            evicted, _ = self._entries.popitem(last=False)
+            self._total -= self._sizes.pop(evicted)
+            for alias in [a for a, d in self._aliases.items() if d == evicted]:
+                del self._aliases[alias]
+
+    def _entry_path(self, digest):
+        return os.path.join(self.disk_dir, f"{digest}.json")
+
+    def _alias_path(self, file_unique_id):
+        safe_id = re.sub(r'[^A-Za-z0-9_-]', '_', file_unique_id)
+        return os.path.join(self.disk_dir, f"{safe_id}.alias")
+
+    def _load(self, digest):
+        if not self.disk_dir or not re.fullmatch(r'[0-9a-f]{64}', digest or ''):
+            return None
+        try:
+            with open(self._entry_path(digest), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save(self, digest, entry):
+        if not self.disk_dir:
+            return
+        path = self._entry_path(digest)
+        try:
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(path + '.tmp', path)
+        except OSError as e:
+            logger.warning("Не удалось сохранить кэш на диск: %s", e)
+            return
+        self._trim_disk()
+
+    def _trim_disk(self):
+        """Удаляет самые старые записи, если кэш на диске превысил лимит"""
+        files = []
+        total = 0
+        for entry in os.scandir(self.disk_dir):
+            if entry.name.endswith('.json'):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        files.sort()
+        while total > self.disk_max_bytes and len(files) > 1:
+            _, size, path = files.pop(0)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
@@ -0,0 +1,160 @@
+import asyncio
+import contextlib
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Очередь задач анализа переполнена"""
+
+
+class JobTimeoutError(Exception):
+    """Задача анализа не уложилась в отведенное время"""
+
+
+class AnalysisPool:
+    """Ограниченный пул процессов для разбора и анализа Excel файлов
+
+    Тяжелая работа (pandas, openpyxl) выполняется в отдельных процессах,
+    поэтому цикл событий бота остается отзывчивым. Одновременно выполняется
+    не более ``workers`` задач, еще не более ``queue_size`` ждут своей
+    очереди; остальные отклоняются с ``QueueFullError``.
+
+    Задача, превысившая ``timeout``, останавливается вместе со всем пулом:
+    процессы завершаются, и пул создается заново. Остальные задачи, которые
+    в этот момент выполнялись, перезапускаются в новом пуле (не более
+    ``retries`` раз) в пределах своего ``timeout``.
+    """
+
+    def __init__(self, workers=2, queue_size=20, timeout=120.0, retries=1):
+        self.workers = max(1, int(workers))
+        self.queue_size = max(0, int(queue_size))
+        self.timeout = float(timeout)
+        self.retries = max(0, int(retries))
+        self._executor = None
+        self._slots = None
+        self._running = 0
+        self._waiting = 0
+        self._warming = None
+
+    @property
+    def running(self):
+        return self._running
+
+    @property
+    def waiting(self):
+        return self._waiting
+
+    def _ensure_started(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            self._slots = asyncio.Semaphore(self.workers)
+
+    def warm_up(self, func, *args):
+        """Выполняет func(*args) в фоновом потоке до запуска процессов пула
+
+        Процессы создаются fork'ом при первой задаче и наследуют модули,
+        уже загруженные основным процессом. Первая задача дожидается
+        окончания func, чтобы процесс не был создан посреди импорта.
+        """
+        self._warming = asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    @contextlib.asynccontextmanager
+    async def job_source(self, upload):
+        """Файл для задач: процессы пула читают его сами - по пути или из содержимого"""
+        yield upload.source
+
+    def queue_position(self):
+        """Позиция, которую займет новая задача (0 - будет выполнена сразу)"""
+        if self._running < self.workers and self._waiting == 0:
+            return 0
+        return self._waiting + 1
+
+    async def submit(self, func, *args, on_queued=None):
+        """Выполняет func(*args) в пуле процессов и возвращает результат
+
+        Если все процессы заняты, вызывает ``on_queued(position)`` до
+        постановки задачи в очередь. Ожидание результата ограничено
+        ``timeout`` секундами от начала выполнения, включая перезапуски; по
+        истечении времени процессы пула завершаются (а с ними и все
+        выполнявшиеся задачи), пул создается заново и поднимается
+        ``JobTimeoutError``: зависший разбор не занимает процесс и слот
+        дольше ``timeout``.
+        """
+        if self._warming is not None:
+            await self._warming
+            self._warming = None
+        self._ensure_started()
+
+        position = self.queue_position()
+        if position > self.queue_size:
+            raise QueueFullError(f"В очереди уже {self._waiting} задач")
+
+        self._waiting += 1
+        try:
+            if position and on_queued is not None:
+                await on_queued(position)
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+
+        self._running += 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        future = None
+        retries = 0
+        try:
+            while True:
+                executor = self._executor
+                future = loop.run_in_executor(executor, func, *args)
+                future.add_done_callback(_discard_result)
+                try:
+                    return await asyncio.wait_for(asyncio.shield(future), deadline - loop.time())
+                except asyncio.TimeoutError:
+                    logger.warning("Задача %s превысила лимит %.0f с", getattr(func, '__name__', func), self.timeout)
+                    self._restart(executor)
+                    raise JobTimeoutError(f"Обработка заняла больше {self.timeout:.0f} с")
+                except BrokenProcessPool:
+                    if executor is self._executor:
+                        # Процесс пула упал (например, из-за нехватки памяти): следующим задачам нужен новый пул
+                        self._restart(executor)
+                        raise
+                    # Пул остановлен из-за зависшей соседней задачи - эта ни при чем: повторяем в том же слоте
+                    if retries >= self.retries:
+                        raise
+                    retries += 1
+        finally:
+            # Слот освобождается, когда процесс действительно закончил задачу
+            if future is None or future.done():
+                self._release()
+            else:
+                future.add_done_callback(lambda _: self._release())
+
+    def _restart(self, executor):
+        """Завершает процессы пула executor и заменяет его новым пулом"""
+        if executor is not self._executor:
+            return
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        # Публичного способа завершить процессы у ProcessPoolExecutor нет
+        for process in list((executor._processes or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _release(self):
+        self._running -= 1
+        self._slots.release()
+
+    def shutdown(self):
+        """Останавливает пул процессов"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def _discard_result(future):
+    # Результат задачи, отброшенной по таймауту или отмене, никто не заберет
+    if not future.cancelled():
+        future.exception()
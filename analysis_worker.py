@@ -0,0 +1,144 @@
+"""Процесс анализа: разбирает файлы из общей очереди задач бота
+
+Бот с JOB_QUEUE_URL только принимает обновления Telegram и ставит задачи
+разбора файлов в очередь; выполняют их эти процессы - на той же машине
+или на других. Процессы не хранят состояния: файл задачи берется из
+очереди, поэтому их можно запускать и останавливать в любом количестве.
+Импортируется только statement_parser, а не bot_full: сессии, кэш и
+метрики бота процессам анализа не нужны.
+По SIGTERM процесс дорабатывает текущую задачу и завершается.
+
+Запуск:
+    JOB_QUEUE_URL=sqlite:///temp_files/jobs.sqlite3 python analysis_worker.py --processes 4
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import tempfile
+import time
+
+import statement_parser
+from job_queue import JobFile, open_job_queue
+from lazy_import import warm_up
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUE_URL = os.environ.get('JOB_QUEUE_URL') or None
+ANALYSIS_WORKERS = int(os.environ.get('ANALYSIS_WORKERS', os.cpu_count() or 1))
+
+# Как часто удалять из очереди забытые задачи и файлы, секунды
+PURGE_INTERVAL = 300
+
+
+def resolve_files(queue, args, directory):
+    """Заменяет JobFile в аргументах задачи путями к локальным копиям файлов
+
+    Возвращает аргументы и список созданных файлов.
+    """
+    resolved, paths = [], []
+    for arg in args:
+        if isinstance(arg, JobFile):
+            data = queue.get_file(arg.key)
+            if data is None:
+                raise FileNotFoundError(f"Файл задачи {arg.key} уже удален из очереди")
+            # openpyxl открывает файл по пути, только если знает его расширение
+            fd, path = tempfile.mkstemp(suffix=f".{arg.format}", dir=directory)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            paths.append(path)
+            arg = path
+        resolved.append(arg)
+    return resolved, paths
+
+
+def run_worker(url, directory="temp_files", wait=1.0):
+    """Берет задачи из очереди и выполняет их, пока процесс не получит SIGTERM или SIGINT"""
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    os.makedirs(directory, exist_ok=True)
+    queue = open_job_queue(url)
+    worker = f"{socket.gethostname()}-{os.getpid()}"
+    purged = time.monotonic()
+    logger.info("Процесс анализа %s ждет задачи", worker)
+    try:
+        while not stopping:
+            if time.monotonic() - purged > PURGE_INTERVAL:
+                queue.purge()
+                purged = time.monotonic()
+
+            job = queue.claim(worker, wait)
+            if job is None:
+                continue
+
+            started = time.perf_counter()
+            paths = []
+            try:
+                func = statement_parser.JOB_FUNCTIONS.get(job.func)
+                if func is None:
+                    raise LookupError(f"Неизвестная задача {job.func}")
+                args, paths = resolve_files(queue, job.args, directory)
+                result = func(*args)
+            except Exception as e:
+                logger.exception("Задача %s #%s завершилась ошибкой", job.func, job.id)
+                queue.fail(job.id, e)
+            else:
+                queue.complete(job.id, result)
+                logger.info("Задача %s #%s выполнена за %.0f мс", job.func, job.id,
+                            (time.perf_counter() - started) * 1000)
+            finally:
+                for path in paths:
+                    os.remove(path)
+    finally:
+        queue.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--queue-url', default=JOB_QUEUE_URL,
+                        help="адрес очереди задач (по умолчанию JOB_QUEUE_URL)")
+    parser.add_argument('--processes', type=int, default=ANALYSIS_WORKERS,
+                        help="число процессов (по умолчанию ANALYSIS_WORKERS)")
+    args = parser.parse_args()
+    if not args.queue_url:
+        parser.error("не задан адрес очереди задач: --queue-url или JOB_QUEUE_URL")
+
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+
+    # Процессы создаются fork'ом после импорта и получают библиотеки готовыми
+    warm_up(statement_parser.pd, statement_parser.np, statement_parser.openpyxl, statement_parser.xlrd)
+    if args.processes <= 1:
+        run_worker(args.queue_url)
+        return
+
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=run_worker, args=(args.queue_url,)) for _ in range(args.processes)]
+    for process in processes:
+        process.start()
+
+    def forward(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    print(f"⚙️ Процессов анализа: {args.processes}, очередь задач: {args.queue_url}")
+    for process in processes:
+        process.join()
+
+
+if __name__ == '__main__':
+    main()
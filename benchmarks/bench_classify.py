@@ -0,0 +1,160 @@
+"""Точность и скорость классификации названий строк функцией find_balance_item
+
+Точность считается на названиях из synthetic.py и на формулировках из
+реальной отчетности; для сравнения приводится прежний поиск ключевых слов
+подстрокой.
+
+Запуск: python -m benchmarks.bench_classify [--labels 200000] [--check]
+
+С --check бенчмарк работает как регрессионная проверка: завершается с
+ошибкой, если хотя бы одно название классифицировано неверно.
+"""
+import argparse
+import time
+
+from benchmarks.synthetic import EXPECTED_ITEMS, make_balance_sheet
+import statement_parser
+
+# Формулировки из реальных балансов и отчетов о финансовых результатах
+REAL_WORLD_LABELS = {
+    'Баланс (актив)': 'активы всего',
+    'Баланс (пассив)': 'обязательства всего',
+    'БАЛАНС': None,
+    'Итого по разделу I': 'внеоборотные активы',
+    'Итого по разделу II': 'оборотные активы',
+    'Итого по разделу III': 'капитал',
+    'Итого по разделу IV': 'долгосрочные обязательства',
+    'Итого по разделу V': 'краткосрочные обязательства',
+    'Итого внеоборотных активов': 'внеоборотные активы',
+    'Итого оборотных активов': 'оборотные активы',
+    'Нематериальные активы (НМА)': 'нематериальные активы',
+    'Основные средства (нетто)': 'основные средства',
+    'Основные средства, нетто': 'основные средства',
+    'Запасы сырья и материалов': 'запасы',
+    'Запасы, всего': 'запасы',
+    'Запасы готовой продукции': 'запасы',
+    'Товары для перепродажи': None,
+    'Дебиторская задолженность покупателей и заказчиков': 'дебиторская задолженность',
+    'Дебиторская задолженность (краткосрочная)': 'дебиторская задолженность',
+    'Денежные средства и денежные эквиваленты': 'денежные средства',
+    'Касса и расчетные счета': 'денежные средства',
+    'Прочие оборотные активы': None,
+    'Авансы выданные': None,
+    'Расходы будущих периодов': None,
+    'Капитал и резервы': 'капитал',
+    'Итого капитал и резервы': 'капитал',
+    'Собственный капитал, всего': 'капитал',
+    'Уставный (складочный) капитал': 'уставный капитал',
+    'Добавочный капитал': None,
+    'Резервный капитал': None,
+    'Нераспределённая прибыль': 'нераспределенная прибыль',
+    'Нераспределенная прибыль прошлых лет': 'нераспределенная прибыль',
+    'Заемные средства': 'кредиты займы',
+    'Краткосрочные заемные средства': 'кредиты займы',
+    'Долгосрочные кредиты банков': 'кредиты займы',
+    'Итого долгосрочных обязательств': 'долгосрочные обязательства',
+    'Итого краткосрочных обязательств': 'краткосрочные обязательства',
+    'Прочие долгосрочные обязательства': None,
+    'Отложенные налоговые обязательства': None,
+    'Доходы будущих периодов': None,
+    'Кредиторская задолженность поставщикам': 'кредиторская задолженность',
+    'Кредиторская задолженность перед поставщиками и подрядчиками': 'кредиторская задолженность',
+    'Задолженность по налогам': None,
+    'Задолженность перед персоналом': None,
+    'Прочие краткосрочные обязательства': None,
+    'Выручка от продаж': 'выручка',
+    'Выручка (нетто) от реализации': 'выручка',
+    'Выручка от реализации продукции (работ, услуг)': 'выручка',
+    'Себестоимость проданных товаров': 'себестоимость',
+    'Себестоимость реализации': 'себестоимость',
+    'Валовая прибыль (убыток)': 'валовая прибыль',
+    'Валовая маржа': None,
+    'Коммерческие расходы': 'операционные расходы',
+    'Управленческие расходы': 'операционные расходы',
+    'Прибыль (убыток) до налогообложения': 'прибыль до налогообложения',
+    'Прибыль до уплаты налогов': 'прибыль до налогообложения',
+    'Налог на прибыль': None,
+    'Проценты к уплате': 'проценты к уплате',
+    'Прочие доходы': None,
+    'Operating profit': None,
+    'Доходы от продажи основных средств': None,
+    'Амортизация': None,
+    'Чистая прибыль (убыток)': 'чистая прибыль',
+    'Чистая прибыль отчетного периода': 'чистая прибыль',
+    'Cash and cash equivalents': 'денежные средства',
+    'Trade receivables': 'дебиторская задолженность',
+    'Trade payables': 'кредиторская задолженность',
+    'Inventory': 'запасы',
+    'Loans and borrowings': 'кредиты займы',
+    'Total current liabilities': 'краткосрочные обязательства',
+    'Total shareholders equity': 'капитал',
+    'Sales revenue': 'выручка',
+    'Revenue from contracts with customers': 'выручка',
+    'Cost of goods sold': 'себестоимость',
+    'Gross margin': None,
+    'Income tax': None,
+    'Net income': 'чистая прибыль',
+    'Net income attributable to shareholders': 'чистая прибыль',
+    'Net loss': 'чистая прибыль',
+}
+
+
+def classify_keywords(column_name):
+    """Прежняя реализация: первое ключевое слово BALANCE_ITEMS, найденное подстрокой"""
+    column_name = str(column_name).lower().strip()
+    for item, keywords in statement_parser.BALANCE_ITEMS.items():
+        for keyword in keywords:
+            if keyword in column_name:
+                return item
+    return None
+
+
+def accuracy(func, expected):
+    return sum(func(label) == item for label, item in expected.items()) / len(expected)
+
+
+def throughput(func, labels):
+    started = time.perf_counter()
+    result = [func(label) for label in labels]
+    return len(labels) / (time.perf_counter() - started), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--labels', type=int, default=200_000)
+    parser.add_argument('--misses', action='store_true', help="показать ошибочно классифицированные названия")
+    parser.add_argument('--check', action='store_true', help="только проверить точность: ошибка, если есть промахи")
+    args = parser.parse_args()
+
+    index = lambda label: statement_parser.find_balance_item(label, None)  # noqa: E731
+    misses = 0
+    for title, expected in (('синтетические', EXPECTED_ITEMS), ('реальные', REAL_WORLD_LABELS)):
+        print(f"{title:>14}: точность ключевых слов {accuracy(classify_keywords, expected):.0%}, "
+              f"индекса {accuracy(index, expected):.0%} ({len(expected)} названий)")
+        for label, item in expected.items():
+            actual = index(label)
+            if actual != item:
+                misses += 1
+                if args.misses or args.check:
+                    print(f"{'':>16}{label!r}: {actual} вместо {item}")
+    if args.check:
+        if misses:
+            raise SystemExit(f"❌ Неверно классифицировано названий: {misses}")
+        print("✅ Все названия классифицированы верно")
+        return
+
+    sheet = make_balance_sheet(rows=args.labels, periods=1, language='mixed')
+    repeated = list(sheet['Наименование показателя'])
+    # Уникальные названия: кэш не помогает, работает только индекс
+    unique = [f"{label} {idx}" for idx, label in enumerate(repeated)]
+
+    for title, labels in (('уникальные', unique), ('повторяющиеся', repeated)):
+        statement_parser.clear_label_cache()
+        keyword_rate, _ = throughput(classify_keywords, labels)
+        index_rate, _ = throughput(index, labels)
+        print(f"{title:>14}: ключевые слова {keyword_rate:>12,.0f}/с, индекс {index_rate:>12,.0f}/с "
+              f"({1e6 / index_rate:.1f} мкс на название)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Сравнение построчного и векторизованного извлечения данных по периодам
+
+Запуск: python -m benchmarks.bench_extract [--rows 10000] [--periods 3] [--repeat 5]
+"""
+import argparse
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import make_balance_sheet
+import statement_parser
+
+
+def extract_rowwise(df, periods):
+    """Прежняя построчная реализация extract_financial_data_by_period (эталон)"""
+    financial_data = {}
+    for period in periods:
+        financial_data[period['formatted']] = {}
+
+    indicator_column = None
+    for col in df.columns:
+        if 'наименование' in str(col).lower() or 'показатель' in str(col).lower():
+            indicator_column = col
+            break
+
+    if not indicator_column:
+        return financial_data
+
+    for row_idx in range(len(df)):
+        indicator_name = str(df[indicator_column].iloc[row_idx]).strip()
+        if not indicator_name or indicator_name in ['Актив', 'Пассив', 'Наименование показателя']:
+            continue
+
+        item = statement_parser.find_balance_item(indicator_name, [indicator_name])
+        if item:
+            for period in periods:
+                try:
+                    value = pd.to_numeric(df[period['column']].iloc[row_idx], errors='coerce')
+                    if not pd.isna(value) and value != 0:
+                        financial_data[period['formatted']][item] = value
+                except Exception:
+                    continue
+
+    return financial_data
+
+
+def best_of(func, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10_000)
+    parser.add_argument('--periods', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    df = make_balance_sheet(rows=args.rows, periods=args.periods)
+    periods = statement_parser.detect_periods(df)
+
+    rowwise_time, expected = best_of(lambda: extract_rowwise(df, periods), max(1, args.repeat // 2))
+    vector_time, actual = best_of(lambda: statement_parser.extract_financial_data_by_period(df, periods), args.repeat)
+
+    if actual != expected or [list(d) for d in actual.values()] != [list(d) for d in expected.values()]:
+        raise SystemExit("❌ Результаты построчной и векторизованной версий различаются")
+
+    print(f"Строк: {args.rows}, периодов: {len(periods)}")
+    print(f"Построчно:        {rowwise_time * 1000:10.1f} мс")
+    print(f"Векторизованно:   {vector_time * 1000:10.1f} мс")
+    print(f"Ускорение:        {rowwise_time / vector_time:10.1f}x")
+
+
+if __name__ == '__main__':
+    main()
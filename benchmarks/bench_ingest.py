@@ -0,0 +1,58 @@
+"""Время и пиковая память чтения .xlsx: pd.read_excel против потокового openpyxl
+
+Запуск: python -m benchmarks.bench_ingest [--rows 50000] [--extra-columns 8]
+"""
+import argparse
+import time
+import tracemalloc
+
+from benchmarks.synthetic import make_workbook_bytes
+import statement_parser
+from uploads import XLSX
+
+
+def pandas_path(file_bytes):
+    df = statement_parser.read_excel_file(file_bytes, XLSX)
+    periods = statement_parser.detect_periods(df)
+    return statement_parser.extract_financial_data_by_period(df, periods)
+
+
+def streaming_path(file_bytes):
+    df = statement_parser.read_excel_streaming(file_bytes)
+    periods = statement_parser.detect_periods(df)
+    return statement_parser.extract_financial_data_by_period(df, periods)
+
+
+def measure(func, file_bytes):
+    started = time.perf_counter()
+    result = func(file_bytes)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    func(file_bytes)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50_000)
+    parser.add_argument('--periods', type=int, default=3)
+    parser.add_argument('--extra-columns', type=int, default=8)
+    args = parser.parse_args()
+
+    file_bytes = make_workbook_bytes(rows=args.rows, periods=args.periods, extra_columns=args.extra_columns)
+    print(f"Файл: {len(file_bytes) / 1024 / 1024:.1f} МБ, строк: {args.rows}")
+
+    pandas_time, pandas_peak, expected = measure(pandas_path, file_bytes)
+    stream_time, stream_peak, actual = measure(streaming_path, file_bytes)
+    if actual != expected:
+        raise SystemExit("❌ Результаты потокового чтения и pandas различаются")
+
+    print(f"pandas:    {pandas_time:8.2f} с, пик памяти {pandas_peak / 1024 / 1024:8.1f} МБ")
+    print(f"потоково:  {stream_time:8.2f} с, пик памяти {stream_peak / 1024 / 1024:8.1f} МБ")
+
+
+if __name__ == '__main__':
+    main()
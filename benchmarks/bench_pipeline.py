@@ -0,0 +1,204 @@
+"""Бенчмарк всех этапов разбора и анализа отчетности
+
+Генерирует синтетическую отчетность, замеряет каждый этап и сохраняет
+результаты в JSON, чтобы сравнивать их между коммитами.
+
+Запуск:
+    python -m benchmarks.bench_pipeline --rows 5000 --periods 4 --output bench.json
+    python -m benchmarks.bench_pipeline --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', 'benchmark')
+
+import bot_full  # noqa: E402
+import statement_parser  # noqa: E402
+from benchmarks.synthetic import make_workbook_bytes  # noqa: E402
+from uploads import XLSX  # noqa: E402
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run_stage(func, repeat, units, setup=None):
+    """Замеряет func: задержки по повторам, пропускную способность и пик памяти"""
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    p50 = statistics.median(timings)
+    return {
+        'repeat': repeat,
+        'units': units,
+        'p50_ms': p50 * 1000,
+        'p95_ms': percentile(timings, 0.95) * 1000,
+        'mean_ms': statistics.fmean(timings) * 1000,
+        'throughput': units / p50 if p50 else None,
+        'peak_memory_mb': peak / 1024 / 1024,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(args):
+    file_bytes = make_workbook_bytes(
+        rows=args.rows, periods=args.periods, noise=args.noise, language=args.language, seed=args.seed
+    )
+    df = statement_parser.read_excel_file(file_bytes, XLSX)
+    periods = statement_parser.detect_periods(df)
+    labels = [str(label) for label in df[df.columns[0]]]
+    periods_data = statement_parser.extract_financial_data_by_period(df, periods)
+    analysis = bot_full.analyze_periods(periods_data)
+    companies = {f"Компания {idx + 1}": analysis for idx in range(args.companies)}
+    engine = bot_full.ratio_engine
+    stacked = engine.stack([bot_full.analysis_matrix(analysis)] * args.companies)
+    repeat = args.repeat
+
+    clear_label_cache = statement_parser.clear_label_cache
+    clear_period_cache = statement_parser.parse_period_header.cache_clear
+
+    stages = {
+        'read_excel_file': run_stage(
+            lambda: statement_parser.read_excel_file(file_bytes, XLSX), max(1, repeat // 5), args.rows
+        ),
+        'read_excel_streaming': run_stage(
+            lambda: statement_parser.read_excel_streaming(file_bytes), max(1, repeat // 5), args.rows
+        ),
+        'find_data_sheets': run_stage(
+            lambda: statement_parser.find_data_sheets(file_bytes, XLSX), repeat, 1
+        ),
+        'detect_periods': run_stage(
+            lambda: statement_parser.detect_periods(df), repeat, len(df.columns), setup=clear_period_cache
+        ),
+        'find_balance_item': run_stage(
+            lambda: [statement_parser.find_balance_item(label, None) for label in labels],
+            repeat, len(labels), setup=clear_label_cache
+        ),
+        'find_balance_item_cached': run_stage(
+            lambda: [statement_parser.find_balance_item(label, None) for label in labels], repeat, len(labels)
+        ),
+        'extract_financial_data_by_period': run_stage(
+            lambda: statement_parser.extract_financial_data_by_period(df, periods), repeat, args.rows,
+            setup=clear_label_cache
+        ),
+        'calculate_financial_ratios_for_period': run_stage(
+            lambda: [bot_full.calculate_financial_ratios_for_period(data) for data in periods_data.values()],
+            repeat * 10, len(periods_data)
+        ),
+        'analyze_periods': run_stage(
+            lambda: bot_full.analyze_periods(periods_data), repeat * 10, len(periods_data)
+        ),
+        'ratio_engine_companies': run_stage(
+            lambda: (engine.compute(stacked), engine.changes(stacked)), repeat * 10,
+            args.companies * len(periods_data)
+        ),
+        'generate_period_analysis_report': run_stage(
+            lambda: bot_full.generate_period_analysis_report(analysis), repeat * 10, 1
+        ),
+        'generate_liquidity_analysis_report': run_stage(
+            lambda: bot_full.generate_liquidity_analysis_report(analysis), repeat * 10, 1
+        ),
+        'generate_batch_comparison_report': run_stage(
+            lambda: bot_full.generate_batch_comparison_report(companies), repeat, len(companies)
+        ),
+    }
+
+    return {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'params': {
+            'rows': args.rows, 'periods': args.periods, 'noise': args.noise,
+            'language': args.language, 'seed': args.seed, 'repeat': args.repeat,
+            'companies': args.companies, 'file_mb': len(file_bytes) / 1024 / 1024,
+        },
+        'stages': stages,
+    }
+
+
+def print_results(results, baseline=None, threshold=0.1):
+    """Печатает таблицу этапов; с baseline - изменение p50 и регрессии сверх threshold"""
+    print(f"Коммит {results['commit']}, строк {results['params']['rows']}, "
+          f"периодов {results['params']['periods']}, файл {results['params']['file_mb']:.1f} МБ")
+    header = f"{'этап':<40}{'p50, мс':>11}{'p95, мс':>11}{'ед./с':>14}{'память, МБ':>12}"
+    if baseline:
+        header += f"{'Δ p50':>10}"
+    print(header)
+
+    regressions = []
+    for name, stage in results['stages'].items():
+        line = (f"{name:<40}{stage['p50_ms']:>11.2f}{stage['p95_ms']:>11.2f}"
+                f"{stage['throughput'] or 0:>14,.0f}{stage['peak_memory_mb']:>12.2f}")
+        previous = (baseline or {}).get('stages', {}).get(name)
+        if previous and previous['p50_ms']:
+            change = stage['p50_ms'] / previous['p50_ms'] - 1
+            line += f"{change:>+10.0%}"
+            if change > threshold:
+                regressions.append(name)
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--periods', type=int, default=4)
+    parser.add_argument('--noise', type=float, default=0.3, help="доля нераспознаваемых строк")
+    parser.add_argument('--language', choices=['ru', 'en', 'mixed'], default='mixed')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--companies', type=int, default=20, help="компаний в сводном отчете")
+    parser.add_argument('--output', help="сохранить результаты в JSON")
+    parser.add_argument('--compare', help="JSON с предыдущими результатами для сравнения")
+    parser.add_argument('--threshold', type=float, default=0.1, help="допустимое замедление p50")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+    regressions = print_results(results, baseline, args.threshold)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"💾 Результаты сохранены в {args.output}")
+
+    if regressions:
+        print(f"⚠️ Замедление больше {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""Нагрузочный тест распределенного анализа: бот, очередь задач и N процессов analysis_worker.py
+
+Бот запускается с JOB_QUEUE_URL против локальной заглушки Bot API
+(tools/fake_telegram.py), рядом - процессы анализа. Заглушка присылает
+файлы сразу из многих чатов; замеряются пропускная способность (файлов в
+секунду) и задержка от отправки файла до результата при разном числе
+процессов анализа. Для сравнения тот же тест прогоняется со встроенным
+пулом процессов бота (--baseline).
+
+Запуск:
+    python -m benchmarks.bench_queue --workers 1,2,4 --files 40 --output queue.json
+    python -m benchmarks.bench_queue --queue-url redis://localhost:6379/1
+"""
+import argparse
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_startup import ROOT, bot_env
+from benchmarks.synthetic import make_workbook_bytes
+from tools.fake_telegram import FakeTelegram
+
+# Ответы бота, которыми заканчивается обработка файла
+RESULT_PREFIXES = ('✅', '❌', '⏳ Сервер перегружен')
+
+
+def wait_result(fake, chat_id, timeout):
+    """Время ответа бота с результатом анализа файла (perf_counter) или None"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        for reply in fake.replies(chat_id):
+            if (reply.get('text') or '').startswith(RESULT_PREFIXES):
+                return reply['time'], reply['text']
+        fake.wait_replies(chat_id, len(fake.replies(chat_id)) + 1, min(1.0, deadline - time.monotonic()))
+    return None, None
+
+
+def stop(process):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(60)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def measure_run(workdir, workbooks, workers, queue_url, timeout):
+    """Прогон: все файлы отправляются разом из разных чатов; возвращает статистику прогона"""
+    fake = FakeTelegram(port=0).start()
+    extra = {
+        'TELEGRAM_API_BASE_URL': fake.base_url,
+        'ANALYSIS_QUEUE_SIZE': str(len(workbooks) * 2),
+        'UPDATE_CONCURRENCY': str(max(16, len(workbooks))),
+        # Лимиты отправки Telegram здесь не проверяются и не должны ограничивать замер
+        'SEND_GLOBAL_PER_SECOND': '10000',
+        'SEND_CHAT_PER_SECOND': '10000',
+    }
+    if queue_url:
+        extra['JOB_QUEUE_URL'] = queue_url
+    else:
+        extra['ANALYSIS_WORKERS'] = str(workers)
+    env = bot_env(workdir, **extra)
+
+    processes = [subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'bot_full.py')], cwd=workdir, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )]
+    if queue_url:
+        processes.append(subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, 'analysis_worker.py'), '--processes', str(workers)],
+            cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        ))
+    try:
+        # Прогрев: бот отвечает, процессы анализа импортировали библиотеки
+        fake.send_text(1, '/start')
+        if not fake.wait_replies(1, 1, timeout):
+            raise RuntimeError("бот не ответил на /start")
+        fake.send_document(1, 'warmup.xlsx', make_workbook_bytes(rows=50, periods=2, seed=0))
+        if wait_result(fake, 1, timeout)[0] is None:
+            raise RuntimeError("бот не разобрал файл прогрева")
+
+        chats = range(1000, 1000 + len(workbooks))
+        sent = {chat_id: fake.send_document(chat_id, f"report{chat_id}.xlsx", workbook)
+                for chat_id, workbook in zip(chats, workbooks)}
+        started = min(sent.values())
+        latencies, errors, finished = [], 0, started
+        for chat_id in chats:
+            replied, text = wait_result(fake, chat_id, timeout)
+            if replied is None or not text.startswith('✅'):
+                errors += 1
+                continue
+            latencies.append(replied - sent[chat_id])
+            finished = max(finished, replied)
+    finally:
+        for process in reversed(processes):
+            stop(process)
+        fake.stop()
+
+    elapsed = finished - started
+    latencies.sort()
+    return {
+        'files': len(workbooks),
+        'errors': errors,
+        'files_per_second': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': statistics.median(latencies) * 1000 if latencies else None,
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1] * 1000 if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', default='1,2,4', help="число процессов анализа через запятую")
+    parser.add_argument('--files', type=int, default=40, help="файлов в прогоне (каждый из своего чата)")
+    parser.add_argument('--rows', type=int, default=3000, help="строк в каждом файле")
+    parser.add_argument('--queue-url', help="очередь задач (по умолчанию SQLite во временной папке)")
+    parser.add_argument('--baseline', action='store_true', help="также прогнать встроенный пул процессов бота")
+    parser.add_argument('--timeout', type=float, default=300)
+    parser.add_argument('--output', help="сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    # Разное содержимое: каждый файл разбирается, а не берется из кэша
+    workbooks = [make_workbook_bytes(rows=args.rows, periods=3, seed=seed) for seed in range(1, args.files + 1)]
+    results = {'params': vars(args), 'runs': []}
+    modes = ['queue', 'pool'] if args.baseline else ['queue']
+    for workers in [int(value) for value in args.workers.split(',')]:
+        for mode in modes:
+            with tempfile.TemporaryDirectory() as workdir:
+                queue_url = None
+                if mode == 'queue':
+                    queue_url = args.queue_url or f"sqlite:///{os.path.join(workdir, 'jobs.sqlite3')}"
+                run = measure_run(workdir, workbooks, workers, queue_url, args.timeout)
+            run.update(mode=mode, workers=workers)
+            results['runs'].append(run)
+            print(f"{mode:<6} процессов {workers:>3}: {run['files_per_second']:>6.2f} файлов/с, "
+                  f"p50 {run['p50_ms'] or 0:>7.0f} мс, p95 {run['p95_ms'] or 0:>7.0f} мс, ошибок {run['errors']}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"💾 Результаты сохранены в {args.output}")
+
+
+if __name__ == '__main__':
+    main()
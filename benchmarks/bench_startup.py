@@ -0,0 +1,122 @@
+"""Бенчмарк запуска бота: импорт модуля, первый ответ и первый анализ файла
+
+Бот запускается отдельным процессом против локальной заглушки Bot API
+(tools/fake_telegram.py). Замеряется время от запуска процесса до ответа
+на /start и время анализа первого загруженного файла - с фоновым
+прогревом библиотек (LAZY_WARMUP=1) и без него.
+
+Запуск:
+    python -m benchmarks.bench_startup --repeat 5 --output startup.json
+"""
+import argparse
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import make_workbook_bytes
+from tools.fake_telegram import FakeTelegram
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_SCRIPT = (
+    "import time; started = time.perf_counter(); import bot_full; "
+    "print(time.perf_counter() - started)"
+)
+
+
+def bot_env(workdir, **extra):
+    env = dict(os.environ)
+    env.update({
+        'PYTHONPATH': ROOT,
+        'TELEGRAM_BOT_TOKEN': '123:benchmark',
+        'METRICS_PORT': '0',
+        'SESSION_DB_PATH': os.path.join(workdir, 'sessions.sqlite3'),
+    })
+    env.update(extra)
+    return env
+
+
+def measure_import(workdir):
+    """Время импорта bot_full в чистом процессе, секунды"""
+    output = subprocess.run(
+        [sys.executable, '-c', IMPORT_SCRIPT], cwd=workdir, env=bot_env(workdir),
+        check=True, capture_output=True, text=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def measure_run(workdir, workbook, warmup, upload_after, timeout):
+    """Запускает бота и возвращает (до первого ответа, анализ первого файла), секунды"""
+    fake = FakeTelegram(port=0).start()
+    env = bot_env(workdir, TELEGRAM_API_BASE_URL=fake.base_url, LAZY_WARMUP='1' if warmup else '0')
+    started = time.perf_counter()
+    bot = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'bot_full.py')], cwd=workdir, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        fake.send_text(1, '/start')
+        replies = fake.wait_replies(1, 1, timeout)
+        if not replies:
+            raise RuntimeError("бот не ответил на /start")
+        first_response = replies[0]['time'] - started
+
+        time.sleep(upload_after)
+        sent_at = fake.send_document(1, 'report.xlsx', workbook)
+        # "Анализирую структуру файла..." и результат анализа
+        replies = fake.wait_replies(1, 3, timeout)
+        if len(replies) < 3:
+            raise RuntimeError("бот не прислал результат анализа")
+        first_upload = replies[2]['time'] - sent_at
+        return first_response, first_upload
+    finally:
+        bot.send_signal(signal.SIGTERM)
+        try:
+            bot.wait(30)
+        except subprocess.TimeoutExpired:
+            bot.kill()
+        fake.stop()
+
+
+def summarize(values):
+    return {'p50_ms': statistics.median(values) * 1000, 'max_ms': max(values) * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--rows', type=int, default=500, help="строк в загружаемом файле")
+    parser.add_argument('--upload-after', type=float, default=0.0,
+                        help="пауза между ответом на /start и загрузкой файла, секунды")
+    parser.add_argument('--timeout', type=float, default=120)
+    parser.add_argument('--output', help="сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    workbook = make_workbook_bytes(rows=args.rows, periods=3)
+    results = {'params': vars(args), 'stages': {}}
+    with tempfile.TemporaryDirectory() as workdir:
+        imports = [measure_import(workdir) for _ in range(args.repeat)]
+        results['stages']['import'] = summarize(imports)
+        for warmup in (True, False):
+            runs = [measure_run(workdir, workbook, warmup, args.upload_after, args.timeout)
+                    for _ in range(args.repeat)]
+            label = 'warmup' if warmup else 'on_demand'
+            results['stages'][f'first_response_{label}'] = summarize([run[0] for run in runs])
+            results['stages'][f'first_upload_{label}'] = summarize([run[1] for run in runs])
+
+    print(f"{'Этап':<30} {'p50, мс':>10} {'max, мс':>10}")
+    for name, stage in results['stages'].items():
+        print(f"{name:<30} {stage['p50_ms']:>10.0f} {stage['max_ms']:>10.0f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"💾 Результаты сохранены в {args.output}")
+
+
+if __name__ == '__main__':
+    main()
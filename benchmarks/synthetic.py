@@ -0,0 +1,110 @@
+"""Генератор синтетической бухгалтерской отчетности для бенчмарков"""
+import io
+import random
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+RU_LABELS = [
+    'Основные средства', 'Нематериальные активы', 'Итого внеоборотные активы',
+    'Запасы', 'Дебиторская задолженность', 'Денежные средства и денежные эквиваленты',
+    'Итого оборотные активы', 'Баланс актив', 'Уставный капитал',
+    'Нераспределенная прибыль (непокрытый убыток)', 'Итого капитал',
+    'Долгосрочные заемные средства', 'Краткосрочные обязательства',
+    'Кредиторская задолженность', 'Баланс пассив', 'Выручка',
+    'Себестоимость продаж', 'Валовая прибыль (убыток)', 'Коммерческие расходы',
+    'Прибыль до налогообложения', 'Чистая прибыль (убыток)',
+]
+
+EN_LABELS = [
+    'Property plant and equipment', 'Intangible assets', 'Total non-current assets',
+    'Inventories', 'Accounts receivable', 'Cash and equivalents', 'Total current assets',
+    'Total assets', 'Share capital', 'Retained earnings', 'Total equity',
+    'Long-term liabilities', 'Current liabilities', 'Accounts payable',
+    'Total liabilities', 'Revenue', 'Cost of sales', 'Gross profit',
+    'Operating expenses', 'Profit before tax', 'Net profit',
+]
+
+# Строки, которые не должны распознаваться как статьи баланса
+NOISE_LABELS = [
+    'Прочие внеоборотные', 'Финансовые вложения', 'НДС по приобретенным ценностям',
+    'Отложенные налоговые активы', 'Резервный фонд', 'Оценочные обязательства',
+    'Прочие доходы', 'Прочие расходы', 'Текущий налог на прибыль', 'Other items',
+    'Deferred tax', 'Provisions',
+]
+
+# Статьи, к которым должны относиться названия (NOISE_LABELS - ни к какой)
+EXPECTED_ITEMS = {
+    **dict(zip(RU_LABELS, [
+        'основные средства', 'нематериальные активы', 'внеоборотные активы',
+        'запасы', 'дебиторская задолженность', 'денежные средства',
+        'оборотные активы', 'активы всего', 'уставный капитал',
+        'нераспределенная прибыль', 'капитал',
+        'кредиты займы', 'краткосрочные обязательства',
+        'кредиторская задолженность', 'обязательства всего', 'выручка',
+        'себестоимость', 'валовая прибыль', 'операционные расходы',
+        'прибыль до налогообложения', 'чистая прибыль',
+    ])),
+    **dict(zip(EN_LABELS, [
+        'основные средства', 'нематериальные активы', 'внеоборотные активы',
+        'запасы', 'дебиторская задолженность', 'денежные средства', 'оборотные активы',
+        'активы всего', 'уставный капитал', 'нераспределенная прибыль', 'капитал',
+        'долгосрочные обязательства', 'краткосрочные обязательства', 'кредиторская задолженность',
+        'обязательства всего', 'выручка', 'себестоимость', 'валовая прибыль',
+        'операционные расходы', 'прибыль до налогообложения', 'чистая прибыль',
+    ])),
+    **{label: None for label in NOISE_LABELS},
+}
+
+
+def make_balance_sheet(rows=10_000, periods=3, noise=0.3, language='ru', seed=42, start_year=2020, extra_columns=0):
+    """Строит DataFrame отчетности: столбец показателей и столбцы периодов
+
+    rows - число строк, periods - число годовых столбцов, noise - доля
+    нераспознаваемых строк, language - 'ru', 'en' или 'mixed',
+    extra_columns - число лишних текстовых столбцов (коды, примечания).
+    """
+    rng = random.Random(seed)
+    if language == 'ru':
+        labels = RU_LABELS
+    elif language == 'en':
+        labels = EN_LABELS
+    else:
+        labels = RU_LABELS + EN_LABELS
+
+    indicator = []
+    for _ in range(rows):
+        if rng.random() < noise:
+            label = rng.choice(NOISE_LABELS)
+        else:
+            label = rng.choice(labels)
+        # Случайный регистр и пробелы, как в реальных выгрузках
+        if rng.random() < 0.2:
+            label = label.upper()
+        if rng.random() < 0.1:
+            label = f"  {label} "
+        indicator.append(label)
+
+    np_rng = np.random.default_rng(seed)
+    data = {'Наименование показателя': indicator}
+    for offset in range(periods):
+        year = start_year + offset
+        values = np_rng.integers(0, 10_000_000, size=rows).astype(object)
+        # Пропуски и текстовые значения
+        values[np_rng.random(rows) < 0.05] = None
+        values[np_rng.random(rows) < 0.02] = '-'
+        data[date(year, 12, 31).strftime('%d.%m.%Y')] = values
+
+    for idx in range(extra_columns):
+        data[f'Примечание {idx + 1}'] = [f'комментарий {row} / {idx}' for row in range(rows)]
+
+    return pd.DataFrame(data)
+
+
+def make_workbook_bytes(rows=10_000, periods=3, noise=0.3, language='ru', seed=42, extra_columns=0):
+    """Возвращает синтетическую отчетность в виде содержимого .xlsx файла"""
+    df = make_balance_sheet(rows, periods, noise, language, seed, extra_columns=extra_columns)
+    buffer = io.BytesIO()
+    df.to_excel(buffer, index=False, engine='openpyxl')
+    return buffer.getvalue()
@@ -1,14 +1,41 @@
 import os
 import logging
 import asyncio
-import pandas as pd
-import io
-import numpy as np
 from datetime import datetime
-import re
 import json
-from telegram import Update, ReplyKeyboardMarkup, KeyboardButton
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, ConversationHandler
+import math
+import time
+import warnings
+import zipfile
+from itertools import chain
+from dataclasses import dataclass, asdict
+from telegram import Update, ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import (
+    Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes, ConversationHandler
+)
+from telegram.warnings import PTBUserWarning
+
+from analysis_cache import AnalysisCache
+from analysis_pool import AnalysisPool, QueueFullError, JobTimeoutError
+from forecast import TrendModels, MODEL_NAMES, fit_trends
+from industry_standards import IndustryStandards, BELOW, WITHIN, ABOVE
+from job_queue import QueueAnalysisPool
+from lazy_import import lazy_module, warm_up
+from metrics import Metrics
+from report_export import export_txt, export_xlsx
+from ratio_engine import Ratio, RatioEngine
+from send_queue import ChatRateLimiter, split_message
+from session_store import SessionStore
+from statement_parser import BALANCE_ITEMS, merge_periods_data, month_end, parse_sheet, plan_workbook
+from update_processor import PerChatUpdateProcessor
+from uploads import FileTooLargeError, Upload, download_spooled, download_upload
+
+# Тяжелые библиотеки импортируются при первом использовании (или фоновым
+# прогревом после запуска), чтобы бот начинал отвечать сразу
+pd = lazy_module('pandas')
+np = lazy_module('numpy')
+xlrd = lazy_module('xlrd')
+openpyxl = lazy_module('openpyxl')
 
 # Настройка логирования
 logging.basicConfig(
@@ -19,50 +46,105 @@ logging.basicConfig(
 # Получаем токен из переменных окружения
 TELEGRAM_BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN')
 
-if not TELEGRAM_BOT_TOKEN:
-    print("❌ ОШИБКА: TELEGRAM_BOT_TOKEN не установлен!")
-    exit(1)
+# Режим работы: polling (по умолчанию) или webhook
+BOT_MODE = os.environ.get('BOT_MODE', 'polling').lower()
+WEBHOOK_URL = os.environ.get('WEBHOOK_URL', '')
+WEBHOOK_LISTEN = os.environ.get('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.environ.get('WEBHOOK_PORT', os.environ.get('PORT', 8443)))
+WEBHOOK_PATH = os.environ.get('WEBHOOK_PATH', 'telegram')
+WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET') or None
+WEBHOOK_MAX_CONNECTIONS = int(os.environ.get('WEBHOOK_MAX_CONNECTIONS', 40))
+
+# Сколько обновлений обрабатывать одновременно (обновления одного чата - всегда по очереди)
+# и сколько всего обновлений может ждать обработки
+UPDATE_CONCURRENCY = int(os.environ.get('UPDATE_CONCURRENCY', 16))
+UPDATE_MAX_PENDING = int(os.environ.get('UPDATE_MAX_PENDING', 1024))
+
+# Адрес Bot API (для локальной заглушки tools/fake_telegram.py)
+TELEGRAM_API_BASE_URL = os.environ.get('TELEGRAM_API_BASE_URL', '').rstrip('/')
 
-print("✅ Токен успешно загружен!")
-print("🚀 БУХГАЛТЕРСКИЙ АНАЛИЗАТОР ЗАПУЩЕН...")
+# Импортировать pandas/numpy/openpyxl в фоне сразу после запуска (0 - только по требованию)
+LAZY_WARMUP = os.environ.get('LAZY_WARMUP', '1') == '1'
 
 # Создаем папку для временных файлов
 os.makedirs("temp_files", exist_ok=True)
 
+# Лимиты отправки сообщений Telegram: на бота, на личный чат и на группу
+SEND_GLOBAL_PER_SECOND = float(os.environ.get('SEND_GLOBAL_PER_SECOND', 30))
+SEND_CHAT_PER_SECOND = float(os.environ.get('SEND_CHAT_PER_SECOND', 1))
+SEND_GROUP_PER_MINUTE = float(os.environ.get('SEND_GROUP_PER_MINUTE', 20))
+SEND_BURST = int(os.environ.get('SEND_BURST', 3))
+SEND_MAX_RETRIES = int(os.environ.get('SEND_MAX_RETRIES', 3))
+
+# Пул процессов для разбора Excel файлов
+ANALYSIS_WORKERS = int(os.environ.get('ANALYSIS_WORKERS', os.cpu_count() or 1))
+ANALYSIS_QUEUE_SIZE = int(os.environ.get('ANALYSIS_QUEUE_SIZE', 20))
+ANALYSIS_JOB_TIMEOUT = float(os.environ.get('ANALYSIS_JOB_TIMEOUT', 120))
+
+# Распределенный анализ: общая очередь задач (sqlite:///путь или redis://хост:порт/база),
+# которую разбирают процессы analysis_worker.py; без очереди бот разбирает файлы сам
+JOB_QUEUE_URL = os.environ.get('JOB_QUEUE_URL') or None
+JOB_POLL_SECONDS = float(os.environ.get('JOB_POLL_SECONDS', 0.2))
+
+if JOB_QUEUE_URL:
+    analysis_pool = QueueAnalysisPool(JOB_QUEUE_URL, ANALYSIS_QUEUE_SIZE, ANALYSIS_JOB_TIMEOUT, JOB_POLL_SECONDS)
+else:
+    analysis_pool = AnalysisPool(ANALYSIS_WORKERS, ANALYSIS_QUEUE_SIZE, ANALYSIS_JOB_TIMEOUT)
+update_processor = PerChatUpdateProcessor(UPDATE_CONCURRENCY, UPDATE_MAX_PENDING)
+metrics = Metrics()
+rate_limiter = ChatRateLimiter(
+    global_rate=SEND_GLOBAL_PER_SECOND,
+    chat_rate=SEND_CHAT_PER_SECOND,
+    group_rate=SEND_GROUP_PER_MINUTE / 60,
+    burst=SEND_BURST,
+    max_retries=SEND_MAX_RETRIES
+)
+
+# Загрузка файлов: предельный размер (проверяется до скачивания) и сколько архива держать в памяти
+UPLOAD_MAX_MB = float(os.environ.get('UPLOAD_MAX_MB', 20))
+UPLOAD_SPOOL_MB = int(os.environ.get('UPLOAD_SPOOL_MB', 8))
+
+# Пакетная загрузка: пауза для сбора групп документов, лимиты пакета и сколько
+# файлов пакетов разбирать одновременно (остальные ждут, а не получают отказ пула)
+BATCH_COLLECT_SECONDS = float(os.environ.get('BATCH_COLLECT_SECONDS', 1.5))
+BATCH_MAX_FILES = int(os.environ.get('BATCH_MAX_FILES', 50))
+BATCH_MAX_UNZIPPED_MB = int(os.environ.get('BATCH_MAX_UNZIPPED_MB', 200))
+BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', ANALYSIS_WORKERS))
+
+# Сессии пользователей: файл SQLite, срок хранения, лимит на пользователя, число сессий в памяти
+SESSION_DB_PATH = os.environ.get('SESSION_DB_PATH', os.path.join("temp_files", "sessions.sqlite3"))
+SESSION_TTL_HOURS = float(os.environ.get('SESSION_TTL_HOURS', 168))
+SESSION_MAX_KB = int(os.environ.get('SESSION_MAX_KB', 1024))
+SESSION_HOT_LIMIT = int(os.environ.get('SESSION_HOT_LIMIT', 2000))
+
+# HTTP-порт метрик Prometheus (/metrics); 0 - не запускать
+METRICS_HOST = os.environ.get('METRICS_HOST', '0.0.0.0')
+METRICS_PORT = int(os.environ.get('METRICS_PORT', 9091))
+
+# Горизонт прогноза тенденций, периодов
+FORECAST_HORIZON = int(os.environ.get('FORECAST_HORIZON', 3))
+
+# Экспорт отчетов: файл до этого размера собирается в памяти, больший - во временном файле
+EXPORT_SPOOL_MB = int(os.environ.get('EXPORT_SPOOL_MB', 8))
+
+# Файл отраслевых нормативов (JSON или CSV), дополняет встроенные; перечитывается при изменении
+INDUSTRY_STANDARDS_PATH = os.environ.get('INDUSTRY_STANDARDS_PATH') or None
+INDUSTRY_RELOAD_SECONDS = float(os.environ.get('INDUSTRY_RELOAD_SECONDS', 30))
+
+# Кэш разобранных файлов и готовых отчетов (в памяти и, по желанию, на диске)
+ANALYSIS_CACHE_MB = int(os.environ.get('ANALYSIS_CACHE_MB', 64))
+ANALYSIS_CACHE_DISK = os.environ.get('ANALYSIS_CACHE_DISK', '0') == '1'
+ANALYSIS_CACHE_DISK_MB = int(os.environ.get('ANALYSIS_CACHE_DISK_MB', 512))
+
+analysis_cache = AnalysisCache(
+    max_bytes=ANALYSIS_CACHE_MB * 1024 * 1024,
+    disk_dir=os.path.join("temp_files", "cache") if ANALYSIS_CACHE_DISK else None,
+    disk_max_bytes=ANALYSIS_CACHE_DISK_MB * 1024 * 1024
+)
+
 # Состояния для ConversationHandler
 SELECT_INDICATORS, SELECT_INDUSTRY = range(2)
 
-# Словари и константы из вашего оригинального кода
-BALANCE_ITEMS = {
-    # АКТИВЫ
-    'внеоборотные активы': ['внеоборотные', 'non-current', 'основные средства', 'нематериальные', 'нма'],
-    'основные средства': ['основные средства', 'fixed assets', 'property plant', 'основной', 'ося'],
-    'нематериальные активы': ['нематериальные', 'intangible', 'нма'],
-    'запасы': ['запасы', 'inventories', 'inventory', 'товарно-материальные', 'тмц'],
-    'дебиторская задолженность': ['дебиторская', 'accounts receivable', 'receivables', 'дебитор'],
-    'денежные средства': ['денежные средства', 'cash', 'cash and equivalents', 'деньги', 'касса', 'расчетный счет'],
-    'оборотные активы': ['оборотные активы', 'current assets', 'оборотные'],
-    'активы всего': ['активы', 'актив всего', 'total assets', 'итого активы', 'баланс актив'],
-    
-    # ПАССИВЫ
-    'капитал': ['капитал', 'собственный капитал', 'equity', 'share capital', 'уставный'],
-    'уставный капитал': ['уставный капитал', 'authorized capital', 'уставной'],
-    'нераспределенная прибыль': ['нераспределенная прибыль', 'retained earnings', 'прибыль отчетного года'],
-    'долгосрочные обязательства': ['долгосрочные обязательства', 'long-term liabilities', 'долгосрочные'],
-    'краткосрочные обязательства': ['краткосрочные обязательства', 'short-term liabilities', 'current liabilities', 'краткосрочные'],
-    'кредиты займы': ['кредиты', 'займы', 'loans', 'borrowings', 'кредит'],
-    'кредиторская задолженность': ['кредиторская задолженность', 'accounts payable', 'кредиторская'],
-    'обязательства всего': ['обязательства', 'пассив всего', 'total liabilities', 'итого пассивы', 'баланс пассив'],
-    
-    # ОФР
-    'выручка': ['выручка', 'revenue', 'sales', 'доход', 'объем продаж'],
-    'себестоимость': ['себестоимость', 'cost of sales', 'cost', 'себестоимость продаж'],
-    'валовая прибыль': ['валовая прибыль', 'убыток', 'gross profit', 'прибыль валовая'],
-    'операционные расходы': ['операционные расходы', 'operating expenses', 'коммерческие расходы', 'управленческие расходы'],
-    'прибыль до налогообложения': ['прибыль до налогообложения', 'profit before tax', 'прибыль до налога'],
-    'чистая прибыль': ['чистая прибыль', 'net profit', 'net income', 'прибыль чистая']
-}
-
 INDUSTRY_STANDARDS = {
     'retail': {
         'name': 'Розничная торговля',
@@ -99,6 +181,45 @@ INDUSTRY_STANDARDS = {
     }
 }
 
+# Коэффициенты: числитель / знаменатель (× 100 для процентов), если знаменатель больше нуля
+FINANCIAL_RATIOS = [
+    # 1. КОЭФФИЦИЕНТЫ ЛИКВИДНОСТИ
+    Ratio('Коэффициент текущей ликвидности', 'оборотные активы', 'краткосрочные обязательства'),
+    Ratio('Коэффициент абсолютной ликвидности', 'денежные средства', 'краткосрочные обязательства'),
+    # 2. РЕНТАБЕЛЬНОСТЬ
+    Ratio('Рентабельность активов (ROA)', 'чистая прибыль', 'активы всего', 100),
+    Ratio('Рентабельность капитала (ROE)', 'чистая прибыль', 'капитал', 100),
+    Ratio('Рентабельность продаж (ROS)', 'чистая прибыль', 'выручка', 100),
+    Ratio('Рентабельность по EBIT', 'ebit', 'выручка', 100),
+    Ratio('Рентабельность среднего капитала (ROE)', 'чистая прибыль', 'капитал', 100, average=True),
+    Ratio('Рентабельность средних активов (ROA)', 'чистая прибыль', 'активы всего', 100, average=True),
+    # 3. ФИНАНСОВАЯ УСТОЙЧИВОСТЬ
+    Ratio('Коэффициент автономии', 'капитал', 'активы всего'),
+    Ratio('Финансовый рычаг', 'заемный капитал', 'капитал', higher_is_better=False),
+    Ratio('Соотношение собственного и заемного капитала', 'капитал', 'заемный капитал'),
+    Ratio('Покрытие процентов (ICR)', 'ebit', 'проценты к уплате'),
+    # 4. ДЕЛОВАЯ АКТИВНОСТЬ
+    Ratio('Оборачиваемость активов', 'выручка', 'активы всего'),
+]
+
+# Если нет оборотных активов, но есть их компоненты - рассчитываем;
+# EBIT и заемный капитал в отчетности обычно не приводятся и всегда считаются по составляющим
+RATIO_FALLBACKS = {
+    'оборотные активы': ('денежные средства', 'дебиторская задолженность', 'запасы'),
+    'ebit': ('прибыль до налогообложения', 'проценты к уплате'),
+    'заемный капитал': ('долгосрочные обязательства', 'краткосрочные обязательства'),
+}
+
+# Проценты к уплате (строка 2330) в РСБУ часто приводятся со знаком минус
+ABSOLUTE_ITEMS = ('проценты к уплате',)
+
+ratio_engine = RatioEngine(BALANCE_ITEMS, FINANCIAL_RATIOS, RATIO_FALLBACKS, ABSOLUTE_ITEMS)
+
+industry_standards = IndustryStandards(
+    ratio_engine.names, INDUSTRY_STANDARDS,
+    path=INDUSTRY_STANDARDS_PATH, reload_interval=INDUSTRY_RELOAD_SECONDS
+)
+
 INDICATOR_GROUPS = {
     'Выручка и прибыль': ['выручка', 'чистая прибыль', 'валовая прибыль', 'прибыль до налогообложения'],
     'Активы и обязательства': ['активы всего', 'оборотные активы', 'внеоборотные активы', 'капитал', 'краткосрочные обязательства'],
@@ -108,206 +229,149 @@ INDICATOR_GROUPS = {
     'Оборачиваемость': ['выручка', 'запасы', 'дебиторская задолженность', 'активы всего']
 }
 
+# Коэффициенты каждой группы выборочного анализа; статьи для их расчета
+# (с заменами RATIO_FALLBACKS) берутся из определений FINANCIAL_RATIOS
+GROUP_RATIOS = {
+    'Выручка и прибыль': ['Рентабельность продаж (ROS)'],
+    'Активы и обязательства': ['Коэффициент автономии'],
+    'Ликвидность': ['Коэффициент текущей ликвидности', 'Коэффициент абсолютной ликвидности'],
+    'Рентабельность': [
+        'Рентабельность активов (ROA)', 'Рентабельность капитала (ROE)', 'Рентабельность продаж (ROS)',
+        'Рентабельность по EBIT',
+    ],
+    'Финансовая устойчивость': ['Коэффициент автономии', 'Финансовый рычаг', 'Покрытие процентов (ICR)'],
+    'Оборачиваемость': ['Оборачиваемость активов'],
+}
+
+def group_dependencies(groups):
+    """Что нужно посчитать для выбранных групп: статьи для показа и движок только их коэффициентов"""
+    items = list(dict.fromkeys(item for group in groups for item in INDICATOR_GROUPS[group]))
+    ratio_names = {name for group in groups for name in GROUP_RATIOS.get(group, ())}
+    return RatioEngine(items, ()), ratio_engine.subset(ratio_names)
+
 # === ОСНОВНЫЕ ФУНКЦИИ АНАЛИЗА ===
 
-def read_excel_file(file_bytes, file_name):
-    """Читает Excel файл с поддержкой разных форматов"""
-    try:
-        if file_name.endswith('.xls'):
-            return pd.read_excel(io.BytesIO(file_bytes), engine='xlrd')
-        else:
-            return pd.read_excel(io.BytesIO(file_bytes), engine='openpyxl')
-    except Exception as e:
-        try:
-            return pd.read_excel(io.BytesIO(file_bytes))
-        except Exception as e2:
-            raise Exception(f"Не удалось прочитать файл: {str(e2)}")
+def calculate_financial_ratios_for_period(data, opening=None):
+    """Рассчитывает финансовые коэффициенты для одного периода; opening - статьи предыдущего периода"""
+    start = ratio_engine.to_matrix({None: opening}) if opening is not None else None
+    ratios = ratio_engine.compute(ratio_engine.to_matrix({None: data}), start)
+    return ratio_engine.period_ratios(ratios)[0]
 
-def detect_periods(df):
-    """Определяет периоды в столбцах DataFrame"""
-    periods = []
-    
-    for col in df.columns:
-        col_str = str(col).lower().strip()
-        
-        # Поиск дат в различных форматах
-        date_patterns = [
-            r'\d{2}.\d{2}.\d{4}',  # 31.12.2023
-            r'\d{4}-\d{2}-\d{2}',   # 2023-12-31
-            r'\d{2}/\d{2}/\d{4}',   # 31/12/2023
-        ]
-        
-        for pattern in date_patterns:
-            matches = re.findall(pattern, col_str)
-            if matches:
-                try:
-                    date_str = matches[0]
-                    if '.' in date_str and len(date_str.split('.')[0]) == 2:
-                        date_obj = datetime.strptime(date_str, '%d.%m.%Y')
-                    elif '-' in date_str:
-                        date_obj = datetime.strptime(date_str, '%Y-%m-%d')
-                    elif '/' in date_str:
-                        date_obj = datetime.strptime(date_str, '%d/%m/%Y')
-                    
-                    periods.append({
-                        'column': col,
-                        'date': date_obj,
-                        'formatted': date_obj.strftime('%d.%m.%Y'),
-                        'year': date_obj.year
-                    })
-                    break
-                except:
-                    continue
-        
-        # Поиск периодов в текстовом формате
-        period_keywords = {
-            'за 2024': '2024',
-            'за 2023': '2023',
-            'за 2022': '2022',
-        }
-        
-        for keyword, year in period_keywords.items():
-            if keyword in col_str:
-                periods.append({
-                    'column': col,
-                    'date': datetime(int(year), 12, 31),
-                    'formatted': f"31.12.{year}",
-                    'year': int(year)
-                })
-                break
-    
-    # Сортируем периоды по году
-    periods.sort(key=lambda x: x['year'])
-    return periods
+@dataclass(slots=True)
+class PeriodAnalysis:
+    """Результат анализа одного периода: исходные статьи и коэффициенты"""
+    period: str
+    items: dict
+    ratios: dict
 
-def find_balance_item(column_name, df_columns):
-    """Находит соответствие столбца статьям баланса"""
-    column_name = str(column_name).lower().strip()
-    
-    for item, keywords in BALANCE_ITEMS.items():
-        for keyword in keywords:
-            if keyword in column_name:
-                return item
-    
-    return None
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['period'], data['items'], data['ratios'])
 
-def extract_financial_data_by_period(df, periods):
-    """Извлекает финансовые данные по периодам"""
-    financial_data = {}
-    
-    # Инициализируем данные для каждого периода
-    for period in periods:
-        financial_data[period['formatted']] = {}
-    
-    # Ищем столбец с наименованиями показателей
-    indicator_column = None
-    for col in df.columns:
-        if 'наименование' in str(col).lower() or 'показатель' in str(col).lower():
-            indicator_column = col
-            break
+def analyze_periods(periods_data, previous=None):
+    """Считает коэффициенты по периодам (в порядке дат) одним проходом по матрице
+
+    previous - прежний анализ, например, прошлой версии того же отчета: из
+    него без пересчета берутся периоды, у которых не изменились ни статьи,
+    ни предыдущий период (от него зависят средние величины). Считаются
+    только новые и затронутые периоды - каждый вместе со статьями на начало.
+    """
+    items_by_period = {
+        period: {item: float(value) for item, value in data.items()}
+        for period, data in periods_data.items()
+    }
+    previous = previous or {}
+    periods = list(items_by_period)
+    previous_periods = list(previous)
+    opening_period = dict(zip(previous_periods, [None] + previous_periods[:-1]))
     
-    if not indicator_column:
-        return financial_data
+    changed = [
+        period not in previous or previous[period].items != items_by_period[period]
+        for period in periods
+    ]
+    stale = [
+        idx for idx, period in enumerate(periods)
+        if changed[idx] or (idx and changed[idx - 1])
+        or opening_period.get(period) != (periods[idx - 1] if idx else None)
+    ]
     
-    # Проходим по всем строкам и извлекаем данные
-    for row_idx in range(len(df)):
-        indicator_name = str(df[indicator_column].iloc[row_idx]).strip()
-        
-        # Пропускаем пустые строки
-        if not indicator_name or indicator_name in ['Актив', 'Пассив', 'Наименование показателя']:
-            continue
-        
-        # Определяем тип показателя
-        item = find_balance_item(indicator_name, [indicator_name])
-        
-        if item:
-            # Извлекаем значения для каждого периода
-            for period in periods:
-                period_key = period['formatted']
-                col_name = period['column']
-                
-                try:
-                    value = pd.to_numeric(df[col_name].iloc[row_idx], errors='coerce')
-                    if not pd.isna(value) and value != 0:
-                        financial_data[period_key][item] = value
-                except:
-                    continue
-    
-    return financial_data
-
-def calculate_financial_ratios_for_period(data):
-    """Рассчитывает финансовые коэффициенты для одного периода"""
-    ratios = {}
+    analysis = {period: previous.get(period) for period in periods}
+    if stale:
+        matrix = ratio_engine.to_matrix(items_by_period)
+        opening = np.full((len(stale), matrix.shape[1]), np.nan)
+        for row, idx in enumerate(stale):
+            if idx:
+                opening[row] = matrix[idx - 1]
+        ratios = ratio_engine.period_ratios(ratio_engine.compute(matrix[stale], opening))
+        for idx, period_ratios in zip(stale, ratios):
+            period = periods[idx]
+            analysis[period] = PeriodAnalysis(period, items_by_period[period], period_ratios)
+    return analysis
+
+def analysis_matrix(analysis):
+    """Матрица периоды × статьи (порядок статей - ratio_engine.items) по результатам анализа"""
+    return ratio_engine.to_matrix({period: result.items for period, result in analysis.items()})
+
+def ratio_matrix(analysis, ratio_names):
+    """Матрица периоды × коэффициенты ratio_names из рассчитанных при загрузке коэффициентов (NaN - нет значения)"""
+    return np.array(
+        [[result.ratios.get(name, np.nan) for name in ratio_names] for result in analysis.values()], dtype=float
+    ).reshape(len(analysis), len(ratio_names))
+
+def analysis_to_json(analysis):
+    return [asdict(result) for result in analysis.values()]
+
+def analysis_from_json(data):
+    return {result['period']: PeriodAnalysis.from_dict(result) for result in data}
+
+def parse_workbook(source, file_format):
+    """Читает все листы с отчетностью, объединяет их и считает коэффициенты в одном процессе
+
+    Возвращает данные по периодам, анализ по периодам и длительность этапов в секундах.
+    """
+    sheets, result = plan_workbook(source, file_format)
+    results = [result] if result is not None else [
+        parse_sheet(source, file_format, sheet_name, header_row) for sheet_name, header_row in sheets
+    ]
     
-    try:
-        # Извлекаем данные
-        assets = data.get('активы всего', 0)
-        current_assets = data.get('оборотные активы', 0)
-        cash = data.get('денежные средства', 0)
-        receivables = data.get('дебиторская задолженность', 0)
-        inventory = data.get('запасы', 0)
-        
-        # Если нет оборотных активов, но есть их компоненты - рассчитываем
-        if current_assets == 0:
-            current_assets = cash + receivables + inventory
-        
-        equity = data.get('капитал', 0)
-        current_liabilities = data.get('краткосрочные обязательства', 0)
-        total_liabilities = data.get('обязательства всего', 0)
-        
-        revenue = data.get('выручка', 0)
-        net_profit = data.get('чистая прибыль', 0)
-        
-        # 1. КОЭФФИЦИЕНТЫ ЛИКВИДНОСТИ
-        if current_liabilities > 0:
-            ratios['Коэффициент текущей ликвидности'] = current_assets / current_liabilities
-            ratios['Коэффициент абсолютной ликвидности'] = cash / current_liabilities
-        
-        # 2. РЕНТАБЕЛЬНОСТЬ
-        if assets > 0:
-            ratios['Рентабельность активов (ROA)'] = (net_profit / assets) * 100
-        if equity > 0:
-            ratios['Рентабельность капитала (ROE)'] = (net_profit / equity) * 100
-        if revenue > 0:
-            ratios['Рентабельность продаж (ROS)'] = (net_profit / revenue) * 100
-        
-        # 3. ФИНАНСОВАЯ УСТОЙЧИВОСТЬ
-        if assets > 0:
-            ratios['Коэффициент автономии'] = equity / assets
-        
-        # 4. ДЕЛОВАЯ АКТИВНОСТЬ
-        if assets > 0:
-            ratios['Оборачиваемость активов'] = revenue / assets
-        
-    except Exception as e:
-        print(f"Ошибка расчета коэффициентов: {e}")
+    timings = {}
+    for _, sheet_timings in results:
+        for stage, seconds in sheet_timings.items():
+            timings[stage] = timings.get(stage, 0.0) + seconds
     
-    return ratios
+    periods_data = merge_periods_data(periods_data for periods_data, _ in results)
+    started = time.perf_counter()
+    analysis = analyze_periods(periods_data)
+    timings['ratios'] = time.perf_counter() - started
+    return periods_data, analysis, timings
 
 # === ФУНКЦИИ ГЕНЕРАЦИИ ОТЧЕТОВ ===
+# Отчеты строятся генераторами разделов: для сообщения разделы склеиваются
+# один раз, при экспорте - пишутся в файл по одному
 
-def generate_period_analysis_report(periods_data):
-    """Генерирует расширенный отчет анализа по периодам"""
-    if not periods_data:
-        return "❌ Не удалось извлечь данные по периодам."
+def iter_period_analysis_report(analysis):
+    """Разделы расширенного отчета анализа по периодам"""
+    if not analysis:
+        yield "❌ Не удалось извлечь данные по периодам."
+        return
     
-    report = "📊 **ФИНАНСОВЫЙ АНАЛИЗ ПО ПЕРИОДАМ**\n\n"
+    yield "📊 **ФИНАНСОВЫЙ АНАЛИЗ ПО ПЕРИОДАМ**\n\n"
     
     # Основные показатели по периодам
-    report += "💰 **ДИНАМИКА ОСНОВНЫХ ПОКАЗАТЕЛЕЙ:**\n\n"
+    yield "💰 **ДИНАМИКА ОСНОВНЫХ ПОКАЗАТЕЛЕЙ:**\n\n"
     
     key_indicators = ['выручка', 'чистая прибыль', 'активы всего', 'капитал']
     
     for indicator in key_indicators:
         values = []
-        for period, data in periods_data.items():
-            if data and indicator in data:
-                values.append((period, data[indicator]))
+        for period, result in analysis.items():
+            if indicator in result.items:
+                values.append((period, result.items[indicator]))
         
         if values:
-            report += f"📈 **{indicator.title()}:**\n"
+            lines = [f"📈 **{indicator.title()}:**\n"]
             for period, value in values:
-                report += f"• {period}: {value:,.0f} руб.\n"
+                lines.append(f"• {period}: {value:,.0f} руб.\n")
             
             # Анализ динамики
             if len(values) >= 2:
@@ -316,51 +380,495 @@ def generate_period_analysis_report(periods_data):
                 change_abs = last_val - first_val
                 change_rel = ((last_val - first_val) / first_val * 100) if first_val != 0 else 0
                 trend = "📈" if change_rel > 0 else "📉" if change_rel < 0 else "➡️"
-                report += f"  {trend} Изменение: {change_abs:+,.0f} руб. ({change_rel:+.1f}%)\n"
+                lines.append(f"  {trend} Изменение: {change_abs:+,.0f} руб. ({change_rel:+.1f}%)\n")
             
-            report += "\n"
+            lines.append("\n")
+            yield "".join(lines)
     
     # Анализ коэффициентов
-    report += "📊 **ФИНАНСОВЫЕ КОЭФФИЦИЕНТЫ:**\n\n"
-    
-    for period, data in periods_data.items():
-        if data:
-            ratios = calculate_financial_ratios_for_period(data)
-            if ratios:
-                report += f"**{period}:**\n"
-                for ratio_name, value in ratios.items():
-                    if 'рентабельность' in ratio_name.lower():
-                        report += f"• {ratio_name}: {value:.1f}%\n"
-                    else:
-                        report += f"• {ratio_name}: {value:.2f}\n"
-                report += "\n"
+    yield "📊 **ФИНАНСОВЫЕ КОЭФФИЦИЕНТЫ:**\n\n"
     
-    return report
+    for period, result in analysis.items():
+        if result.ratios:
+            lines = [f"**{period}:**\n"]
+            for ratio_name, value in result.ratios.items():
+                if 'рентабельность' in ratio_name.lower():
+                    lines.append(f"• {ratio_name}: {value:.1f}%\n")
+                else:
+                    lines.append(f"• {ratio_name}: {value:.2f}\n")
+            lines.append("\n")
+            yield "".join(lines)
+
+def generate_period_analysis_report(analysis):
+    """Генерирует расширенный отчет анализа по периодам"""
+    return "".join(iter_period_analysis_report(analysis))
+
+def iter_liquidity_analysis_report(analysis):
+    """Разделы отчета по анализу ликвидности"""
+    yield "💧 **АНАЛИЗ ЛИКВИДНОСТИ**\n\n"
+    
+    for period, result in analysis.items():
+        ratios = result.ratios
+        if 'Коэффициент текущей ликвидности' in ratios:
+            cr = ratios['Коэффициент текущей ликвидности']
+            lines = [f"**{period}:**\n", f"• Коэффициент текущей ликвидности: {cr:.2f}\n"]
+            
+            if cr >= 2.0:
+                lines.append("  ✅ Отличная ликвидность\n")
+            elif cr >= 1.5:
+                lines.append("  ⚠️ Нормальная ликвидность\n")
+            elif cr >= 1.0:
+                lines.append("  🟡 Пониженная ликвидность\n")
+            else:
+                lines.append("  ❌ Критическая ликвидность\n")
+            
+            lines.append("\n")
+            yield "".join(lines)
 
-def generate_liquidity_analysis_report(periods_data):
+def generate_liquidity_analysis_report(analysis):
     """Генерирует отчет по анализу ликвидности"""
-    report = "💧 **АНАЛИЗ ЛИКВИДНОСТИ**\n\n"
-    
-    for period, data in periods_data.items():
-        if data:
-            ratios = calculate_financial_ratios_for_period(data)
-            if 'Коэффициент текущей ликвидности' in ratios:
-                cr = ratios['Коэффициент текущей ликвидности']
-                report += f"**{period}:**\n"
-                report += f"• Коэффициент текущей ликвидности: {cr:.2f}\n"
-                
-                if cr >= 2.0:
-                    report += "  ✅ Отличная ликвидность\n"
-                elif cr >= 1.5:
-                    report += "  ⚠️ Нормальная ликвидность\n"
-                elif cr >= 1.0:
-                    report += "  🟡 Пониженная ликвидность\n"
-                else:
-                    report += "  ❌ Критическая ликвидность\n"
-                
-                report += "\n"
+    return "".join(iter_liquidity_analysis_report(analysis))
+
+# Оценки коэффициентов в отчетах: (порог, оценка) - первая, чей порог не выше значения
+RATIO_ASSESSMENTS = {
+    'Рентабельность продаж (ROS)': [(0.0, "✅ Продажи прибыльны"), (-math.inf, "❌ Продажи убыточны")],
+    'Рентабельность по EBIT': [(0.0, "✅ Операционная прибыль"), (-math.inf, "❌ Операционный убыток")],
+    'Коэффициент автономии': [
+        (0.5, "✅ Финансовая независимость"), (0.3, "⚠️ Умеренная зависимость от заемных средств"),
+        (-math.inf, "❌ Сильная зависимость от заемных средств"),
+    ],
+    'Финансовый рычаг': [
+        (2.0, "❌ Высокая долговая нагрузка"), (1.0, "⚠️ Заемных средств больше собственных"),
+        (-math.inf, "✅ Умеренная долговая нагрузка"),
+    ],
+    'Покрытие процентов (ICR)': [
+        (3.0, "✅ Проценты надежно покрыты прибылью"), (1.5, "⚠️ Небольшой запас покрытия процентов"),
+        (-math.inf, "❌ Прибыли не хватает на проценты"),
+    ],
+}
+
+RATIOS_BY_NAME = {ratio.name: ratio for ratio in FINANCIAL_RATIOS}
+
+def iter_ratio_report(analysis, title, ratio_names):
+    """Разделы отчета по группе коэффициентов: значения по периодам, изменение и оценка
+
+    Общая часть отчетов по рентабельности и устойчивости; коэффициенты берутся
+    из анализа периодов (analyze_periods), а не считаются заново.
+    """
+    matrix = ratio_matrix(analysis, ratio_names)
+    delta, _ = RatioEngine.changes(matrix)
     
-    return report
+    yield title
+    empty = True
+    for row, period in enumerate(analysis):
+        lines = [f"**{period}:**\n"]
+        for col, name in enumerate(ratio_names):
+            value = matrix[row, col]
+            if np.isnan(value):
+                continue
+            ratio = RATIOS_BY_NAME[name]
+            line = f"• {name}: {value:.1f}%" if ratio.is_percent else f"• {name}: {value:.2f}"
+            if not np.isnan(delta[row, col]):
+                line += f" ({delta[row, col]:+.1f} п.п.)" if ratio.is_percent else f" ({delta[row, col]:+.2f})"
+            lines.append(line + "\n")
+            for threshold, assessment in RATIO_ASSESSMENTS.get(name, ()):
+                if value >= threshold:
+                    lines.append(f"  {assessment}\n")
+                    break
+        if len(lines) > 1:
+            empty = False
+            lines.append("\n")
+            yield "".join(lines)
+    if empty:
+        yield "❌ Недостаточно данных для расчета коэффициентов."
+
+PROFITABILITY_RATIOS = [
+    'Рентабельность продаж (ROS)', 'Рентабельность по EBIT', 'Рентабельность активов (ROA)',
+    'Рентабельность средних активов (ROA)', 'Рентабельность капитала (ROE)', 'Рентабельность среднего капитала (ROE)',
+]
+
+STABILITY_RATIOS = [
+    'Коэффициент автономии', 'Финансовый рычаг', 'Соотношение собственного и заемного капитала',
+    'Покрытие процентов (ICR)',
+]
+
+def iter_profitability_report(analysis):
+    """Разделы отчета по анализу рентабельности"""
+    yield from iter_ratio_report(analysis, "💎 **АНАЛИЗ РЕНТАБЕЛЬНОСТИ**\n\n", PROFITABILITY_RATIOS)
+
+def generate_profitability_report(analysis):
+    """Генерирует отчет по анализу рентабельности"""
+    return "".join(iter_profitability_report(analysis))
+
+def iter_stability_report(analysis):
+    """Разделы отчета по финансовой устойчивости"""
+    yield from iter_ratio_report(analysis, "🏛️ **ФИНАНСОВАЯ УСТОЙЧИВОСТЬ**\n\n", STABILITY_RATIOS)
+
+def generate_stability_report(analysis):
+    """Генерирует отчет по финансовой устойчивости"""
+    return "".join(iter_stability_report(analysis))
+
+def iter_industry_comparison_report(analysis):
+    """Разделы отчета сравнения коэффициентов с отраслевыми нормативами
+
+    Сравниваются коэффициенты, рассчитанные при загрузке (с остатками на
+    начало периодов), - те же, что в остальных отчетах.
+    """
+    ratios = ratio_matrix(analysis, ratio_engine.names)
+    scores, known = industry_standards.score(ratios)
+    fit = industry_standards.fit(scores, known)
+    
+    # Последний период, который есть с чем сравнить
+    compared = np.flatnonzero(known.any(axis=(1, 2)))
+    if not len(compared):
+        yield "❌ Недостаточно данных для сравнения с нормативами."
+        return
+    
+    periods = list(analysis)
+    last = compared[-1]
+    marks = {BELOW: "⬇️", ABOVE: "⬆️"}
+    
+    def formatted(idx, value):
+        return f"{value:.1f}%" if ratio_engine.ratios[idx].is_percent else f"{value:.2f}"
+    
+    yield "🏭 **СРАВНЕНИЕ С ОТРАСЛЕВЫМИ НОРМАТИВАМИ**\n\n"
+    yield f"📅 Период: {periods[last]}\n\n"
+    
+    for industry, name in enumerate(industry_standards.names):
+        columns = np.flatnonzero(known[last, industry])
+        if not len(columns):
+            continue
+        within = int((scores[last, industry, columns] == WITHIN).sum())
+        lines = [f"**{name}** - в норме {within} из {len(columns)}:\n"]
+        for idx in columns:
+            mark = marks.get(int(scores[last, industry, idx]), "✅")
+            low, high = industry_standards.low[industry, idx], industry_standards.high[industry, idx]
+            lines.append(f"{mark} {ratio_engine.names[idx]}: {formatted(idx, ratios[last, idx])} "
+                         f"(норма {formatted(idx, low)} - {formatted(idx, high)})\n")
+        lines.append("\n")
+        yield "".join(lines)
+    
+    best = int(np.nanargmax(fit[last]))
+    yield f"🎯 Ближе всего к нормативам: {industry_standards.names[best]} ({fit[last, best]:.0%})\n\n"
+    
+    if len(compared) >= 2:
+        lines = ["📊 **Соответствие нормативам по периодам:**\n"]
+        for period_idx in compared:
+            shares = [
+                f"{name} {fit[period_idx, industry]:.0%}"
+                for industry, name in enumerate(industry_standards.names)
+                if not np.isnan(fit[period_idx, industry])
+            ]
+            lines.append(f"• {periods[period_idx]}: {', '.join(shares)}\n")
+        yield "".join(lines)
+
+def generate_industry_comparison_report(analysis):
+    """Генерирует отчет сравнения коэффициентов с отраслевыми нормативами"""
+    return "".join(iter_industry_comparison_report(analysis))
+
+def iter_selective_report(analysis, groups, industry=None):
+    """Разделы отчета по выбранным группам показателей
+
+    Считаются только статьи и коэффициенты выбранных групп (group_dependencies).
+    Для каждого показателя берется последний период, где он есть; если задан
+    код отрасли industry, коэффициенты сравниваются с ее нормативами.
+    """
+    item_engine, engine = group_dependencies(groups)
+    periods = list(analysis)
+    period_items = {period: result.items for period, result in analysis.items()}
+    values = item_engine.to_matrix(period_items)
+    delta, growth = RatioEngine.changes(values)
+    ratios = engine.compute(engine.to_matrix(period_items))
+    
+    industry_row = industry_standards.codes.index(industry) if industry in industry_standards.codes else None
+    
+    def latest(column):
+        known = np.flatnonzero(~np.isnan(column))
+        return int(known[-1]) if len(known) else None
+    
+    def formatted(ratio, value):
+        return f"{value:.1f}%" if ratio.is_percent else f"{value:.2f}"
+    
+    yield "🎯 **ВЫБОРОЧНЫЙ АНАЛИЗ**\n\n"
+    yield f"📅 Периоды: {', '.join(periods)}\n"
+    if industry_row is not None:
+        yield f"🏭 Нормативы: {industry_standards.names[industry_row]}\n"
+    yield "\n"
+    
+    for group in groups:
+        lines = [f"📂 **{group}:**\n"]
+        for item in INDICATOR_GROUPS[group]:
+            idx = item_engine.index[item]
+            period_idx = latest(values[:, idx])
+            if period_idx is None:
+                continue
+            line = f"• {item.capitalize()} ({periods[period_idx]}): {values[period_idx, idx]:,.0f} руб."
+            if not np.isnan(delta[period_idx, idx]):
+                line += f", {delta[period_idx, idx]:+,.0f} руб."
+                if not np.isnan(growth[period_idx, idx]):
+                    line += f" ({growth[period_idx, idx]:+.1f}%)"
+            lines.append(line + "\n")
+        
+        for name in GROUP_RATIOS.get(group, ()):
+            idx = engine.names.index(name)
+            ratio = engine.ratios[idx]
+            period_idx = latest(ratios[:, idx])
+            if period_idx is None:
+                continue
+            value = ratios[period_idx, idx]
+            line = f"{name} ({periods[period_idx]}): {formatted(ratio, value)}"
+            column = industry_standards.ratio_index.get(name)
+            if industry_row is None or column is None or np.isnan(industry_standards.low[industry_row, column]):
+                lines.append(f"📐 {line}\n")
+                continue
+            low, high = industry_standards.low[industry_row, column], industry_standards.high[industry_row, column]
+            mark = "⬇️" if value < low else "⬆️" if value > high else "✅"
+            lines.append(f"{mark} {line} (норма {formatted(ratio, low)} - {formatted(ratio, high)})\n")
+        
+        if len(lines) == 1:
+            lines.append("• Нет данных\n")
+        lines.append("\n")
+        yield "".join(lines)
+
+def generate_selective_report(analysis, groups, industry=None):
+    """Генерирует отчет по выбранным группам показателей"""
+    return "".join(iter_selective_report(analysis, groups, industry))
+
+def fit_forecast_models(analysis, source=None):
+    """Подбирает модели тренда сразу для всех статей, у которых есть два и более значения"""
+    dates = [datetime.strptime(period, '%d.%m.%Y') for period in analysis]
+    matrix = analysis_matrix(analysis)
+    columns = np.flatnonzero((~np.isnan(matrix)).sum(axis=0) >= 2)
+    times = [(date - dates[0]).days / 365.25 for date in dates]
+    series = [ratio_engine.items[idx] for idx in columns]
+    return fit_trends(times, matrix[:, columns], source=source, series=series)
+
+def forecast_dates(last_date, step_years, horizon):
+    """Даты следующих периодов: конец месяца через каждый шаг"""
+    step_months = max(1, round(step_years * 12))
+    dates = []
+    for k in range(1, horizon + 1):
+        month = last_date.month - 1 + k * step_months
+        dates.append(month_end(last_date.year + month // 12, month % 12 + 1))
+    return dates
+
+def iter_forecast_report(analysis, models, horizon=3):
+    """Разделы отчета прогноза тенденций по подобранным моделям"""
+    if not models.series:
+        yield "❌ Для прогноза нужны значения хотя бы за два периода."
+        return
+    
+    first_date = datetime.strptime(next(iter(analysis)), '%d.%m.%Y')
+    last_date = datetime.strptime(list(analysis)[-1], '%d.%m.%Y')
+    dates = forecast_dates(last_date, models.step, horizon)
+    times = [(date - first_date).days / 365.25 for date in dates]
+    predictions = models.predict(times)
+    
+    yield "🔮 **ПРОГНОЗ ТЕНДЕНЦИЙ**\n\n"
+    yield f"📅 Периодов прогноза: {horizon}, показателей: {len(models.series)}\n\n"
+    
+    for idx, item in enumerate(models.series):
+        values = predictions[:, idx]
+        if not np.isfinite(values).all():
+            continue
+        # Направление и изменение - от последнего факта до конца горизонта прогноза
+        last_value = models.last_value[idx]
+        change = values[-1] - last_value
+        trend = "📈" if change > 0 else "📉" if change < 0 else "➡️"
+        lines = [f"{trend} **{item.title()}** ({MODEL_NAMES[models.model[idx]]}):\n"]
+        for date, value in zip(dates, values):
+            lines.append(f"• {date.strftime('%d.%m.%Y')}: {value:,.0f} руб.\n")
+        change_text = f"{change / abs(last_value) * 100:+.1f}%" if last_value else f"{change:+,.0f} руб."
+        lines.append(f"  Изменение за горизонт прогноза (к {dates[-1].strftime('%d.%m.%Y')}): {change_text}\n\n")
+        yield "".join(lines)
+    
+    yield "⚠️ Прогноз построен по истории отчетности и не учитывает внешние факторы."
+
+def generate_forecast_report(analysis, models, horizon=3):
+    """Генерирует отчет прогноза тенденций по подобранным моделям"""
+    return "".join(iter_forecast_report(analysis, models, horizon))
+
+def latest_company_ratios(companies):
+    """Для каждой компании - последний период с рассчитанными коэффициентами"""
+    latest = {}
+    for company, analysis in companies.items():
+        for period, result in reversed(list(analysis.items())):
+            if result.ratios:
+                latest[company] = (period, result.ratios)
+                break
+    return latest
+
+def iter_batch_comparison_report(companies, failures=()):
+    """Разделы сводного отчета, сравнивающего коэффициенты компаний за последний период"""
+    yield "🏢 **СВОДНОЕ СРАВНЕНИЕ КОМПАНИЙ**\n\n"
+    yield f"📁 Обработано файлов: {len(companies)} из {len(companies) + len(failures)}\n\n"
+    
+    latest = latest_company_ratios(companies)
+    
+    ratio_names = []
+    for _, ratios in latest.values():
+        for ratio_name in ratios:
+            if ratio_name not in ratio_names:
+                ratio_names.append(ratio_name)
+    
+    if not ratio_names:
+        yield "❌ Не удалось рассчитать коэффициенты ни для одной компании.\n\n"
+    
+    for ratio_name in ratio_names:
+        values = [
+            (company, period, ratios[ratio_name])
+            for company, (period, ratios) in latest.items()
+            if ratio_name in ratios
+        ]
+        # Первой идет компания с лучшим значением: для долговой нагрузки - с меньшим
+        ratio = RATIOS_BY_NAME.get(ratio_name, Ratio(ratio_name, '', ''))
+        values.sort(key=lambda value: value[2], reverse=ratio.higher_is_better)
+        is_percent = ratio.is_percent
+        
+        lines = [f"📊 **{ratio_name}:**\n"]
+        for position, (company, period, value) in enumerate(values):
+            mark = "🥇" if position == 0 and len(values) > 1 else "🔻" if position == len(values) - 1 and len(values) > 1 else "•"
+            formatted = f"{value:.1f}%" if is_percent else f"{value:.2f}"
+            lines.append(f"{mark} {company} ({period}): {formatted}\n")
+        
+        if len(values) >= 3:
+            median = float(np.median([value for _, _, value in values]))
+            lines.append(f"  〰️ Медиана: {median:.1f}%\n" if is_percent else f"  〰️ Медиана: {median:.2f}\n")
+        lines.append("\n")
+        yield "".join(lines)
+    
+    if failures:
+        lines = ["⚠️ **Не удалось обработать:**\n"]
+        for name, reason in failures:
+            lines.append(f"• {name}: {reason}\n")
+        yield "".join(lines)
+
+def generate_batch_comparison_report(companies, failures=()):
+    """Генерирует сводный отчет, сравнивающий коэффициенты компаний за последний период"""
+    return "".join(iter_batch_comparison_report(companies, failures))
+
+def iter_export_report(session, forecast_models=None):
+    """Разделы полного отчета для экспорта: все отчеты по файлу и сводное сравнение пакета"""
+    yield "📄 **ФИНАНСОВЫЙ АНАЛИЗ - ОТЧЕТ**\n"
+    yield f"Файл: {session.get('file_name', '-')}\nСформирован: {datetime.now():%d.%m.%Y %H:%M}\n\n"
+    
+    if 'analysis' in session:
+        analysis = session['analysis']
+        reports = [
+            iter_period_analysis_report(analysis),
+            iter_liquidity_analysis_report(analysis),
+            iter_profitability_report(analysis),
+            iter_stability_report(analysis),
+            iter_industry_comparison_report(analysis),
+        ]
+        if forecast_models is not None:
+            reports.append(iter_forecast_report(analysis, forecast_models, FORECAST_HORIZON))
+        for sections in reports:
+            yield from sections
+            yield "\n\n"
+    
+    if session.get('batch'):
+        yield from iter_batch_comparison_report(session['batch'])
+
+def iter_export_sheets(session, forecast_models=None):
+    """Листы XLSX-экспорта: текст отчета, статьи и коэффициенты по периодам, сравнение компаний"""
+    def report_rows():
+        for section in iter_export_report(session, forecast_models):
+            for line in section.replace('**', '').rstrip('\n').split('\n'):
+                yield [line]
+    
+    yield 'Отчет', report_rows()
+    
+    if 'analysis' in session:
+        analysis = session['analysis']
+        periods = list(analysis)
+        matrix = analysis_matrix(analysis)
+        ratios = ratio_matrix(analysis, ratio_engine.names)
+        yield 'Показатели', chain(
+            [['Показатель', *periods]],
+            ([item, *_cells(matrix[:, idx])] for idx, item in enumerate(ratio_engine.items)
+             if not np.isnan(matrix[:, idx]).all())
+        )
+        yield 'Коэффициенты', chain(
+            [['Коэффициент', *periods]],
+            ([name, *_cells(ratios[:, idx])] for idx, name in enumerate(ratio_engine.names)
+             if not np.isnan(ratios[:, idx]).all())
+        )
+    
+    if session.get('batch'):
+        latest = latest_company_ratios(session['batch'])
+        yield 'Компании', chain(
+            [['Компания', 'Период', *ratio_engine.names]],
+            ([company, period, *(ratios.get(name) for name in ratio_engine.names)]
+             for company, (period, ratios) in latest.items())
+        )
+
+def _cells(values):
+    """Значения для ячеек: NaN становится пустой ячейкой"""
+    return [None if np.isnan(value) else float(value) for value in values]
+
+# === СЕССИИ ПОЛЬЗОВАТЕЛЕЙ ===
+
+def encode_session(session):
+    """Сериализует сессию анализа в JSON"""
+    data = dict(session)
+    if 'analysis' in data:
+        data['analysis'] = analysis_to_json(data['analysis'])
+    if 'batch' in data:
+        data['batch'] = {company: analysis_to_json(analysis) for company, analysis in data['batch'].items()}
+    if 'forecast' in data:
+        data['forecast'] = asdict(data['forecast'])
+    return json.dumps(data, ensure_ascii=False)
+
+def decode_session(raw):
+    """Восстанавливает сессию анализа из JSON"""
+    data = json.loads(raw)
+    if 'analysis' in data:
+        data['analysis'] = analysis_from_json(data['analysis'])
+    if 'batch' in data:
+        data['batch'] = {company: analysis_from_json(analysis) for company, analysis in data['batch'].items()}
+    if 'forecast' in data:
+        data['forecast'] = TrendModels.from_dict(data['forecast'])
+    return data
+
+# Сессии хранятся в SQLite и переживают перезапуск; готовые отчеты, модели
+# прогноза и пакеты удаляются первыми, если сессия не помещается в лимит
+sessions = SessionStore(
+    SESSION_DB_PATH,
+    ttl=SESSION_TTL_HOURS * 3600,
+    max_bytes=SESSION_MAX_KB * 1024,
+    hot_limit=SESSION_HOT_LIMIT,
+    encode=encode_session,
+    decode=decode_session,
+    droppable_keys=('last_analysis', 'forecast', 'batch')
+)
+
+def register_metrics():
+    """Метрики, которые считываются из состояния бота при каждом запросе"""
+    metrics.register('cache_hits_total', lambda: analysis_cache.hits, "Попадания в кэш файлов", kind='counter')
+    metrics.register('cache_misses_total', lambda: analysis_cache.misses, "Промахи кэша файлов", kind='counter')
+    metrics.register('analysis_jobs_running', lambda: analysis_pool.running, "Задачи анализа в работе")
+    metrics.register('analysis_jobs_waiting', lambda: analysis_pool.waiting, "Задачи анализа в очереди")
+    metrics.register('update_wait_p50_seconds', lambda: update_processor.wait_stats.snapshot()['p50'],
+                     "Медиана ожидания обновлений перед обработкой")
+    metrics.register('update_wait_p95_seconds', lambda: update_processor.wait_stats.snapshot()['p95'],
+                     "95-й перцентиль ожидания обновлений")
+    metrics.register('updates_processed_total', lambda: update_processor.wait_stats.count,
+                     "Обработанные обновления", kind='counter')
+    metrics.register('chats_in_progress', lambda: update_processor.pending_chats, "Чаты с обновлениями в работе")
+    metrics.register('sessions_in_memory', lambda: sessions.in_memory, "Сессии в памяти")
+    metrics.register('send_waiting', lambda: rate_limiter.waiting, "Исходящие запросы в очереди отправки")
+    metrics.register('send_retries_total', lambda: rate_limiter.retries,
+                     "Повторы отправки после RetryAfter", kind='counter')
+    metrics.register('send_throttled_seconds_total', lambda: rate_limiter.throttled_seconds,
+                     "Суммарное ожидание лимитов отправки", kind='counter')
+
+def get_session(update):
+    """Сессия анализа пользователя, приславшего обновление"""
+    return sessions.get(update.effective_user.id)
+
+def save_session(update, session):
+    sessions.save(update.effective_user.id, session)
 
 # === ОСНОВНЫЕ ОБРАБОТЧИКИ ===
 
@@ -395,15 +903,79 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 • 🏛️ Устойчивость - стабильность
 • 📋 Сравнение - отраслевые нормативы
 • 🔮 Прогноз - будущие тренды
-• 📄 TXT - текстовый отчет
+• 📄 TXT - текстовый отчет (/export xlsx - в Excel)
 
 📁 **Формат файла:**
 Excel с данными за периоды:
 • 31.12.2023, 31.12.2022
 • За 2023 год, За 2022 год
+• 1 кв. 2024, Январь 2024, За 9 месяцев 2024
+
+📦 **Несколько компаний:**
+Пришлите несколько файлов одним сообщением или ZIP-архив - бот сравнит коэффициенты компаний
 """
     await update.message.reply_text(help_text)
 
+class WorkbookError(Exception):
+    """Ошибка обработки файла; текст исключения показывается пользователю"""
+
+async def analyze_workbook(upload, file_name, file_unique_id=None, on_queued=None, previous=None):
+    """Возвращает ключ и запись кэша для загруженного файла, при промахе разбирая его в пуле процессов
+
+    Формат определяется по сигнатуре содержимого, а не по имени файла.
+    Скачанный файл процессы анализа читают с диска сами, без передачи содержимого.
+    previous - анализ прошлой версии файла: его неизменные периоды не пересчитываются.
+    """
+    cache_key = analysis_cache.digest(upload.data)
+    entry = analysis_cache.get(cache_key)
+    
+    if entry is not None:
+        analysis_cache.add_alias(cache_key, file_unique_id)
+        return cache_key, entry
+    
+    if upload.format is None:
+        raise WorkbookError("❌ Файл не похож на Excel (.xlsx или .xls)")
+    
+    # Читаем Excel файл и извлекаем данные в отдельных процессах: листы с отчетностью
+    # (например, Форма 1 и Форма 2) разбираются параллельно
+    try:
+        async with analysis_pool.job_source(upload) as source:
+            with metrics.span('parse', file=file_name, bytes=upload.size) as fields:
+                sheets, result = await analysis_pool.submit(plan_workbook, source, upload.format, on_queued=on_queued)
+                fields['sheets'] = max(len(sheets), 1)
+                if result is not None:
+                    results = [result]
+                else:
+                    results = await asyncio.gather(*(
+                        analysis_pool.submit(parse_sheet, source, upload.format, sheet_name, header_row)
+                        for sheet_name, header_row in sheets
+                    ))
+    except QueueFullError:
+        raise WorkbookError("⏳ Сервер перегружен, попробуйте загрузить файл через пару минут")
+    except JobTimeoutError as e:
+        raise WorkbookError(f"❌ Файл слишком долго обрабатывается: {str(e)}")
+    except Exception as e:
+        raise WorkbookError(f"❌ Ошибка чтения файла: {str(e)}")
+    
+    # Этапы внутри процессов анализа
+    for _, timings in results:
+        for stage, seconds in timings.items():
+            metrics.observe('stage_seconds', seconds, stage=f"worker_{stage}")
+    
+    periods_data = merge_periods_data(periods_data for periods_data, _ in results)
+    if not periods_data:
+        raise WorkbookError("❌ Не удалось определить периоды в файле")
+    
+    with metrics.span('ratios', file=file_name):
+        analysis = analyze_periods(periods_data, previous)
+    
+    entry = {
+        'analysis': analysis_to_json(analysis),
+        'periods_count': len(periods_data),
+    }
+    analysis_cache.put(cache_key, entry, file_unique_id)
+    return cache_key, entry
+
 async def receive_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик загрузки Excel файлов"""
     try:
@@ -414,85 +986,526 @@ async def receive_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
         file = update.message.document
         file_name = file.file_name.lower()
 
+        if file_name.endswith('.zip'):
+            await receive_zip_archive(update, context)
+            return
+
         if not (file_name.endswith('.xlsx') or file_name.endswith('.xls')):
             await update.message.reply_text("❌ Пожалуйста, пришлите файл в формате Excel (.xlsx или .xls)")
             return
 
-        await update.message.reply_text("⏳ Анализирую структуру файла...")
-
-        # Скачиваем файл
-        file_obj = await file.get_file()
-        file_bytes = await file_obj.download_as_bytearray()
-
-        # Читаем Excel файл
-        try:
-            df = read_excel_file(file_bytes, file_name)
-        except Exception as e:
-            await update.message.reply_text(f"❌ Ошибка чтения файла: {str(e)}")
+        # Документы альбома и все, что приходит в чат, пока собирается пакет, идут в пакет
+        if update.message.media_group_id or update.message.chat_id in pending_batches:
+            collect_batch_document(update, context)
             return
+
+        session = get_session(update)
         
-        # Определяем периоды
-        periods = detect_periods(df)
-        
-        if not periods:
-            await update.message.reply_text("❌ Не удалось определить периоды в файле")
-            return
+        # Повторная загрузка того же файла обслуживается из кэша без скачивания
+        cache_key = analysis_cache.resolve(file.file_unique_id)
+        entry = analysis_cache.get(cache_key) if cache_key else None
+
+        if entry is None:
+            await update.message.reply_text("⏳ Анализирую структуру файла...")
+
+            # Скачиваем файл во временный файл (размер проверяется до скачивания)
+            try:
+                with metrics.span('download', file=file_name, user=update.effective_user.id):
+                    upload = await download_upload(file, "temp_files", UPLOAD_MAX_MB * 1024 * 1024)
+            except FileTooLargeError as e:
+                await update.message.reply_text(f"❌ {str(e)}")
+                return
+            metrics.inc('bytes_ingested_total', upload.size, help="Скачано байт из Telegram")
+
+            async def notify_queued(position):
+                await update.message.reply_text(f"🕒 Файл поставлен в очередь, позиция {position}")
+
+            # Новая версия того же отчета (например, с добавленным периодом):
+            # прежние периоды берутся из анализа в сессии
+            previous = session.get('analysis') if session.get('file_name') == file_name else None
+            try:
+                with upload:
+                    cache_key, entry = await analyze_workbook(
+                        upload, file_name, file.file_unique_id, on_queued=notify_queued, previous=previous
+                    )
+            except WorkbookError as e:
+                metrics.inc('files_processed_total', help="Обработанные файлы", result='error')
+                await update.message.reply_text(str(e))
+                return
+            metrics.inc('files_processed_total', help="Обработанные файлы", result='ok')
+        else:
+            metrics.inc('files_processed_total', help="Обработанные файлы", result='cached')
         
-        # Извлекаем данные по периодам
-        periods_data = extract_financial_data_by_period(df, periods)
+        analysis = analysis_from_json(entry['analysis'])
         
-        # Сохраняем данные в контекст пользователя
-        context.user_data.update({
-            'periods_data': periods_data,
-            'file_name': file_name
+        # Сохраняем данные в сессию пользователя
+        session.update({
+            'analysis': analysis,
+            'file_name': file_name,
+            'cache_key': cache_key
         })
+        session.pop('last_analysis', None)
+        session.pop('forecast', None)
+        save_session(update, session)
         
-        extracted_count = sum(len(data) for data in periods_data.values())
-        await update.message.reply_text(
-            f"✅ Файл успешно обработан!\n"
-            f"📊 Извлечено показателей: {extracted_count}\n"
-            f"📅 Периодов: {len(periods)}\n\n"
-            f"🎯 Теперь выберите тип анализа!"
-        )
+        extracted_count = sum(len(result.items) for result in analysis.values())
+        with metrics.span('reply', report='upload'):
+            await update.message.reply_text(
+                f"✅ Файл успешно обработан!\n"
+                f"📊 Извлечено показателей: {extracted_count}\n"
+                f"📅 Периодов: {entry['periods_count']}\n\n"
+                f"🎯 Теперь выберите тип анализа!"
+            )
 
     except Exception as e:
         await update.message.reply_text(f"❌ Ошибка при анализе: {str(e)}")
 
+# === ПАКЕТНАЯ ЗАГРУЗКА ===
+
+# Документы, которые еще собираются в пакет: чат -> пакет
+pending_batches = {}
+
+# Общий для всех пакетов лимит одновременно разбираемых файлов: пакет не
+# занимает весь пул и не получает QueueFullError на файлах сверх его емкости
+batch_slots = asyncio.Semaphore(max(1, BATCH_CONCURRENCY))
+
+def collect_batch_document(update, context):
+    """Добавляет документ в пакет чата; пакет обрабатывается после паузы
+
+    Альбом Telegram вмещает не больше 10 документов, поэтому альбомы (и
+    отдельные документы), пришедшие подряд с паузой меньше
+    BATCH_COLLECT_SECONDS, собираются в один пакет.
+    """
+    message = update.message
+    key = message.chat_id
+    batch = pending_batches.get(key)
+    if batch is None:
+        batch = pending_batches[key] = {'sources': []}
+        context.application.create_task(flush_batch(key, update, context))
+    batch['sources'].append({
+        'name': message.document.file_name,
+        'file_unique_id': message.document.file_unique_id,
+        'document': message.document,
+    })
+    batch['updated'] = time.monotonic()
+
+async def flush_batch(key, update, context):
+    """Ждет, пока в группу перестанут приходить документы, и запускает обработку пакета"""
+    while True:
+        await asyncio.sleep(BATCH_COLLECT_SECONDS)
+        if time.monotonic() - pending_batches[key]['updated'] >= BATCH_COLLECT_SECONDS:
+            break
+    batch = pending_batches.pop(key)
+    try:
+        await process_batch(update, context, batch['sources'])
+    except Exception as e:
+        await update.message.reply_text(f"❌ Ошибка при пакетном анализе: {str(e)}")
+
+async def receive_zip_archive(update, context):
+    """Разбирает ZIP-архив с Excel файлами как пакет"""
+    document = update.message.document
+    if document.file_size and document.file_size > BATCH_MAX_UNZIPPED_MB * 1024 * 1024:
+        await update.message.reply_text(f"❌ Архив больше {BATCH_MAX_UNZIPPED_MB} МБ")
+        return
+    
+    await update.message.reply_text("📦 Распаковываю архив...")
+    try:
+        with metrics.span('download', file=document.file_name, user=update.effective_user.id):
+            archive = await download_spooled(
+                document, UPLOAD_SPOOL_MB * 1024 * 1024, "temp_files", UPLOAD_MAX_MB * 1024 * 1024
+            )
+    except FileTooLargeError as e:
+        await update.message.reply_text(f"❌ {str(e)}")
+        return
+    
+    try:
+        with archive:
+            metrics.inc('bytes_ingested_total', archive.seek(0, os.SEEK_END), help="Скачано байт из Telegram")
+            archive.seek(0)
+            members = await asyncio.to_thread(extract_excel_from_zip, archive)
+    except (zipfile.BadZipFile, WorkbookError) as e:
+        await update.message.reply_text(f"❌ Не удалось распаковать архив: {str(e)}")
+        return
+    
+    if not members:
+        await update.message.reply_text("❌ В архиве нет файлов Excel (.xlsx или .xls)")
+        return
+    
+    await process_batch(update, context, [{'name': name, 'data': data} for name, data in members])
+
+def extract_excel_from_zip(archive_file):
+    """Возвращает [(имя, содержимое)] Excel файлов из архива (файлового объекта) с проверкой лимитов"""
+    with zipfile.ZipFile(archive_file) as archive:
+        infos = [
+            info for info in archive.infolist()
+            if not info.is_dir()
+            and not info.filename.startswith('__MACOSX/')
+            and info.filename.lower().endswith(('.xlsx', '.xls'))
+        ]
+        if len(infos) > BATCH_MAX_FILES:
+            raise WorkbookError(f"в архиве больше {BATCH_MAX_FILES} файлов")
+        if sum(info.file_size for info in infos) > BATCH_MAX_UNZIPPED_MB * 1024 * 1024:
+            raise WorkbookError(f"распакованные файлы больше {BATCH_MAX_UNZIPPED_MB} МБ")
+        return [(os.path.basename(info.filename), archive.read(info)) for info in infos]
+
+async def process_batch(update, context, sources):
+    """Параллельно разбирает пакет файлов и присылает сводное сравнение компаний"""
+    if len(sources) > BATCH_MAX_FILES:
+        await update.message.reply_text(f"⚠️ В пакете больше {BATCH_MAX_FILES} файлов, обработаю первые {BATCH_MAX_FILES}")
+        sources = sources[:BATCH_MAX_FILES]
+    
+    total = len(sources)
+    progress = await update.message.reply_text(f"⏳ Пакетный анализ: 0 из {total}")
+    done = []
+    last_edit = 0.0
+    
+    async def analyze_source(source):
+        nonlocal last_edit
+        try:
+            async with batch_slots:
+                if 'data' in source:
+                    upload = Upload(source['data'])
+                else:
+                    with metrics.span('download', file=source['name'], user=update.effective_user.id):
+                        upload = await download_upload(source['document'], "temp_files", UPLOAD_MAX_MB * 1024 * 1024)
+                    metrics.inc('bytes_ingested_total', upload.size, help="Скачано байт из Telegram")
+                with upload:
+                    _, entry = await analyze_workbook(upload, source['name'].lower(), source.get('file_unique_id'))
+            result = analysis_from_json(entry['analysis'])
+            done.append(f"✅ {source['name']}")
+            metrics.inc('files_processed_total', help="Обработанные файлы", result='ok')
+        except Exception as e:
+            result = e
+            done.append(f"❌ {source['name']}")
+            metrics.inc('files_processed_total', help="Обработанные файлы", result='error')
+        
+        # Прогресс обновляем не чаще раза в секунду, чтобы не упереться в лимиты Telegram
+        now = time.monotonic()
+        if now - last_edit >= 1.0 or len(done) == total:
+            last_edit = now
+            try:
+                await progress.edit_text(f"⏳ Пакетный анализ: {len(done)} из {total}\n" + "\n".join(done[-10:]))
+            except Exception:
+                pass
+        return result
+    
+    with metrics.span('batch', files=total, user=update.effective_user.id):
+        results = await asyncio.gather(*(analyze_source(source) for source in sources))
+    
+    companies = {}
+    failures = []
+    for source, result in zip(sources, results):
+        name = os.path.splitext(source['name'])[0]
+        if isinstance(result, Exception):
+            failures.append((source['name'], str(result).removeprefix('❌ ')))
+        else:
+            companies[name] = result
+    
+    report = generate_batch_comparison_report(companies, failures)
+    session = get_session(update)
+    session.update({
+        'batch': companies,
+        'last_analysis': report
+    })
+    save_session(update, session)
+    with metrics.span('send', report='batch'):
+        await reply_long_text(update.message, report)
+
+async def reply_long_text(message, text):
+    """Отправляет длинный текст частями по границам разделов и строк
+
+    Темп отправки и повторы при лимитах Telegram обеспечивает rate_limiter.
+    """
+    for part in split_message(text):
+        await message.reply_text(part)
+
+def get_cached_report(session, name, generator):
+    """Возвращает готовый отчет из кэша или строит его по данным сессии"""
+    cache_key = session.get('cache_key')
+    report = analysis_cache.get_report(cache_key, name) if cache_key else None
+    if report is None:
+        report = generator(session['analysis'])
+        if cache_key:
+            analysis_cache.put_report(cache_key, name, report)
+    return report
+
 async def perform_full_analysis(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Выполнение полного анализа"""
-    if 'periods_data' not in context.user_data:
+    session = get_session(update)
+    if 'analysis' not in session:
         await update.message.reply_text("❌ Сначала загрузите файл с данными")
         return
     
     await update.message.reply_text("🔍 Выполняю полный финансовый анализ...")
     
-    periods_data = context.user_data['periods_data']
-    report = generate_period_analysis_report(periods_data)
+    with metrics.span('render', report='full'):
+        report = get_cached_report(session, 'full', generate_period_analysis_report)
     
     # Сохраняем для возможного экспорта
-    context.user_data['last_analysis'] = report
+    session['last_analysis'] = report
+    save_session(update, session)
     
-    if len(report) > 4000:
-        parts = [report[i:i+4000] for i in range(0, len(report), 4000)]
-        for part in parts:
-            await update.message.reply_text(part)
-    else:
-        await update.message.reply_text(report)
+    with metrics.span('send', report='full'):
+        await reply_long_text(update.message, report)
 
 async def perform_liquidity_analysis(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Анализ ликвидности"""
-    if 'periods_data' not in context.user_data:
+    session = get_session(update)
+    if 'analysis' not in session:
         await update.message.reply_text("❌ Сначала загрузите файл с данными")
         return
     
     await update.message.reply_text("💧 Анализирую ликвидность...")
     
-    periods_data = context.user_data['periods_data']
-    report = generate_liquidity_analysis_report(periods_data)
+    with metrics.span('render', report='liquidity'):
+        report = get_cached_report(session, 'liquidity', generate_liquidity_analysis_report)
+    
+    session['last_analysis'] = report
+    save_session(update, session)
+    
+    with metrics.span('send', report='liquidity'):
+        await reply_long_text(update.message, report)
+
+async def perform_profitability_analysis(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Анализ рентабельности"""
+    session = get_session(update)
+    if 'analysis' not in session:
+        await update.message.reply_text("❌ Сначала загрузите файл с данными")
+        return
+    
+    await update.message.reply_text("💎 Анализирую рентабельность...")
+    
+    with metrics.span('render', report='profitability'):
+        report = get_cached_report(session, 'profitability', generate_profitability_report)
+    
+    session['last_analysis'] = report
+    save_session(update, session)
+    
+    with metrics.span('send', report='profitability'):
+        await reply_long_text(update.message, report)
+
+async def perform_stability_analysis(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Анализ финансовой устойчивости"""
+    session = get_session(update)
+    if 'analysis' not in session:
+        await update.message.reply_text("❌ Сначала загрузите файл с данными")
+        return
+    
+    await update.message.reply_text("🏛️ Анализирую устойчивость...")
+    
+    with metrics.span('render', report='stability'):
+        report = get_cached_report(session, 'stability', generate_stability_report)
+    
+    session['last_analysis'] = report
+    save_session(update, session)
+    
+    with metrics.span('send', report='stability'):
+        await reply_long_text(update.message, report)
+
+async def perform_industry_comparison(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Сравнение с отраслевыми нормативами"""
+    session = get_session(update)
+    if 'analysis' not in session:
+        await update.message.reply_text("❌ Сначала загрузите файл с данными")
+        return
+    
+    await update.message.reply_text("🏭 Сравниваю с нормативами...")
+    
+    # Версия нормативов в имени отчета: после обновления файла отчет строится заново
+    industry_standards.reload()
+    with metrics.span('render', report='industry'):
+        report = get_cached_report(session, f"industry-{industry_standards.version}", generate_industry_comparison_report)
+    
+    session['last_analysis'] = report
+    save_session(update, session)
+    
+    with metrics.span('send', report='industry'):
+        await reply_long_text(update.message, report)
+
+def indicator_groups_keyboard(selected):
+    """Клавиатура выбора групп показателей: отмеченные группы помечены ✅"""
+    rows = [
+        [InlineKeyboardButton(f"{'✅' if idx in selected else '▫️'} {group}", callback_data=f"group:{idx}")]
+        for idx, group in enumerate(INDICATOR_GROUPS)
+    ]
+    rows.append([
+        InlineKeyboardButton("➡️ Далее", callback_data="groups:done"),
+        InlineKeyboardButton("✖️ Отмена", callback_data="cancel"),
+    ])
+    return InlineKeyboardMarkup(rows)
+
+def industry_keyboard():
+    """Клавиатура выбора отрасли для сравнения с нормативами"""
+    rows = [
+        [InlineKeyboardButton(name, callback_data=f"industry:{code}")]
+        for code, name in zip(industry_standards.codes, industry_standards.names)
+    ]
+    rows.append([InlineKeyboardButton("Без сравнения", callback_data="industry:")])
+    return InlineKeyboardMarkup(rows)
+
+async def start_selective_analysis(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Начало выборочного анализа: выбор групп показателей"""
+    session = get_session(update)
+    if 'analysis' not in session:
+        await update.message.reply_text("❌ Сначала загрузите файл с данными")
+        return ConversationHandler.END
+    
+    context.user_data['selected_groups'] = []
+    await update.message.reply_text(
+        "🎯 Выберите группы показателей и нажмите «Далее»:",
+        reply_markup=indicator_groups_keyboard([])
+    )
+    return SELECT_INDICATORS
+
+async def toggle_indicator_group(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Отмечает группу показателей или снимает отметку"""
+    query = update.callback_query
+    await query.answer()
+    idx = int(query.data.split(':', 1)[1])
+    selected = context.user_data.setdefault('selected_groups', [])
+    if idx in selected:
+        selected.remove(idx)
+    elif idx < len(INDICATOR_GROUPS):
+        selected.append(idx)
+    await query.edit_message_reply_markup(indicator_groups_keyboard(selected))
+    return SELECT_INDICATORS
+
+async def select_industry(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Группы выбраны: выбор отрасли для сравнения"""
+    query = update.callback_query
+    if not context.user_data.get('selected_groups'):
+        await query.answer("Выберите хотя бы одну группу")
+        return SELECT_INDICATORS
+    
+    await query.answer()
+    industry_standards.reload()
+    await query.edit_message_text("🏭 С нормативами какой отрасли сравнить?", reply_markup=industry_keyboard())
+    return SELECT_INDUSTRY
+
+async def perform_selective_analysis(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Выборочный анализ: только выбранные группы и, по желанию, нормативы отрасли"""
+    query = update.callback_query
+    await query.answer()
+    selected = context.user_data.pop('selected_groups', [])
+    session = get_session(update)
+    if 'analysis' not in session or not selected:
+        await query.edit_message_text("❌ Сначала загрузите файл с данными")
+        return ConversationHandler.END
+    
+    groups = [group for idx, group in enumerate(INDICATOR_GROUPS) if idx in selected]
+    industry = query.data.split(':', 1)[1] or None
+    if industry not in industry_standards.codes:
+        industry = None
+    await query.edit_message_text(f"🎯 Анализирую: {', '.join(groups)}...")
+    
+    # Группы, отрасль и версия нормативов в имени отчета: каждая выборка кэшируется отдельно
+    name = f"selective-{'-'.join(map(str, sorted(selected)))}-{industry or ''}-{industry_standards.version}"
+    with metrics.span('render', report='selective'):
+        report = get_cached_report(session, name, lambda analysis: generate_selective_report(analysis, groups, industry))
+    
+    session['last_analysis'] = report
+    save_session(update, session)
+    
+    with metrics.span('send', report='selective'):
+        await reply_long_text(query.message, report)
+    return ConversationHandler.END
+
+async def cancel_selective_analysis(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Отмена выборочного анализа"""
+    context.user_data.pop('selected_groups', None)
+    if update.callback_query:
+        await update.callback_query.answer()
+        await update.callback_query.edit_message_text("✖️ Выборочный анализ отменен")
+    else:
+        await update.message.reply_text("✖️ Выборочный анализ отменен")
+    return ConversationHandler.END
+
+def selective_analysis_handler():
+    """Диалог выборочного анализа: группы показателей -> отрасль -> отчет"""
+    # Диалог начинается с сообщения, поэтому состояние ведется по чату и
+    # пользователю (per_message=False) - предупреждение PTB об этом не нужно
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', PTBUserWarning)
+        return ConversationHandler(
+            entry_points=[MessageHandler(filters.Text(["🎯 Выборочный анализ"]), start_selective_analysis)],
+            states={
+                SELECT_INDICATORS: [
+                    CallbackQueryHandler(toggle_indicator_group, pattern=r"^group:\d+$"),
+                    CallbackQueryHandler(select_industry, pattern=r"^groups:done$"),
+                ],
+                SELECT_INDUSTRY: [CallbackQueryHandler(perform_selective_analysis, pattern=r"^industry:")],
+            },
+            fallbacks=[
+                CallbackQueryHandler(cancel_selective_analysis, pattern=r"^cancel$"),
+                CommandHandler("cancel", cancel_selective_analysis),
+            ],
+            allow_reentry=True,
+        )
+
+def get_forecast_models(session):
+    """Модели прогноза для файла сессии: подбираются один раз на файл и хранятся в сессии"""
+    models = session.get('forecast')
+    if models is None or models.source != session.get('cache_key'):
+        with metrics.span('fit', report='forecast'):
+            models = fit_forecast_models(session['analysis'], source=session.get('cache_key'))
+        session['forecast'] = models
+    return models
+
+async def perform_forecast(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Прогноз тенденций"""
+    session = get_session(update)
+    if 'analysis' not in session:
+        await update.message.reply_text("❌ Сначала загрузите файл с данными")
+        return
+    
+    await update.message.reply_text("🔮 Строю прогноз...")
+    
+    models = get_forecast_models(session)
+    
+    with metrics.span('render', report='forecast'):
+        report = generate_forecast_report(session['analysis'], models, FORECAST_HORIZON)
+    
+    session['last_analysis'] = report
+    save_session(update, session)
+    
+    with metrics.span('send', report='forecast'):
+        await reply_long_text(update.message, report)
+
+async def perform_export(update: Update, context: ContextTypes.DEFAULT_TYPE, file_format='txt'):
+    """Экспорт полного отчета файлом TXT или XLSX"""
+    session = get_session(update)
+    if 'analysis' not in session and not session.get('batch'):
+        await update.message.reply_text("❌ Сначала загрузите файл с данными")
+        return
     
-    context.user_data['last_analysis'] = report
+    await update.message.reply_text("📄 Создаю отчет...")
+    
+    models = get_forecast_models(session) if 'analysis' in session else None
+    spool_bytes = EXPORT_SPOOL_MB * 1024 * 1024
+    with metrics.span('render', report=f"export_{file_format}"):
+        if file_format == 'xlsx':
+            output = export_xlsx(iter_export_sheets(session, models), spool_bytes, "temp_files")
+        else:
+            output = export_txt(iter_export_report(session, models), spool_bytes, "temp_files")
+    save_session(update, session)
     
-    await update.message.reply_text(report)
+    base_name = os.path.splitext(session.get('file_name') or 'companies')[0]
+    with output, metrics.span('send', report=f"export_{file_format}"):
+        # Пока отчет в памяти, у SpooledTemporaryFile нет имени, а PTB читает его у
+        # файловых объектов - такой отчет отправляется байтами
+        await update.message.reply_document(
+            document=output if output.name is not None else output.read(),
+            filename=f"{base_name}_analysis.{file_format}",
+            caption="📄 Отчет готов"
+        )
+
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /export [txt|xlsx]"""
+    file_format = context.args[0].lower() if context.args else 'txt'
+    if file_format not in ('txt', 'xlsx'):
+        await update.message.reply_text("❌ Формат экспорта: /export txt или /export xlsx")
+        return
+    await perform_export(update, context, file_format)
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик текстовых сообщений"""
@@ -503,41 +1516,104 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif text == "📈 Анализ ликвидности":
         await perform_liquidity_analysis(update, context)
     elif text == "💎 Анализ рентабельности":
-        await update.message.reply_text("💎 Анализирую рентабельность...\n\n🔧 Функция в разработке")
+        await perform_profitability_analysis(update, context)
     elif text == "🏛️ Финансовая устойчивость":
-        await update.message.reply_text("🏛️ Анализирую устойчивость...\n\n🔧 Функция в разработке")
+        await perform_stability_analysis(update, context)
     elif text == "📋 Сравнение с нормативами":
-        await update.message.reply_text("🏭 Сравниваю с нормативами...\n\n🔧 Функция в разработке")
+        await perform_industry_comparison(update, context)
     elif text == "🔮 Прогноз тенденций":
-        await update.message.reply_text("🔮 Строю прогноз...\n\n🔧 Функция в разработке")
+        await perform_forecast(update, context)
     elif text == "📄 Экспорт в TXT":
-        await update.message.reply_text("📄 Создаю отчет...\n\n🔧 Функция в разработке")
-    elif text == "🎯 Выборочный анализ":
-        await update.message.reply_text("🎯 Выборочный анализ...\n\n🔧 Функция в разработке")
+        await perform_export(update, context)
     elif text == "📁 Загрузить файл":
         await update.message.reply_text("📎 Пожалуйста, загрузите Excel файл с отчетностью")
     elif text == "ℹ️ Помощь":
         await help_command(update, context)
 
+async def on_startup(application):
+    """Запускает прогрев библиотек анализа и HTTP-сервер метрик"""
+    register_metrics()
+    if LAZY_WARMUP:
+        # Процессы пула создаются после прогрева и получают библиотеки готовыми
+        analysis_pool.warm_up(warm_up, pd, np, openpyxl, xlrd)
+    if not METRICS_PORT:
+        return
+    try:
+        application.bot_data['metrics_server'] = await metrics.serve(METRICS_HOST, METRICS_PORT)
+        print(f"📈 Метрики: http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+    except OSError as e:
+        print(f"⚠️ Не удалось запустить сервер метрик на порту {METRICS_PORT}: {e}")
+
+async def on_shutdown(application):
+    """Освобождает ресурсы при завершении бота"""
+    analysis_pool.shutdown()
+    sessions.close()
+    server = application.bot_data.pop('metrics_server', None)
+    if server is not None:
+        server.close()
+    print(f"📊 Ожидание обновлений в очереди: {update_processor.wait_stats.format()}")
+
+def application_builder():
+    """Настраивает приложение: конкурентность обработки, лимиты отправки и адрес Bot API"""
+    builder = (
+        Application.builder()
+        .token(TELEGRAM_BOT_TOKEN)
+        .concurrent_updates(update_processor)
+        .rate_limiter(rate_limiter)
+    )
+    if TELEGRAM_API_BASE_URL:
+        builder = builder.base_url(f"{TELEGRAM_API_BASE_URL}/bot").base_file_url(f"{TELEGRAM_API_BASE_URL}/file/bot")
+    return builder
+
+def run_application(application):
+    """Запускает бота в режиме polling или webhook"""
+    if BOT_MODE == 'webhook':
+        application.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET,
+            max_connections=WEBHOOK_MAX_CONNECTIONS
+        )
+    else:
+        application.run_polling()
+
 def main():
     """Основная функция"""
+    if not TELEGRAM_BOT_TOKEN:
+        print("❌ ОШИБКА: TELEGRAM_BOT_TOKEN не установлен!")
+        exit(1)
+    if BOT_MODE == 'webhook' and not WEBHOOK_URL:
+        print("❌ ОШИБКА: для BOT_MODE=webhook нужен WEBHOOK_URL!")
+        exit(1)
+
+    print("✅ Токен успешно загружен!")
+    print("🚀 БУХГАЛТЕРСКИЙ АНАЛИЗАТОР ЗАПУЩЕН...")
     print("🔧 Инициализация полной версии бота...")
     
     # Создаем приложение
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    application = application_builder().post_init(on_startup).post_shutdown(on_shutdown).build()
     
     # Добавляем обработчики
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", help_command))
+    application.add_handler(CommandHandler("export", export_command))
     application.add_handler(MessageHandler(filters.Document.ALL, receive_document))
+    application.add_handler(selective_analysis_handler())
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
     
     print("✅ Полная версия бота успешно запущена!")
-    print("🌐 Режим: POLLING")
+    if JOB_QUEUE_URL:
+        print(f"⚙️ Анализ в процессах analysis_worker.py, очередь задач: {JOB_QUEUE_URL}")
+    else:
+        print(f"⚙️ Процессов анализа: {analysis_pool.workers}, очередь: {analysis_pool.queue_size}")
+    print(f"⚙️ Параллельных обновлений: {UPDATE_CONCURRENCY} (по очереди внутри чата)")
+    print(f"🌐 Режим: {BOT_MODE.upper()}")
     print("🚀 Бот готов к работе!")
     
     # Запускаем бота
-    application.run_polling()
+    run_application(application)
 
 if __name__ == '__main__':
     main()
@@ -17,6 +17,25 @@ if not TELEGRAM_BOT_TOKEN:
     print("❌ ОШИБКА: TELEGRAM_BOT_TOKEN не установлен!")
     exit(1)
 
+# Режим работы: polling (по умолчанию) или webhook
+BOT_MODE = os.environ.get('BOT_MODE', 'polling').lower()
+WEBHOOK_URL = os.environ.get('WEBHOOK_URL', '')
+WEBHOOK_LISTEN = os.environ.get('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.environ.get('WEBHOOK_PORT', os.environ.get('PORT', 8443)))
+WEBHOOK_PATH = os.environ.get('WEBHOOK_PATH', 'telegram')
+WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET') or None
+WEBHOOK_MAX_CONNECTIONS = int(os.environ.get('WEBHOOK_MAX_CONNECTIONS', 40))
+
+# Сколько обновлений обрабатывать одновременно
+UPDATE_CONCURRENCY = int(os.environ.get('UPDATE_CONCURRENCY', 1))
+
+# Адрес Bot API (для локальной заглушки tools/fake_telegram.py)
+TELEGRAM_API_BASE_URL = os.environ.get('TELEGRAM_API_BASE_URL', '').rstrip('/')
+
+if BOT_MODE == 'webhook' and not WEBHOOK_URL:
+    print("❌ ОШИБКА: для BOT_MODE=webhook нужен WEBHOOK_URL!")
+    exit(1)
+
 print("✅ Токен успешно загружен!")
 print("🚀 Запускаю упрощенную версию бота...")
 
@@ -93,12 +112,33 @@ async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик загрузки файлов"""
     await update.message.reply_text("📎 Спасибо за файл! Обработка файлов временно недоступна.\n\n⚠️ Функция в разработке")
 
+def application_builder():
+    """Настраивает приложение: конкурентность обработки и адрес Bot API"""
+    builder = Application.builder().token(TELEGRAM_BOT_TOKEN).concurrent_updates(UPDATE_CONCURRENCY)
+    if TELEGRAM_API_BASE_URL:
+        builder = builder.base_url(f"{TELEGRAM_API_BASE_URL}/bot").base_file_url(f"{TELEGRAM_API_BASE_URL}/file/bot")
+    return builder
+
+def run_application(application):
+    """Запускает бота в режиме polling или webhook"""
+    if BOT_MODE == 'webhook':
+        application.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET,
+            max_connections=WEBHOOK_MAX_CONNECTIONS
+        )
+    else:
+        application.run_polling()
+
 def main():
     """Основная функция (синхронная версия)"""
     print("🔧 Инициализация бота...")
     
     # Создаем приложение
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    application = application_builder().build()
     
     # Добавляем обработчики
     application.add_handler(CommandHandler("start", start))
@@ -107,11 +147,11 @@ def main():
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
     
     print("✅ Бот успешно запущен!")
-    print("🌐 Режим: POLLING")
+    print(f"🌐 Режим: {BOT_MODE.upper()}")
     print("🚀 Бот готов к работе!")
     
     # Запускаем бота (синхронная версия)
-    application.run_polling()
+    run_application(application)
 
 if __name__ == '__main__':
     main()
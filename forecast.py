@@ -0,0 +1,157 @@
+from dataclasses import dataclass
+
+from lazy_import import lazy_module
+
+np = lazy_module('numpy')
+
+# Модели тренда (индексы - значения TrendModels.model)
+LINEAR, LOG_LINEAR, SMOOTHING = 0, 1, 2
+MODEL_NAMES = {LINEAR: 'линейный тренд', LOG_LINEAR: 'экспоненциальный тренд', SMOOTHING: 'экспоненциальное сглаживание'}
+
+# Сетка параметров сглаживания Холта: уровень (alpha) × тренд (beta)
+SMOOTHING_ALPHAS = (0.2, 0.4, 0.6, 0.8)
+SMOOTHING_BETAS = (0.1, 0.3, 0.5)
+
+
+@dataclass(slots=True)
+class TrendModels:
+    """Подобранные модели тренда для набора рядов (по одной на ряд)
+
+    ``times`` рядов - годы от первого периода, ``step`` - типичный шаг между
+    периодами. Для каждого ряда хранятся параметры всех моделей и номер
+    выбранной; поля - списки, чтобы модели можно было сохранить в JSON.
+    """
+    source: str
+    series: list
+    t_last: float
+    step: float
+    model: list
+    intercept: list
+    slope: list
+    level: list
+    trend: list
+    last_value: list
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def predict(self, times):
+        """Прогноз всех рядов на моменты times: массив (моменты, ряды)"""
+        times = np.asarray(times, dtype=float)[:, None]
+        intercept, slope = np.array(self.intercept), np.array(self.slope)
+        linear = intercept + slope * times
+        with np.errstate(over='ignore'):
+            log_linear = np.exp(linear)
+        steps = (times - self.t_last) / self.step if self.step else np.zeros_like(times)
+        smoothing = np.array(self.level) + np.array(self.trend) * steps
+        return np.choose(np.array(self.model), [linear, log_linear, smoothing])
+
+
+def fit_least_squares(times, values):
+    """Прямая a + b*t по каждому столбцу values сразу (NaN - пропуск)
+
+    Нормальные уравнения решаются в замкнутом виде для всех рядов одним
+    векторным проходом. Возвращает intercept, slope и число точек.
+    """
+    mask = ~np.isnan(values)
+    weights = mask.astype(float)
+    t = times[:, None]
+    y = np.where(mask, values, 0.0)
+
+    n = weights.sum(axis=0)
+    sum_t = (weights * t).sum(axis=0)
+    sum_tt = (weights * t * t).sum(axis=0)
+    sum_y = y.sum(axis=0)
+    sum_ty = (y * t).sum(axis=0)
+
+    denominator = n * sum_tt - sum_t * sum_t
+    slope = np.zeros(n.shape)
+    np.divide(n * sum_ty - sum_t * sum_y, denominator, out=slope, where=denominator > 1e-12)
+    intercept = np.zeros(n.shape)
+    np.divide(sum_y - slope * sum_t, n, out=intercept, where=n > 0)
+    return intercept, slope, n
+
+
+def fit_smoothing(values):
+    """Линейное сглаживание Холта для всех рядов и всей сетки параметров сразу
+
+    Параметры выбираются по наименьшей сумме квадратов ошибок прогноза на
+    шаг вперед. Возвращает уровень, тренд на конец ряда и эту сумму.
+    """
+    alphas, betas = np.meshgrid(SMOOTHING_ALPHAS, SMOOTHING_BETAS, indexing='ij')
+    alphas, betas = alphas.reshape(-1, 1), betas.reshape(-1, 1)
+    shape = (len(alphas), values.shape[1])
+    level = np.full(shape, np.nan)
+    trend = np.zeros(shape)
+    sse = np.zeros(shape)
+
+    for observed in values:
+        present = ~np.isnan(observed)
+        started = ~np.isnan(level)
+        predicted = level + trend
+        error = np.where(started & present, observed - predicted, 0.0)
+        sse += error * error
+
+        update = started & present
+        new_level = np.where(update, alphas * observed + (1 - alphas) * predicted, predicted)
+        trend = np.where(update, betas * (new_level - level) + (1 - betas) * trend, trend)
+        # Первое наблюдение ряда задает начальный уровень
+        level = np.where(~started & present, observed, new_level)
+
+    best = np.argmin(sse, axis=0)
+    columns = np.arange(values.shape[1])
+    return level[best, columns], trend[best, columns], sse[best, columns]
+
+
+def fit_trends(times, values, source=None, series=None):
+    """Подбирает линейную, лог-линейную модели и сглаживание для всех рядов
+
+    times - моменты периодов в годах, values - матрица периоды × ряды (NaN -
+    нет значения). Для каждого ряда выбирается модель с наименьшей ошибкой
+    на истории; лог-линейная - только для положительных рядов, сглаживание и
+    лог-линейная - при трех и более точках.
+    """
+    times = np.asarray(times, dtype=float)
+    values = np.asarray(values, dtype=float)
+    mask = ~np.isnan(values)
+    points = mask.sum(axis=0)
+
+    intercept, slope, _ = fit_least_squares(times, values)
+    linear_sse = np.where(mask, values - (intercept + slope * times[:, None]), 0.0)
+    linear_sse = (linear_sse * linear_sse).sum(axis=0)
+
+    positive = (np.where(mask, values, 1.0) > 0).all(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_values = np.where(mask & positive, np.log(np.where(mask & positive, values, 1.0)), np.nan)
+    log_intercept, log_slope, _ = fit_least_squares(times, log_values)
+    with np.errstate(over='ignore', invalid='ignore'):
+        log_sse = np.where(mask, values - np.exp(log_intercept + log_slope * times[:, None]), 0.0)
+    log_sse = (log_sse * log_sse).sum(axis=0)
+
+    level, trend, smoothing_sse = fit_smoothing(values)
+
+    # Ошибки моделей, которые ряду не подходят, считаем бесконечными
+    errors = np.stack([
+        linear_sse,
+        np.where(positive & (points >= 3), log_sse, np.inf),
+        np.where(points >= 3, smoothing_sse, np.inf),
+    ])
+    errors = np.where(np.isnan(errors), np.inf, errors)
+    model = np.argmin(errors, axis=0)
+
+    last_value = np.array([column[~np.isnan(column)][-1] if has else np.nan
+                           for column, has in zip(values.T, points > 0)])
+    steps = np.diff(times)
+    return TrendModels(
+        source=source,
+        series=list(series) if series is not None else list(range(values.shape[1])),
+        t_last=float(times[-1]) if len(times) else 0.0,
+        step=float(np.median(steps)) if len(steps) else 0.0,
+        model=model.tolist(),
+        intercept=np.where(model == LOG_LINEAR, log_intercept, intercept).tolist(),
+        slope=np.where(model == LOG_LINEAR, log_slope, slope).tolist(),
+        level=np.nan_to_num(level).tolist(),
+        trend=trend.tolist(),
+        last_value=last_value.tolist(),
+    )
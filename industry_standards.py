@@ -0,0 +1,154 @@
+import csv
+import json
+import logging
+import os
+import time
+
+from lazy_import import lazy_module
+
+np = lazy_module('numpy')
+
+logger = logging.getLogger(__name__)
+
+# Оценка коэффициента относительно норматива
+BELOW, WITHIN, ABOVE = -1, 0, 1
+
+
+class IndustryStandards:
+    """Отраслевые нормативы, скомпилированные в массивы границ
+
+    Нормативы - словарь ``{код: {'name': ..., 'standards': {коэффициент: (от, до)}}}``
+    в формате ``INDUSTRY_STANDARDS``. Границы складываются в массивы
+    отрасли × коэффициенты (порядок коэффициентов - ``ratio_names``), так что
+    ``score`` оценивает коэффициенты всех периодов сразу по всем отраслям.
+
+    Если задан ``path`` (JSON в том же формате или CSV со столбцами
+    industry, name, ratio, low, high), отрасли из файла добавляются к
+    встроенным или заменяют их. Файл перечитывается при изменении, но
+    проверяется не чаще раза в ``reload_interval`` секунд; при ошибке
+    чтения остаются прежние нормативы.
+    """
+
+    def __init__(self, ratio_names, builtin, path=None, reload_interval=30):
+        self.ratio_names = list(ratio_names)
+        self.ratio_index = {name: idx for idx, name in enumerate(self.ratio_names)}
+        self.builtin = builtin
+        self.path = path
+        self.reload_interval = reload_interval
+        self.version = 0
+        self._mtime = None
+        self._checked = 0.0
+        self._compile(builtin)
+        self.reload()
+
+    def reload(self, force=False):
+        """Перечитывает файл нормативов, если он изменился; возвращает True при обновлении"""
+        if not self.path:
+            return False
+        now = time.monotonic()
+        if not force and now - self._checked < self.reload_interval:
+            return False
+        self._checked = now
+
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            if self._mtime is not None:
+                logger.warning("Файл нормативов %s пропал, использую встроенные", self.path)
+                self._mtime = None
+                self._compile(self.builtin)
+            return False
+        if mtime == self._mtime and not force:
+            return False
+
+        try:
+            loaded = load_standards(self.path)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning("Не удалось прочитать нормативы %s: %s", self.path, e)
+            return False
+
+        self._mtime = mtime
+        self._compile({**self.builtin, **loaded})
+        logger.info("Загружены нормативы из %s: отраслей %d", self.path, len(self.codes))
+        return True
+
+    def score(self, ratios):
+        """Оценивает коэффициенты (..., коэффициенты) по всем отраслям
+
+        Возвращает массив оценок (..., отрасли, коэффициенты) со значениями
+        BELOW/WITHIN/ABOVE и маску, где есть и значение, и норматив.
+        """
+        self.reload()
+        values = np.asarray(ratios, dtype=float)[..., None, :]
+        known = ~np.isnan(values) & ~np.isnan(self.low)
+        # Сравнение с NaN дает False, такие ячейки закрываются маской known
+        with np.errstate(invalid='ignore'):
+            scores = np.where(values < self.low, BELOW, np.where(values > self.high, ABOVE, WITHIN))
+        return scores.astype(np.int8), known
+
+    def fit(self, scores, known):
+        """Доля коэффициентов в пределах норматива по каждой отрасли (NaN - сравнивать нечего)"""
+        within = ((scores == WITHIN) & known).sum(axis=-1)
+        total = known.sum(axis=-1)
+        fit = np.full(total.shape, np.nan)
+        np.divide(within, total, out=fit, where=total > 0)
+        return fit
+
+    @property
+    def low(self):
+        """Нижние границы: массив отрасли × коэффициенты"""
+        return self._bands()[0]
+
+    @property
+    def high(self):
+        """Верхние границы: массив отрасли × коэффициенты"""
+        return self._bands()[1]
+
+    def _bands(self):
+        if self._arrays is None:
+            shape = (len(self._low), len(self.ratio_names))
+            self._arrays = np.array(self._low, dtype=float).reshape(shape), np.array(self._high, dtype=float).reshape(shape)
+        return self._arrays
+
+    def _compile(self, standards):
+        # Границы копятся в списках: массивы numpy строятся при первой оценке
+        codes = list(standards)
+        low = [[float('nan')] * len(self.ratio_names) for _ in codes]
+        high = [[float('nan')] * len(self.ratio_names) for _ in codes]
+        for row, code in enumerate(codes):
+            for ratio_name, (band_low, band_high) in standards[code]['standards'].items():
+                column = self.ratio_index.get(ratio_name)
+                if column is None:
+                    logger.warning("Норматив для неизвестного коэффициента '%s' (%s) пропущен", ratio_name, code)
+                    continue
+                low[row][column] = float(band_low)
+                high[row][column] = float(band_high)
+
+        self.codes = codes
+        self.names = [standards[code].get('name', code) for code in codes]
+        self._low = low
+        self._high = high
+        self._arrays = None
+        self.version += 1
+
+
+def load_standards(path):
+    """Читает нормативы из JSON или CSV в формате INDUSTRY_STANDARDS"""
+    if path.lower().endswith('.csv'):
+        standards = {}
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            for row in csv.DictReader(f):
+                code = row['industry'].strip()
+                industry = standards.setdefault(code, {'name': (row.get('name') or code).strip(), 'standards': {}})
+                industry['standards'][row['ratio'].strip()] = (float(row['low']), float(row['high']))
+        return standards
+
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    return {
+        code: {
+            'name': industry.get('name', code),
+            'standards': {name: (float(low), float(high)) for name, (low, high) in industry['standards'].items()},
+        }
+        for code, industry in data.items()
+    }
@@ -0,0 +1,424 @@
+import asyncio
+import contextlib
+import importlib
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from urllib.parse import urlparse
+from uuid import uuid4
+
+from analysis_pool import QueueFullError, JobTimeoutError
+
+logger = logging.getLogger(__name__)
+
+# Состояния задачи
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = 'queued', 'running', 'done', 'failed', 'cancelled'
+
+
+class JobError(Exception):
+    """Задача завершилась ошибкой в процессе анализа; текст - сообщение исключения"""
+
+
+@dataclass(frozen=True, slots=True)
+class Job:
+    """Задача, взятая процессом анализа: имя функции и аргументы"""
+    id: int
+    func: str
+    args: tuple
+
+
+@dataclass(frozen=True, slots=True)
+class JobFile:
+    """Аргумент задачи - файл, сохраненный в очереди под ключом key
+
+    Процесс анализа перед выполнением задачи заменяет его путем к локальной
+    копии файла с расширением format.
+    """
+    key: str
+    format: str
+
+
+class SQLiteJobQueue:
+    """Очередь задач анализа в файле SQLite
+
+    Подходит для фронтенда и процессов анализа на одной машине (или с общим
+    томом): процессы работают с одним файлом базы в режиме WAL. Задачи и их
+    результаты сериализуются pickle - очередь доступна только своим процессам.
+    Задача, которую не успели взять до ее срока, не выполняется.
+    """
+
+    def __init__(self, path, retention=3600):
+        self.path = path
+        self.retention = retention
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Фронтенд обращается к очереди из потоков asyncio.to_thread
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " func TEXT NOT NULL,"
+            " args BLOB NOT NULL,"
+            " status TEXT NOT NULL,"
+            " deadline REAL NOT NULL,"
+            " worker TEXT,"
+            " result BLOB,"
+            " error TEXT,"
+            " updated REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files (key TEXT PRIMARY KEY, data BLOB NOT NULL, updated REAL NOT NULL)"
+        )
+
+    def put(self, func, args, timeout):
+        """Ставит задачу в очередь и возвращает ее номер"""
+        now = time.time()
+        with self._lock:
+            return self._conn.execute(
+                "INSERT INTO jobs (func, args, status, deadline, updated) VALUES (?, ?, ?, ?, ?)",
+                (func, pickle.dumps(args), QUEUED, now + timeout, now)
+            ).lastrowid
+
+    def claim(self, worker, wait=1.0, poll_interval=0.05):
+        """Берет самую старую задачу в работу; None, если за wait секунд задач не появилось"""
+        deadline = time.monotonic() + wait
+        while True:
+            job = self._claim_one(worker)
+            if job is not None or time.monotonic() >= deadline:
+                return job
+            time.sleep(poll_interval)
+
+    def _claim_one(self, worker):
+        now = time.time()
+        with self._lock, self._transaction():
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated = ? WHERE status = ? AND deadline < ?",
+                (CANCELLED, "Истек срок задачи", now, QUEUED, now)
+            )
+            row = self._conn.execute(
+                "SELECT id, func, args FROM jobs WHERE status = ? ORDER BY id LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, updated = ? WHERE id = ?", (RUNNING, worker, now, row[0])
+            )
+        return Job(row[0], row[1], pickle.loads(row[2]))
+
+    def complete(self, job_id, result):
+        self._finish(job_id, DONE, result=pickle.dumps(result))
+
+    def fail(self, job_id, error):
+        self._finish(job_id, FAILED, error=str(error))
+
+    def _finish(self, job_id, status, result=None, error=None):
+        # Отмененная задача остается отмененной: ее результат никто не ждет
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated = ? WHERE id = ? AND status = ?",
+                (status, result, error, time.time(), job_id, RUNNING)
+            )
+
+    def result(self, job_id):
+        """Состояние задачи, результат и текст ошибки; завершенная задача удаляется"""
+        with self._lock:
+            row = self._conn.execute("SELECT status, result, error FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return CANCELLED, None, "Задача не найдена"
+            status, result, error = row
+            if status in (DONE, FAILED):
+                self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        return status, pickle.loads(result) if status == DONE else None, error
+
+    def cancel(self, job_id):
+        """Отменяет задачу: ждущая не будет выполнена, результат выполняемой не сохранится"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, updated = ? WHERE id = ? AND status IN (?, ?)",
+                (CANCELLED, time.time(), job_id, QUEUED, RUNNING)
+            )
+
+    def pending(self):
+        """Число задач, которые еще не взяты в работу"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+
+    def put_file(self, key, data):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (key, data, updated) VALUES (?, ?, ?)", (key, data, time.time())
+            )
+
+    def get_file(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM files WHERE key = ?", (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    def delete_file(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM files WHERE key = ?", (key,))
+
+    def purge(self):
+        """Удаляет задачи и файлы, к которым не обращались дольше retention секунд"""
+        cutoff = time.time() - self.retention
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM jobs WHERE status != ? AND updated < ?", (QUEUED, cutoff)).rowcount
+            deleted += self._conn.execute("DELETE FROM files WHERE updated < ?", (cutoff,)).rowcount
+        return deleted
+
+    def close(self):
+        self._conn.close()
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE: задачу не возьмут два процесса одновременно
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+
+class RedisJobQueue:
+    """Очередь задач анализа в Redis - для процессов анализа на разных машинах
+
+    Номера задач - список ``<prefix>:queue``, задача - хэш ``<prefix>:job:<номер>``,
+    файлы - ключи ``<prefix>:file:<ключ>``; все ключи, кроме списка, живут не
+    дольше retention секунд. Нужен пакет redis (pip install redis).
+    """
+
+    def __init__(self, url, prefix='analysis', retention=3600):
+        redis = importlib.import_module('redis')
+        self._redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.retention = retention
+
+    def _key(self, *parts):
+        return ":".join((self.prefix, *map(str, parts)))
+
+    def put(self, func, args, timeout):
+        job_id = self._redis.incr(self._key('next'))
+        key = self._key('job', job_id)
+        pipe = self._redis.pipeline()
+        pipe.hset(key, mapping={
+            'func': func, 'args': pickle.dumps(args), 'status': QUEUED, 'deadline': time.time() + timeout,
+        })
+        pipe.expire(key, self.retention)
+        pipe.lpush(self._key('queue'), job_id)
+        pipe.execute()
+        return job_id
+
+    def claim(self, worker, wait=1.0):
+        deadline = time.monotonic() + wait
+        while True:
+            remaining = deadline - time.monotonic()
+            # BRPOP ждет целое число секунд; 0 означает "бесконечно"
+            popped = self._redis.brpop(self._key('queue'), timeout=max(1, round(remaining)))
+            if popped is None:
+                return None
+            job_id = int(popped[1])
+            key = self._key('job', job_id)
+            func, args, status, job_deadline = self._redis.hmget(key, 'func', 'args', 'status', 'deadline')
+            if status is not None and status.decode() == QUEUED and float(job_deadline) >= time.time():
+                self._redis.hset(key, mapping={'status': RUNNING, 'worker': worker})
+                return Job(job_id, func.decode(), pickle.loads(args))
+            if time.monotonic() >= deadline:
+                return None
+
+    def complete(self, job_id, result):
+        self._finish(job_id, DONE, result=pickle.dumps(result))
+
+    def fail(self, job_id, error):
+        self._finish(job_id, FAILED, error=str(error))
+
+    def _finish(self, job_id, status, **fields):
+        key = self._key('job', job_id)
+        current = self._redis.hget(key, 'status')
+        if current is None or current.decode() != RUNNING:
+            return
+        self._redis.hset(key, mapping={'status': status, **fields})
+
+    def result(self, job_id):
+        key = self._key('job', job_id)
+        status, result, error = self._redis.hmget(key, 'status', 'result', 'error')
+        if status is None:
+            return CANCELLED, None, "Задача не найдена"
+        status = status.decode()
+        if status in (DONE, FAILED):
+            self._redis.delete(key)
+        return status, pickle.loads(result) if status == DONE else None, error.decode() if error else None
+
+    def cancel(self, job_id):
+        key = self._key('job', job_id)
+        if self._redis.exists(key):
+            self._redis.hset(key, 'status', CANCELLED)
+
+    def pending(self):
+        return self._redis.llen(self._key('queue'))
+
+    def put_file(self, key, data):
+        self._redis.set(self._key('file', key), data, ex=self.retention)
+
+    def get_file(self, key):
+        return self._redis.get(self._key('file', key))
+
+    def delete_file(self, key):
+        self._redis.delete(self._key('file', key))
+
+    def purge(self):
+        # Ключи задач и файлов удаляет сам Redis по сроку жизни
+        return 0
+
+    def close(self):
+        self._redis.close()
+
+
+def open_job_queue(url):
+    """Очередь по адресу: sqlite:///путь/к/базе или redis://хост:порт/база"""
+    parsed = urlparse(url)
+    if parsed.scheme == 'sqlite':
+        return SQLiteJobQueue(url[len('sqlite:///'):] if url.startswith('sqlite:///') else parsed.path)
+    if parsed.scheme in ('redis', 'rediss', 'unix'):
+        return RedisJobQueue(url)
+    raise ValueError(f"Неизвестная очередь задач: {url}")
+
+
+class QueueAnalysisPool:
+    """Пул анализа поверх общей очереди задач - замена AnalysisPool для фронтенда
+
+    Задачи выполняют процессы analysis_worker.py, запущенные отдельно (на этой
+    или других машинах), поэтому пропускная способность анализа
+    масштабируется числом процессов, а не ресурсами бота. Интерфейс тот же,
+    что у AnalysisPool: ``submit`` ставит задачу и ждет результат, опрашивая
+    очередь; при переполнении очереди - ``QueueFullError``, по истечении
+    ``timeout`` задача отменяется и поднимается ``JobTimeoutError``.
+    Функция задачи передается по имени: процесс анализа ищет ее в
+    statement_parser.JOB_FUNCTIONS.
+    """
+
+    def __init__(self, url, queue_size=20, timeout=120.0, poll_interval=0.2, pending_interval=5.0):
+        self.url = url
+        self.queue_size = max(0, int(queue_size))
+        self.timeout = float(timeout)
+        self.poll_interval = poll_interval
+        self.pending_interval = pending_interval
+        self._queue = None
+        self._running = 0
+        self._pending = 0
+        self._refresher = None
+
+    @property
+    def workers(self):
+        """Процессы анализа запускаются отдельно, фронтенду их число неизвестно"""
+        return None
+
+    @property
+    def running(self):
+        """Задачи этого фронтенда, результата которых он ждет"""
+        return self._running
+
+    @property
+    def waiting(self):
+        """Задачи в общей очереди, которые еще не взяты в работу
+
+        Значение - последнее известное: метрики читают его из цикла событий,
+        поэтому очередь опрашивается фоновой задачей раз в
+        ``pending_interval`` секунд (и при каждой постановке задачи).
+        """
+        return self._pending
+
+    def _start_refresher(self):
+        if self._refresher is None or self._refresher.done():
+            self._refresher = asyncio.get_running_loop().create_task(self._refresh_pending())
+
+    async def _refresh_pending(self):
+        while True:
+            try:
+                self._pending = await asyncio.to_thread(self.queue.pending)
+            except Exception as e:
+                logger.warning("Не удалось узнать длину очереди задач: %s", e)
+            await asyncio.sleep(self.pending_interval)
+
+    @property
+    def queue(self):
+        if self._queue is None:
+            self._queue = open_job_queue(self.url)
+        return self._queue
+
+    def warm_up(self, func, *args):
+        """Библиотеки анализа нужны процессам анализа, а не фронтенду: прогревать нечего
+
+        Вызывается при запуске бота - с этого момента обновляется ``waiting``.
+        """
+        self._start_refresher()
+
+    @contextlib.asynccontextmanager
+    async def job_source(self, upload):
+        """Файл для задач: содержимое кладется в очередь, задачи получают JobFile
+
+        Ключ у каждой загрузки свой: одинаковые файлы, разбираемые
+        одновременно, не удаляют копию друг у друга.
+        """
+        key = uuid4().hex
+        await asyncio.to_thread(self.queue.put_file, key, bytes(upload.data))
+        try:
+            yield JobFile(key, upload.format)
+        finally:
+            await asyncio.to_thread(self.queue.delete_file, key)
+
+    async def submit(self, func, *args, on_queued=None):
+        """Ставит задачу func(*args) в очередь и ждет ее результат"""
+        self._start_refresher()
+        queue = self.queue
+        position = self._pending = await asyncio.to_thread(queue.pending)
+        if position >= self.queue_size:
+            raise QueueFullError(f"В очереди уже {position} задач")
+
+        job_id = await asyncio.to_thread(queue.put, func.__name__, args, self.timeout)
+        self._running += 1
+        try:
+            if position and on_queued is not None:
+                await on_queued(position + 1)
+
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.timeout
+            delay = 0.01
+            while True:
+                status, result, error = await asyncio.to_thread(queue.result, job_id)
+                if status == DONE:
+                    return result
+                if status == FAILED:
+                    raise JobError(error)
+                if status == CANCELLED:
+                    raise JobError(error or "Задача отменена")
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    logger.warning("Задача %s #%s превысила лимит %.0f с", func.__name__, job_id, self.timeout)
+                    await asyncio.to_thread(queue.cancel, job_id)
+                    raise JobTimeoutError(f"Обработка заняла больше {self.timeout:.0f} с")
+                await asyncio.sleep(min(delay, remaining))
+                delay = min(delay * 2, self.poll_interval)
+        except asyncio.CancelledError:
+            await asyncio.shield(asyncio.to_thread(queue.cancel, job_id))
+            raise
+        finally:
+            self._running -= 1
+
+    def shutdown(self):
+        if self._refresher is not None:
+            self._refresher.cancel()
+            self._refresher = None
+        if self._queue is not None:
+            self._queue.close()
+            self._queue = None
@@ -0,0 +1,132 @@
+import math
+import re
+from collections import defaultdict
+
+_WORD = re.compile(r'[0-9a-zа-я]+')
+
+# Слова, которые не отличают одну статью от другой
+STOP_WORDS = frozenset(['итого', 'всего', 'по', 'и', 'в', 'на', 'за', 'от', 'total', 'of', 'and', 'the'])
+
+
+def normalize(label):
+    """Нижний регистр, ё -> е, слова без знаков препинания, служебных слов и чисел (номеров и кодов строк)"""
+    words = _WORD.findall(str(label).lower().replace('ё', 'е'))
+    return " ".join(word for word in words if word not in STOP_WORDS and not word.isdigit())
+
+
+def features(text, ngram=3, stem=5):
+    """Признаки нормализованного текста: основы слов и символьные n-граммы слов
+
+    Основа - первые ``stem`` букв слова, так что "активов" и "активы" дают
+    один признак; n-граммы делают сравнение устойчивым к опечаткам и
+    составным словам, основы - к перестановке слов. Конец слова не
+    отмечается, чтобы окончания меньше влияли на сходство.
+    """
+    result = set()
+    for word in text.split():
+        result.add(f"={word[:stem]}")
+        padded = f" {word}"
+        result.update(padded[idx:idx + ngram] for idx in range(len(padded) - ngram + 1))
+    return result
+
+
+class LabelIndex:
+    """Инвертированный индекс вариантов названий статей для нечеткой классификации
+
+    ``variants`` - пары (вариант названия, статья); статья None означает
+    известную строку, которая не относится ни к одной статье (например,
+    "Прочие внеоборотные активы"), - так она не совпадет по ошибке с похожей
+    статьей. Признаки варианта взвешиваются по IDF, сходство с названием -
+    косинус взвешенных множеств признаков; признаки названия, которых нет
+    ни в одном варианте, получают наибольший вес. Побеждает вариант с
+    наибольшим сходством (при равенстве - более ранний), если оно не ниже
+    ``threshold``.
+
+    Длинное название ("Выручка от реализации продукции (работ, услуг)")
+    похоже на короткий вариант ("выручка") меньше порога, хотя содержит его
+    целиком. Поэтому, если ни один вариант не набрал ``threshold``,
+    выбирается вариант с наибольшей долей своих взвешенных признаков,
+    найденных в названии, - если эта доля не ниже ``containment``.
+    """
+
+    def __init__(self, variants, threshold=0.6, ngram=3, containment=0.95):
+        self.threshold = threshold
+        self.containment = containment
+        self.ngram = ngram
+        self.items = []
+        self.exact = {}
+        variant_features = []
+        for variant, item in variants:
+            text = normalize(variant)
+            if not text or text in self.exact:
+                continue
+            self.exact[text] = item
+            self.items.append(item)
+            variant_features.append(features(text, ngram))
+
+        document_frequency = defaultdict(int)
+        for feature_set in variant_features:
+            for feature in feature_set:
+                document_frequency[feature] += 1
+        count = len(variant_features)
+        # Квадраты весов: в косинус бинарных векторов входят только они
+        self.weights = {
+            feature: (math.log((count + 1) / (frequency + 1)) + 1) ** 2
+            for feature, frequency in document_frequency.items()
+        }
+        self.unknown_weight = (math.log(count + 1) + 1) ** 2
+
+        self.postings = defaultdict(list)
+        self.norms = []
+        for variant_id, feature_set in enumerate(variant_features):
+            for feature in feature_set:
+                self.postings[feature].append(variant_id)
+            self.norms.append(math.sqrt(sum(self.weights[feature] for feature in feature_set)))
+
+    def __len__(self):
+        return len(self.items)
+
+    def match(self, label):
+        """Лучшая статья для названия и сходство (None, если ниже порога)"""
+        text = normalize(label)
+        if not text:
+            return None, 0.0
+        if text in self.exact:
+            return self.exact[text], 1.0
+
+        scores = defaultdict(float)
+        label_norm = 0.0
+        for feature in features(text, self.ngram):
+            weight = self.weights.get(feature)
+            if weight is None:
+                label_norm += self.unknown_weight
+                continue
+            label_norm += weight
+            for variant_id in self.postings[feature]:
+                scores[variant_id] += weight
+        if not scores:
+            return None, 0.0
+
+        label_norm = math.sqrt(label_norm)
+        best_id, best_score = None, 0.0
+        for variant_id, dot in scores.items():
+            score = dot / (self.norms[variant_id] * label_norm)
+            if score > best_score or (score == best_score and variant_id < best_id):
+                best_id, best_score = variant_id, score
+        if best_score >= self.threshold:
+            return self.items[best_id], best_score
+
+        # Вариант, почти целиком входящий в название; из равных - самый похожий
+        contained_id, contained_key = None, None
+        for variant_id, dot in scores.items():
+            norm = self.norms[variant_id]
+            key = (dot / norm ** 2, dot / norm, -variant_id)
+            if contained_key is None or key > contained_key:
+                contained_id, contained_key = variant_id, key
+        if contained_key[0] >= self.containment:
+            return self.items[contained_id], contained_key[0]
+        return None, best_score
+
+    def classify(self, label):
+        """Статья для названия или None"""
+        return self.match(label)[0]
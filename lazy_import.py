@@ -0,0 +1,54 @@
+import importlib
+import logging
+import sys
+import threading
+import time
+import types
+
+logger = logging.getLogger(__name__)
+
+
+class LazyModule(types.ModuleType):
+    """Модуль, который импортируется при первом обращении к его атрибуту
+
+    После импорта атрибуты модуля копируются в заглушку, так что дальнейшие
+    обращения стоят как обычные.
+    """
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__['_lock'] = threading.Lock()
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def _load(self):
+        with self._lock:
+            module = self.__dict__.get('_module')
+            if module is None:
+                imported = self.__name__ in sys.modules
+                started = time.perf_counter()
+                module = importlib.import_module(self.__name__)
+                self.__dict__.update(module.__dict__)
+                self.__dict__['_module'] = module
+                if not imported:
+                    logger.info("Импортирован %s за %.0f мс", self.__name__, (time.perf_counter() - started) * 1000)
+        return module
+
+    @property
+    def loaded(self):
+        return self.__dict__.get('_module') is not None
+
+
+def lazy_module(name):
+    """Заглушка модуля name, которая импортирует его при первом использовании"""
+    return LazyModule(name)
+
+
+def warm_up(*modules):
+    """Импортирует ленивые модули заранее (вызывается в фоновом потоке)"""
+    for module in modules:
+        try:
+            module._load()
+        except Exception as e:
+            logger.warning("Не удалось заранее импортировать %s: %s", module.__name__, e)
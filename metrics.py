@@ -0,0 +1,161 @@
+import asyncio
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм длительности, секунды
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for idx, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[idx] += 1
+
+
+class Metrics:
+    """Счетчики, гистограммы этапов и выдача в формате Prometheus
+
+    ``span`` замеряет этап обработки, пишет структурированную строку лога
+    (JSON) и добавляет длительность в гистограмму ``<prefix>_stage_seconds``.
+    """
+
+    def __init__(self, prefix='finbot'):
+        self.prefix = prefix
+        self._counters = {}
+        self._histograms = {}
+        self._callbacks = {}
+        self._help = {}
+
+    def inc(self, name, value=1, help=None, **labels):
+        """Увеличивает счетчик"""
+        key = (name, tuple(sorted(labels.items())))
+        self._counters[key] = self._counters.get(key, 0) + value
+        if help:
+            self._help[name] = help
+
+    def observe(self, name, value, help=None, **labels):
+        """Добавляет значение в гистограмму"""
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = Histogram()
+        histogram.observe(value)
+        if help:
+            self._help[name] = help
+
+    def register(self, name, func, help='', kind='gauge'):
+        """Значение, которое вычисляется при каждом запросе метрик (gauge или counter)"""
+        self._callbacks[name] = (func, kind)
+        self._help[name] = help
+
+    @contextmanager
+    def span(self, stage, **fields):
+        """Замеряет этап обработки; в fields - контекст для строки лога"""
+        started = time.perf_counter()
+        status = 'ok'
+        try:
+            yield fields
+        except BaseException:
+            status = 'error'
+            self.inc('errors_total', help="Ошибки по этапам обработки", stage=stage)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self.observe('stage_seconds', elapsed, help="Длительность этапов обработки", stage=stage)
+            self.log(stage, elapsed, status, **fields)
+
+    def log(self, stage, seconds, status='ok', **fields):
+        """Структурированная строка лога об этапе"""
+        logger.info(json.dumps({
+            'event': 'stage', 'stage': stage, 'status': status,
+            'duration_ms': round(seconds * 1000, 2), **fields
+        }, ensure_ascii=False, default=str))
+
+    def render(self):
+        """Текст метрик в формате Prometheus"""
+        lines = []
+        described = set()
+
+        def describe(name, kind):
+            full_name = f"{self.prefix}_{name}"
+            if full_name not in described:
+                described.add(full_name)
+                if self._help.get(name):
+                    lines.append(f"# HELP {full_name} {self._help[name]}")
+                lines.append(f"# TYPE {full_name} {kind}")
+            return full_name
+
+        for (name, labels), value in sorted(self._counters.items()):
+            full_name = describe(name, 'counter')
+            lines.append(f"{full_name}{_labels(labels)} {value}")
+
+        for (name, labels), histogram in sorted(self._histograms.items(), key=lambda item: item[0]):
+            full_name = describe(name, 'histogram')
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                lines.append(f"{full_name}_bucket{_labels(labels + (('le', bound),))} {count}")
+            lines.append(f"{full_name}_bucket{_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+            lines.append(f"{full_name}_sum{_labels(labels)} {histogram.sum}")
+            lines.append(f"{full_name}_count{_labels(labels)} {histogram.count}")
+
+        for name, (func, kind) in sorted(self._callbacks.items()):
+            try:
+                value = func()
+            except Exception as e:
+                logger.warning("Не удалось получить метрику %s: %s", name, e)
+                continue
+            full_name = describe(name, kind)
+            lines.append(f"{full_name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    async def serve(self, host='0.0.0.0', port=9091):
+        """Запускает HTTP-сервер с /metrics и /healthz"""
+        return await asyncio.start_server(self._handle_http, host, port)
+
+    async def _handle_http(self, reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # Заголовки запроса не нужны, но их надо дочитать
+            while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request_line.decode('latin-1').split()
+            path = parts[1].split('?')[0] if len(parts) > 1 else ''
+            if path == '/metrics':
+                status, body = '200 OK', self.render().encode('utf-8')
+                content_type = 'text/plain; version=0.0.4; charset=utf-8'
+            elif path == '/healthz':
+                status, body, content_type = '200 OK', b'ok\n', 'text/plain'
+            else:
+                status, body, content_type = '404 Not Found', b'not found\n', 'text/plain'
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('latin-1') + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append(f'{key}="{value}"')
+    return '{' + ','.join(escaped) + '}'
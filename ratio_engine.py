@@ -0,0 +1,163 @@
+from dataclasses import dataclass
+
+from lazy_import import lazy_module
+
+# numpy импортируется при первом расчете, а не при запуске бота
+np = lazy_module('numpy')
+
+
+@dataclass(frozen=True, slots=True)
+class Ratio:
+    """Коэффициент numerator / denominator * scale; считается, если знаменатель больше нуля
+
+    При ``average`` знаменатель - средняя величина за период: полусумма
+    значений на начало (конец предыдущего периода) и на конец периода.
+    ``higher_is_better`` - лучше ли большее значение (у долговой нагрузки - нет);
+    по нему компании ранжируются в сравнениях.
+    """
+    name: str
+    numerator: str
+    denominator: str
+    scale: float = 1.0
+    average: bool = False
+    higher_is_better: bool = True
+
+    @property
+    def is_percent(self):
+        return self.scale == 100
+
+
+class RatioEngine:
+    """Расчет коэффициентов сразу для всех периодов по матрице периоды × статьи
+
+    Статьи периодов раскладываются в матрицу ``to_matrix``: строка - период,
+    столбец - статья, отсутствующая статья - NaN. ``compute`` считает все
+    коэффициенты таблицы ``ratios`` одним векторным проходом, ``changes`` -
+    изменения к предыдущему периоду. Перед матрицей может быть любое число
+    осей (например, компании × периоды × статьи), расчет идет по двум последним.
+
+    ``fallbacks`` задает статьи, которые при нулевом значении заменяются
+    суммой составляющих (оборотные активы - деньги, дебиторка и запасы).
+    ``absolute`` - статьи, которые в отчетности бывают со знаком минус
+    (расходы в скобках): в расчете берется их модуль.
+
+    Коэффициент периода зависит только от статей этого периода и, для
+    средних величин, предыдущего: поэтому при добавлении периода достаточно
+    посчитать его строку (и строку следующего за ним), передав ``compute``
+    статьи на начало периодов.
+    """
+
+    def __init__(self, items, ratios, fallbacks=None, absolute=()):
+        self.ratios = tuple(ratios)
+        self.names = [ratio.name for ratio in self.ratios]
+        self.items = list(items)
+        for ratio in self.ratios:
+            for item in (ratio.numerator, ratio.denominator):
+                if item not in self.items:
+                    self.items.append(item)
+        self.index = {item: idx for idx, item in enumerate(self.items)}
+        self.fallbacks = dict(fallbacks or {})
+        self.absolute = tuple(item for item in absolute if item in self.index)
+
+        self._numerators = [self.index[ratio.numerator] for ratio in self.ratios]
+        self._denominators = [self.index[ratio.denominator] for ratio in self.ratios]
+        self._scales = [ratio.scale for ratio in self.ratios]
+        self._averaged = [idx for idx, ratio in enumerate(self.ratios) if ratio.average]
+        self._fallbacks = [
+            (self.index[item], [self.index[component] for component in components])
+            for item, components in self.fallbacks.items()
+        ]
+        self._absolute = [self.index[item] for item in self.absolute]
+
+    def subset(self, names):
+        """Движок только для коэффициентов names и статей, от которых они зависят
+
+        Статьи - числители и знаменатели выбранных коэффициентов и составляющие
+        их замен; порядок статей и коэффициентов сохраняется.
+        """
+        ratios = [ratio for ratio in self.ratios if ratio.name in names]
+        needed = {item for ratio in ratios for item in (ratio.numerator, ratio.denominator)}
+        fallbacks = {item: components for item, components in self.fallbacks.items() if item in needed}
+        needed.update(component for components in fallbacks.values() for component in components)
+        return RatioEngine([item for item in self.items if item in needed], ratios, fallbacks, self.absolute)
+
+    def to_matrix(self, periods_data):
+        """Матрица периоды × статьи из словаря {период: {статья: значение}}"""
+        nan = np.nan
+        rows = [[data.get(item, nan) for item in self.items] for data in periods_data.values()]
+        return np.array(rows, dtype=float).reshape(len(rows), len(self.items))
+
+    def _values(self, matrix):
+        # Отсутствующая статья считается нулевой
+        values = np.where(np.isnan(matrix), 0.0, matrix)
+        if self._absolute:
+            values[..., self._absolute] = np.abs(values[..., self._absolute])
+        for item, components in self._fallbacks:
+            fallback = values[..., components[0]]
+            for component in components[1:]:
+                fallback = fallback + values[..., component]
+            values[..., item] = np.where(values[..., item] == 0, fallback, values[..., item])
+        return values
+
+    def compute(self, matrix, opening=None):
+        """Коэффициенты всех периодов: массив (..., периоды, коэффициенты), NaN - не рассчитан
+
+        ``opening`` - статьи на начало каждого периода (матрица той же формы,
+        что и matrix); по умолчанию - предыдущая строка matrix, у первого
+        периода начальных значений нет. Без значения на начало средняя
+        величина равна значению на конец периода.
+        """
+        values = self._values(matrix)
+        numerators = values[..., self._numerators]
+        denominators = values[..., self._denominators]
+        if self._averaged:
+            columns = [self._denominators[idx] for idx in self._averaged]
+            closing = denominators[..., self._averaged]
+            if opening is None:
+                start = np.zeros_like(closing)
+                start[..., 1:, :] = closing[..., :-1, :]
+            else:
+                start = self._values(opening)[..., columns]
+            denominators[..., self._averaged] = np.where(start > 0, (start + closing) / 2, closing)
+        ratios = np.full(numerators.shape, np.nan)
+        np.divide(numerators, denominators, out=ratios, where=denominators > 0)
+        return ratios * self._scales
+
+    def period_ratios(self, ratios):
+        """Строки матрицы коэффициентов в виде словарей {название: значение} без пропусков"""
+        # NaN не равен сам себе
+        return [
+            {name: value for name, value in zip(self.names, row) if value == value}
+            for row in ratios.tolist()
+        ]
+
+    @staticmethod
+    def changes(values):
+        """Изменение к предыдущему периоду: абсолютное и в процентах от модуля прошлого значения
+
+        Работает и для матрицы статей, и для матрицы коэффициентов; для первого
+        периода и при нулевом или отсутствующем прошлом значении - NaN.
+        """
+        delta = np.full(values.shape, np.nan)
+        growth = np.full(values.shape, np.nan)
+        previous = values[..., :-1, :]
+        delta[..., 1:, :] = values[..., 1:, :] - previous
+        np.divide(delta[..., 1:, :], np.abs(previous), out=growth[..., 1:, :], where=previous != 0)
+        return delta, growth * 100
+
+    @staticmethod
+    def stack(matrices):
+        """Складывает матрицы компаний в массив компании × периоды × статьи
+
+        Разное число периодов выравнивается по последнему периоду: недостающие
+        ранние периоды заполняются NaN.
+        """
+        matrices = list(matrices)
+        if not matrices:
+            return np.empty((0, 0, 0))
+        periods = max(matrix.shape[0] for matrix in matrices)
+        stacked = np.full((len(matrices), periods, matrices[0].shape[1]), np.nan)
+        for idx, matrix in enumerate(matrices):
+            if matrix.shape[0]:
+                stacked[idx, periods - matrix.shape[0]:] = matrix
+        return stacked
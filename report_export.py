@@ -0,0 +1,41 @@
+import tempfile
+
+from lazy_import import lazy_module
+
+openpyxl = lazy_module('openpyxl')
+
+
+def _spool(max_memory, directory):
+    """Файл в памяти, который при превышении max_memory байт переносится на диск"""
+    return tempfile.SpooledTemporaryFile(max_size=max_memory, dir=directory)
+
+
+def export_txt(sections, max_memory=8 * 1024 * 1024, directory=None):
+    """Пишет разделы отчета в текстовый файл по одному
+
+    Разметка ``**`` убирается. Возвращает файл, перемотанный в начало;
+    закрыть его должен вызывающий.
+    """
+    output = _spool(max_memory, directory)
+    for section in sections:
+        output.write(section.replace('**', '').encode('utf-8'))
+    output.seek(0)
+    return output
+
+
+def export_xlsx(sheets, max_memory=8 * 1024 * 1024, directory=None):
+    """Пишет листы (название, строки) в XLSX в режиме write-only
+
+    Строки каждого листа могут быть генератором: openpyxl в этом режиме
+    не держит лист в памяти целиком. Возвращает файл, перемотанный в начало.
+    """
+    workbook = openpyxl.Workbook(write_only=True)
+    for title, rows in sheets:
+        sheet = workbook.create_sheet(title[:31])
+        for row in rows:
+            sheet.append(row)
+
+    output = _spool(max_memory, directory)
+    workbook.save(output)
+    output.seek(0)
+    return output
@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import re
+import time
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Предел длины сообщения Telegram (в единицах UTF-16)
+MESSAGE_LIMIT = 4096
+
+
+def message_length(text):
+    """Длина текста так, как ее считает Telegram (эмодзи - две единицы)"""
+    return len(text.encode('utf-16-le')) // 2
+
+
+def split_message(text, limit=MESSAGE_LIMIT):
+    """Делит текст на сообщения не длиннее limit по границам разделов и строк"""
+    return pack_messages(re.split(r'(?<=\n\n)', text), limit)
+
+
+def pack_messages(sections, limit=MESSAGE_LIMIT):
+    """Собирает разделы в сообщения не длиннее limit
+
+    Раздел целиком переносится в следующее сообщение, если не помещается;
+    слишком длинный раздел делится по строкам, а слишком длинная строка -
+    по символам.
+    """
+    messages = []
+    current, current_length = [], 0
+
+    def flush():
+        nonlocal current, current_length
+        text = "".join(current).strip()
+        if text:
+            messages.append(text)
+        current, current_length = [], 0
+
+    def pieces(section, length):
+        if length <= limit:
+            yield section, length
+            return
+        for line in section.splitlines(keepends=True):
+            line_length = message_length(line)
+            if line_length <= limit:
+                yield line, line_length
+                continue
+            chunk, chunk_length = [], 0
+            for char in line:
+                char_length = message_length(char)
+                if chunk_length + char_length > limit:
+                    yield "".join(chunk), chunk_length
+                    chunk, chunk_length = [], 0
+                chunk.append(char)
+                chunk_length += char_length
+            if chunk:
+                yield "".join(chunk), chunk_length
+
+    for section in sections:
+        for piece, length in pieces(section, message_length(section)):
+            if current_length + length > limit:
+                flush()
+            current.append(piece)
+            current_length += length
+    flush()
+    return messages
+
+
+class TokenBucket:
+    """Ведро токенов: rate запросов в секунду с запасом capacity на всплеск"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.paused_until = 0.0
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Ждет токен; возвращает время ожидания в секундах"""
+        started = time.monotonic()
+        # Блокировка выдает токены строго в порядке очереди
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self.paused_until - now
+                if wait <= 0 and self.tokens >= 1:
+                    self.tokens -= 1
+                    return now - started
+                await asyncio.sleep(max(wait, (1 - self.tokens) / self.rate))
+
+    def pause(self, seconds):
+        """Не выдавать токены seconds секунд (после RetryAfter)"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+    @property
+    def idle(self):
+        """Ведро полное и никто не ждет - его можно удалить и создать заново"""
+        now = time.monotonic()
+        self._refill(now)
+        return self.tokens >= self.capacity and now >= self.paused_until and not self._lock.locked()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class ChatRateLimiter(BaseRateLimiter):
+    """Очередь исходящих запросов с лимитами Telegram на чат и на бота
+
+    Запросы с ``chat_id`` (сообщения, файлы, правки) идут через общее ведро
+    (``global_rate`` в секунду) и ведро чата: ``chat_rate`` в секунду для
+    личных чатов, ``group_rate`` - для групп и каналов. Запросы одного чата
+    отправляются строго по очереди, разные чаты - параллельно. При RetryAfter запрос повторяется
+    до ``max_retries`` раз: чат (или весь бот, если чата нет) ставится на
+    паузу на указанное Telegram время плюс растущая добавка ``backoff``.
+    """
+
+    def __init__(self, global_rate=30, chat_rate=1.0, group_rate=20 / 60, burst=3, max_retries=3, backoff=0.5):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.retries = 0
+        self.throttled_seconds = 0.0
+        self.waiting = 0
+        self._global = None
+        self._chats = {}
+
+    async def initialize(self):
+        self._global = TokenBucket(self.global_rate, self.global_rate)
+
+    async def shutdown(self):
+        self._chats.clear()
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        max_retries = rate_limit_args if isinstance(rate_limit_args, int) else self.max_retries
+        chat_id = data.get('chat_id')
+        try:
+            chat_id = int(chat_id)
+        except (TypeError, ValueError):
+            pass
+
+        if chat_id is None:
+            return await self._send(None, callback, args, kwargs, max_retries)
+
+        lock, bucket, users = self._chats.get(chat_id, (None, None, 0))
+        if lock is None:
+            # Отрицательный id или @username - группа или канал
+            private = isinstance(chat_id, int) and chat_id > 0
+            lock = asyncio.Lock()
+            bucket = TokenBucket(self.chat_rate if private else self.group_rate, self.burst)
+        self._chats[chat_id] = (lock, bucket, users + 1)
+        self.waiting += 1
+        try:
+            async with lock:
+                return await self._send(bucket, callback, args, kwargs, max_retries)
+        finally:
+            self.waiting -= 1
+            lock, bucket, users = self._chats[chat_id]
+            if users > 1:
+                self._chats[chat_id] = (lock, bucket, users - 1)
+            elif bucket.idle:
+                del self._chats[chat_id]
+            else:
+                # Ведро еще помнит недавние отправки - оставляем его до следующего запроса
+                self._chats[chat_id] = (lock, bucket, 0)
+                if len(self._chats) > 10000:
+                    self._prune()
+
+    async def _send(self, bucket, callback, args, kwargs, max_retries):
+        for attempt in range(max_retries + 1):
+            if bucket is not None:
+                self.throttled_seconds += await bucket.acquire()
+                self.throttled_seconds += await self._global.acquire()
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt == max_retries:
+                    logger.warning("Лимит Telegram: запрос не отправлен после %d повторов", max_retries)
+                    raise
+                retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else e.retry_after
+                delay = retry_after + self.backoff * 2 ** attempt
+                self.retries += 1
+                logger.info("Лимит Telegram, повтор через %.1f с", delay)
+                if bucket is not None:
+                    bucket.pause(delay)
+                else:
+                    # Служебный запрос без чата: лимит касается всего бота
+                    self._global.pause(delay)
+                    await asyncio.sleep(delay)
+
+    def _prune(self):
+        for chat_id in [chat_id for chat_id, (_, bucket, users) in self._chats.items() if not users and bucket.idle]:
+            del self._chats[chat_id]
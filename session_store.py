@@ -0,0 +1,126 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class SessionStore:
+    """Сессии анализа пользователей в SQLite с кэшем горячих сессий в памяти
+
+    Сессия - словарь, который сериализуется функцией ``encode`` в строку
+    и восстанавливается ``decode``. Сессии читаются из базы лениво при
+    первом обращении; в памяти держится не больше ``hot_limit`` последних
+    сессий (LRU). Сессии, которые не сохранялись дольше ``ttl`` секунд,
+    считаются устаревшими и удаляются. Если сериализованная сессия больше
+    ``max_bytes``, из нее по порядку удаляются ключи ``droppable_keys``;
+    слишком большая сессия без таких ключей в базу не попадает.
+    """
+
+    def __init__(self, path, ttl=7 * 24 * 3600, max_bytes=1024 * 1024, hot_limit=2000,
+                 encode=json.dumps, decode=json.loads, droppable_keys=()):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hot_limit = hot_limit
+        self.encode = encode
+        self.decode = decode
+        self.droppable_keys = tuple(droppable_keys)
+        self._hot = OrderedDict()
+        self._saves = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " user_id INTEGER PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " updated REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated)")
+        self.purge_expired()
+
+    @property
+    def in_memory(self):
+        """Число сессий, которые сейчас держатся в памяти"""
+        return len(self._hot)
+
+    def get(self, user_id):
+        """Сессия пользователя (пустой словарь, если ее нет или она устарела)"""
+        session = self._hot.get(user_id)
+        if session is not None:
+            self._hot.move_to_end(user_id)
+            return session
+
+        row = self._conn.execute(
+            "SELECT data, updated FROM sessions WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        session = {}
+        if row is not None:
+            data, updated = row
+            if time.time() - updated > self.ttl:
+                self.delete(user_id)
+            else:
+                try:
+                    session = self.decode(data)
+                except Exception as e:
+                    logger.warning("Не удалось прочитать сессию %s: %s", user_id, e)
+
+        self._remember(user_id, session)
+        return session
+
+    def save(self, user_id, session):
+        """Сохраняет сессию; возвращает False, если она не уместилась в лимит"""
+        data = self.encode(session)
+        for key in self.droppable_keys:
+            if len(data.encode('utf-8')) <= self.max_bytes:
+                break
+            if key in session:
+                del session[key]
+                data = self.encode(session)
+
+        self._remember(user_id, session)
+        size = len(data.encode('utf-8'))
+        if size > self.max_bytes:
+            logger.warning("Сессия %s (%d байт) превышает лимит и хранится только в памяти", user_id, size)
+            return False
+
+        self._conn.execute(
+            "INSERT OR REPLACE INTO sessions (user_id, data, size, updated) VALUES (?, ?, ?, ?)",
+            (user_id, data, size, time.time())
+        )
+        self._saves += 1
+        if self._saves % 1000 == 0:
+            self.purge_expired()
+        return True
+
+    def delete(self, user_id):
+        self._hot.pop(user_id, None)
+        self._conn.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+
+    def purge_expired(self):
+        """Удаляет устаревшие сессии из базы"""
+        deleted = self._conn.execute(
+            "DELETE FROM sessions WHERE updated < ?", (time.time() - self.ttl,)
+        ).rowcount
+        if deleted:
+            logger.info("Удалено устаревших сессий: %d", deleted)
+        return deleted
+
+    def close(self):
+        self._hot.clear()
+        self._conn.close()
+
+    def _remember(self, user_id, session):
+        self._hot[user_id] = session
+        self._hot.move_to_end(user_id)
+        while len(self._hot) > self.hot_limit:
+            self._hot.popitem(last=False)
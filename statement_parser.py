@@ -0,0 +1,561 @@
+"""Разбор файлов отчетности: листы, периоды, статьи и их значения
+
+Модуль не хранит состояния бота (сессий, кэша, метрик), поэтому его
+импортируют и бот, и процессы analysis_worker.py: функции из
+JOB_FUNCTIONS выполняются в пуле процессов бота или по имени из общей
+очереди задач.
+"""
+import io
+import json
+import os
+import re
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import chain
+
+from label_index import LabelIndex, normalize
+from lazy_import import lazy_module
+from uploads import XLS
+
+pd = lazy_module('pandas')
+np = lazy_module('numpy')
+xlrd = lazy_module('xlrd')
+openpyxl = lazy_module('openpyxl')
+
+# Способ чтения Excel: auto - большие .xlsx читаются потоково, stream - всегда, pandas - никогда
+EXCEL_INGEST_MODE = os.environ.get('EXCEL_INGEST_MODE', 'auto')
+EXCEL_STREAMING_MIN_MB = float(os.environ.get('EXCEL_STREAMING_MIN_MB', 5))
+
+# Распознавание названий строк: порог сходства (0..1) и JSON со своими названиями {название: статья или null}
+LABEL_MATCH_THRESHOLD = float(os.environ.get('LABEL_MATCH_THRESHOLD', 0.6))
+LABEL_SYNONYMS_PATH = os.environ.get('LABEL_SYNONYMS_PATH') or None
+
+# Статьи отчетности и ключевые слова их названий
+BALANCE_ITEMS = {
+    # АКТИВЫ
+    'внеоборотные активы': ['внеоборотные', 'non-current', 'non-current assets', 'итого по разделу i'],
+    'основные средства': ['основные средства', 'fixed assets', 'property plant', 'property plant and equipment', 'ося'],
+    'нематериальные активы': ['нематериальные', 'intangible', 'intangible assets', 'нма'],
+    'запасы': ['запасы', 'inventories', 'inventory', 'товарно-материальные', 'тмц'],
+    'дебиторская задолженность': ['дебиторская', 'accounts receivable', 'receivables', 'trade receivables', 'дебитор'],
+    'денежные средства': ['денежные средства', 'денежные средства и денежные эквиваленты', 'cash', 'cash and equivalents', 'cash and cash equivalents', 'деньги', 'касса', 'расчетный счет'],
+    'оборотные активы': ['оборотные активы', 'current assets', 'оборотные', 'итого по разделу ii'],
+    'активы всего': ['активы', 'актив всего', 'total assets', 'итого активы', 'баланс актив'],
+    
+    # ПАССИВЫ
+    'капитал': ['капитал', 'собственный капитал', 'капитал и резервы', 'equity', 'shareholders equity', 'итого по разделу iii'],
+    'уставный капитал': ['уставный капитал', 'authorized capital', 'share capital', 'уставный фонд', 'уставной'],
+    'нераспределенная прибыль': ['нераспределенная прибыль', 'retained earnings', 'прибыль отчетного года', 'нераспределенная прибыль (непокрытый убыток)'],
+    'долгосрочные обязательства': ['долгосрочные обязательства', 'long-term liabilities', 'non-current liabilities', 'долгосрочные', 'итого по разделу iv'],
+    'краткосрочные обязательства': ['краткосрочные обязательства', 'short-term liabilities', 'current liabilities', 'краткосрочные', 'итого по разделу v'],
+    'кредиты займы': ['кредиты', 'займы', 'заемные средства', 'кредиты и займы', 'loans', 'borrowings', 'кредит',
+                      'долгосрочные заемные средства', 'краткосрочные заемные средства', 'долгосрочные кредиты', 'краткосрочные кредиты'],
+    'кредиторская задолженность': ['кредиторская задолженность', 'accounts payable', 'trade payables', 'кредиторская'],
+    'обязательства всего': ['обязательства', 'пассив всего', 'total liabilities', 'итого пассивы', 'баланс пассив'],
+    
+    # ОФР
+    'выручка': ['выручка', 'revenue', 'sales', 'доход', 'объем продаж'],
+    'себестоимость': ['себестоимость', 'cost of sales', 'cost of goods sold', 'cost', 'себестоимость продаж'],
+    'валовая прибыль': ['валовая прибыль', 'gross profit', 'прибыль валовая', 'валовая прибыль (убыток)'],
+    'операционные расходы': ['операционные расходы', 'operating expenses', 'коммерческие расходы', 'управленческие расходы'],
+    'прибыль до налогообложения': ['прибыль до налогообложения', 'profit before tax', 'прибыль до налога'],
+    'проценты к уплате': ['проценты к уплате', 'interest expense', 'interest paid'],
+    'чистая прибыль': ['чистая прибыль', 'net profit', 'net income', 'прибыль чистая', 'чистая прибыль (убыток)', 'чистый убыток', 'net loss',
+                       'чистая прибыль отчетного периода']
+}
+
+# Коды строк РСБУ (Форма 1 - баланс, Форма 2 - отчет о финансовых результатах);
+# если в файле есть столбец "Код", статья определяется по нему, а не по названию
+LINE_CODES = {
+    '1100': 'внеоборотные активы',
+    '1110': 'нематериальные активы',
+    '1150': 'основные средства',
+    '1200': 'оборотные активы',
+    '1210': 'запасы',
+    '1230': 'дебиторская задолженность',
+    '1250': 'денежные средства',
+    '1600': 'активы всего',
+    '1300': 'капитал',
+    '1310': 'уставный капитал',
+    '1370': 'нераспределенная прибыль',
+    '1400': 'долгосрочные обязательства',
+    '1500': 'краткосрочные обязательства',
+    '1520': 'кредиторская задолженность',
+    '1700': 'обязательства всего',
+    '2110': 'выручка',
+    '2120': 'себестоимость',
+    '2100': 'валовая прибыль',
+    '2300': 'прибыль до налогообложения',
+    '2330': 'проценты к уплате',
+    '2400': 'чистая прибыль',
+}
+
+CODE_HEADERS = {'код', 'код строки', 'код показателя', 'code', 'line code'}
+
+# Строки отчетности РСБУ, которые похожи на статьи, но ни к одной не относятся:
+# индекс названий знает их, чтобы не сопоставить по ошибке с похожей статьей
+IGNORED_LABELS = [
+    'баланс', 'результаты исследований и разработок', 'финансовые вложения', 'отложенные налоговые активы',
+    'прочие внеоборотные активы', 'налог на добавленную стоимость по приобретенным ценностям',
+    'ндс по приобретенным ценностям', 'прочие оборотные активы', 'собственные акции выкупленные у акционеров',
+    'переоценка внеоборотных активов', 'добавочный капитал', 'резервный капитал', 'резервный фонд',
+    'отложенные налоговые обязательства', 'оценочные обязательства', 'прочие обязательства',
+    'доходы будущих периодов', 'прибыль от продаж', 'доходы от участия в других организациях',
+    'проценты к получению', 'прочие доходы', 'прочие расходы', 'налог на прибыль',
+    'текущий налог на прибыль', 'отложенный налог на прибыль', 'совокупный финансовый результат периода',
+    'deferred tax', 'deferred tax assets', 'deferred tax liabilities', 'provisions', 'financial investments',
+    'other income', 'other expenses', 'income tax',
+    'прочие долгосрочные обязательства', 'прочие краткосрочные обязательства', 'задолженность перед персоналом',
+    'задолженность перед персоналом организации', 'задолженность перед государственными внебюджетными фондами',
+    'задолженность по налогам и сборам', 'доходы от продажи основных средств', 'operating profit', 'operating income',
+]
+
+# Служебные строки, которые не являются показателями
+SKIPPED_INDICATORS = ['Актив', 'Пассив', 'Наименование показателя']
+
+def excel_input(source):
+    """Файл для pandas/openpyxl: путь передается как есть, содержимое - через BytesIO без копии"""
+    return source if isinstance(source, str) else io.BytesIO(source)
+
+def source_size(source):
+    return os.path.getsize(source) if isinstance(source, str) else len(source)
+
+def read_excel_file(source, file_format, sheet_name=0, header_row=0):
+    """Читает Excel файл (путь или содержимое) движком для его формата (по умолчанию первый лист)"""
+    engine = 'xlrd' if file_format == XLS else 'openpyxl'
+    try:
+        return pd.read_excel(excel_input(source), sheet_name=sheet_name, header=header_row, engine=engine)
+    except Exception as e:
+        raise Exception(f"Не удалось прочитать файл: {str(e)}")
+
+def find_data_sheets(source, file_format, header_scan_rows=20):
+    """Листы с отчетностью: [(имя листа, номер строки заголовка)]
+
+    Читаются только первые строки каждого листа: лист нужен, если в одной из
+    них есть столбец показателей и хотя бы один период (Форма 1, Форма 2).
+    """
+    sheets = []
+    if file_format == XLS:
+        if isinstance(source, str):
+            book = xlrd.open_workbook(source, on_demand=True)
+        else:
+            book = xlrd.open_workbook(file_contents=source, on_demand=True)
+        try:
+            for sheet_idx in range(book.nsheets):
+                sheet = book.get_sheet(sheet_idx)
+                for row_idx in range(min(sheet.nrows, header_scan_rows)):
+                    row = [
+                        xlrd.xldate_as_datetime(cell.value, book.datemode)
+                        if cell.ctype == xlrd.XL_CELL_DATE else (cell.value if cell.value != '' else None)
+                        for cell in sheet.row(row_idx)
+                    ]
+                    if _is_header_row(row):
+                        sheets.append((sheet.name, row_idx))
+                        break
+                book.unload_sheet(sheet_idx)
+        finally:
+            book.release_resources()
+        return sheets
+    
+    workbook = openpyxl.load_workbook(excel_input(source), read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            rows = sheet.iter_rows(max_row=header_scan_rows, values_only=True)
+            for row_idx, row in enumerate(rows):
+                if _is_header_row(row):
+                    sheets.append((sheet.title, row_idx))
+                    break
+    finally:
+        workbook.close()
+    return sheets
+
+def read_excel_streaming(source, header_scan_rows=20, sheet_name=None):
+    """Потоково читает лист .xlsx и оставляет только столбец показателей, периоды и распознанные строки"""
+    workbook = openpyxl.load_workbook(excel_input(source), read_only=True, data_only=True)
+    try:
+        sheet = workbook[sheet_name] if sheet_name is not None else workbook.worksheets[0]
+        rows = sheet.iter_rows(values_only=True)
+        
+        # Заголовок - первая из начальных строк, где есть столбец показателей и периоды
+        scanned = []
+        header = None
+        for row in rows:
+            scanned.append(row)
+            if _is_header_row(row):
+                header = _header_names(row)
+                break
+            if len(scanned) >= header_scan_rows:
+                break
+        
+        if header is None:
+            # Как и pd.read_excel, считаем заголовком первую строку
+            if not scanned:
+                return pd.DataFrame()
+            header = _header_names(scanned[0])
+            pending = scanned[1:]
+        else:
+            pending = []
+        
+        indicator_idx = _find_indicator_index(header)
+        period_columns = [period['column'] for period in detect_periods(pd.DataFrame(columns=header))]
+        if indicator_idx is None or not period_columns:
+            return pd.DataFrame(columns=header)
+        
+        code_idx = _find_code_index(header)
+        keep = [indicator_idx] + [idx for idx, name in enumerate(header) if name in period_columns]
+        if code_idx is not None:
+            keep.append(code_idx)
+        records = []
+        for row in chain(pending, rows):
+            code = row[code_idx] if code_idx is not None and code_idx < len(row) else None
+            if code is None or line_code_item(code) is None:
+                value = row[indicator_idx] if indicator_idx < len(row) else None
+                if value is None:
+                    continue
+                label = str(value).strip()
+                if not label or label in SKIPPED_INDICATORS or not find_balance_item(label, [label]):
+                    continue
+            records.append([row[idx] if idx < len(row) else None for idx in keep])
+        
+        return pd.DataFrame(records, columns=[header[idx] for idx in keep])
+    finally:
+        workbook.close()
+
+def _header_names(row):
+    """Имена столбцов по строке заголовка, как их формирует pd.read_excel"""
+    names = []
+    seen = {}
+    for idx, value in enumerate(row):
+        name = f"Unnamed: {idx}" if value is None else value
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+def _is_header_row(row):
+    """Строка заголовка: есть столбец показателей и хотя бы один период"""
+    columns = _header_names(row)
+    return _find_indicator_index(columns) is not None and bool(detect_periods(pd.DataFrame(columns=columns)))
+
+def _is_indicator_header(value):
+    """Заголовок столбца с наименованиями показателей"""
+    value = str(value).lower()
+    return 'наименование' in value or 'показатель' in value
+
+def _find_indicator_index(row):
+    for idx, value in enumerate(row):
+        if value is not None and _is_indicator_header(value):
+            return idx
+    return None
+
+# Названия месяцев (первые три буквы) для текстовых периодов
+MONTHS = {
+    'янв': 1, 'фев': 2, 'мар': 3, 'апр': 4, 'май': 5, 'мая': 5, 'июн': 6,
+    'июл': 7, 'авг': 8, 'сен': 9, 'окт': 10, 'ноя': 11, 'дек': 12,
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12,
+}
+
+QUARTERS = {'1': 1, '2': 2, '3': 3, '4': 4, 'i': 1, 'ii': 2, 'iii': 3, 'iv': 4}
+
+_MONTH_NAME = r'(?:январ|феврал|март|апрел|ма[йя]|июн|июл|август|сентябр|октябр|ноябр|декабр|jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-zа-я]*\.?'
+
+# Все поддерживаемые форматы периодов в одном выражении; побеждает самое левое совпадение
+PERIOD_PATTERN = re.compile(rf"""
+    (?<!\d)(?P<d1>\d{{1,2}})[./](?P<m1>\d{{1,2}})[./](?P<y1>\d{{4}})(?!\d)          # 31.12.2023, 31/12/2023
+  | (?<!\d)(?P<y2>\d{{4}})-(?P<m2>\d{{1,2}})-(?P<d2>\d{{1,2}})(?!\d)                 # 2023-12-31
+  | (?<![a-zа-я\d])(?P<q3>[1-4]|iv|i{{1,3}})\s*-?\s*(?:кв[a-zа-я]*\.?|q)\s*(?P<y3>\d{{4}})  # 1 кв. 2024, IV квартал 2023
+  | (?<![a-zа-я])q(?P<q4>[1-4])\s*(?P<y4>\d{{4}})                                       # Q1 2024
+  | (?<!\d)(?P<d5>\d{{1,2}})\s+(?P<n5>{_MONTH_NAME})\s*(?P<y5>\d{{4}})                  # 31 декабря 2023
+  | (?<![a-zа-я])(?P<n6>{_MONTH_NAME})\s*(?P<y6>\d{{4}})                                # январь 2024
+  | за\s+(?P<m9>\d{{1,2}})\s+месяц[а-я]*\s+(?P<y9>\d{{4}})                              # за 9 месяцев 2024
+  | за\s+(?P<y7>\d{{4}})                                                                # за 2023 год
+  | (?<!\d)(?P<y8>\d{{4}})\s*(?:год|г\b|г\.)                                           # 2023 год, 2023 г.
+""", re.VERBOSE)
+
+def detect_periods(df):
+    """Определяет периоды в столбцах DataFrame"""
+    periods = []
+    
+    for col in df.columns:
+        if isinstance(col, datetime):
+            # Заголовок-дата (pandas/openpyxl читают такие ячейки как datetime)
+            date_obj = datetime(col.year, col.month, col.day)
+        else:
+            date_obj = parse_period_header(str(col))
+        
+        if date_obj is not None:
+            periods.append({
+                'column': col,
+                'date': date_obj,
+                'formatted': date_obj.strftime('%d.%m.%Y'),
+                'year': date_obj.year
+            })
+    
+    # Сортируем периоды по дате
+    periods.sort(key=lambda x: x['date'])
+    return periods
+
+@lru_cache(maxsize=4096)
+def parse_period_header(header):
+    """Дата окончания периода по заголовку столбца или None"""
+    match = PERIOD_PATTERN.search(header.lower().strip())
+    if match is None:
+        return None
+    
+    groups = match.groupdict()
+    try:
+        if groups['y1']:
+            return datetime(int(groups['y1']), int(groups['m1']), int(groups['d1']))
+        if groups['y2']:
+            return datetime(int(groups['y2']), int(groups['m2']), int(groups['d2']))
+        if groups['y3'] or groups['y4']:
+            year = int(groups['y3'] or groups['y4'])
+            quarter = QUARTERS[groups['q3'] or groups['q4']]
+            return month_end(year, quarter * 3)
+        if groups['y5']:
+            return datetime(int(groups['y5']), MONTHS[groups['n5'][:3]], int(groups['d5']))
+        if groups['y6']:
+            return month_end(int(groups['y6']), MONTHS[groups['n6'][:3]])
+        if groups['y9']:
+            return month_end(int(groups['y9']), int(groups['m9']))
+        year = int(groups['y7'] or groups['y8'])
+        return datetime(year, 12, 31)
+    except (ValueError, KeyError):
+        return None
+
+def month_end(year, month):
+    if month == 12:
+        return datetime(year, 12, 31)
+    return datetime(year, month + 1, 1) - timedelta(days=1)
+
+def find_balance_item(column_name, df_columns):
+    """Находит соответствие столбца статьям баланса"""
+    return _classify_label(str(column_name))[0]
+
+@lru_cache(maxsize=65536)
+def _classify_label(label):
+    """Статья для названия строки и признак точного совпадения (с кэшем по названию)"""
+    return _classify_text(normalize(label))
+
+@lru_cache(maxsize=65536)
+def _classify_text(text):
+    """Статья для нормализованного названия: сначала словарь вариантов, индекс n-грамм - только при промахе
+
+    Кэш по нормализованному тексту выручает, когда названия различаются
+    только регистром, знаками или номерами строк.
+    """
+    if text in label_index.exact:
+        return label_index.exact[text], True
+    return label_index.classify(text), False
+
+def clear_label_cache():
+    """Сбрасывает кэши классификации названий (для бенчмарков)"""
+    _classify_label.cache_clear()
+    _classify_text.cache_clear()
+
+def load_label_synonyms(path):
+    """Дополнительные названия статей из JSON: {название: статья или null}"""
+    with open(path, encoding='utf-8') as f:
+        synonyms = json.load(f)
+    variants = []
+    for label, item in synonyms.items():
+        if item is not None and item not in BALANCE_ITEMS:
+            print(f"⚠️ Неизвестная статья '{item}' для названия '{label}' пропущена")
+            continue
+        variants.append((label, item))
+    return variants
+
+def build_label_index():
+    """Индекс названий: свои названия из LABEL_SYNONYMS_PATH, статьи, ключевые слова и служебные строки"""
+    variants = load_label_synonyms(LABEL_SYNONYMS_PATH) if LABEL_SYNONYMS_PATH else []
+    variants += [(item, item) for item in BALANCE_ITEMS]
+    variants += [(keyword, item) for item, keywords in BALANCE_ITEMS.items() for keyword in keywords]
+    variants += [(label, None) for label in IGNORED_LABELS]
+    return LabelIndex(variants, threshold=LABEL_MATCH_THRESHOLD)
+
+label_index = build_label_index()
+
+def _is_code_header(value):
+    """Заголовок столбца с кодами строк отчетности"""
+    return str(value).lower().strip() in CODE_HEADERS
+
+def _find_code_index(row):
+    for idx, value in enumerate(row):
+        if value is not None and _is_code_header(value):
+            return idx
+    return None
+
+def line_code_item(value):
+    """Статья по коду строки РСБУ (1600, 2110.0, ' 2400 ') или None"""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return LINE_CODES.get(str(value).strip())
+
+def extract_financial_data_by_period(df, periods):
+    """Извлекает финансовые данные по периодам"""
+    financial_data = {}
+    
+    # Инициализируем данные для каждого периода
+    for period in periods:
+        financial_data[period['formatted']] = {}
+    
+    # Ищем столбец с наименованиями показателей
+    indicator_column = None
+    for col in df.columns:
+        if _is_indicator_header(col):
+            indicator_column = col
+            break
+    
+    if not indicator_column:
+        return financial_data
+    
+    # Классифицируем столбец показателей за один проход по уникальным названиям;
+    # надежность строки: 2 - код строки, 1 - точное название, 0 - нечеткое сходство
+    labels = df[indicator_column].astype(str).str.strip()
+    label_items, label_ranks = {}, {}
+    for label in pd.unique(labels):
+        if label and label not in SKIPPED_INDICATORS:
+            label_items[label], exact = _classify_label(label)
+            label_ranks[label] = int(exact)
+    row_items = labels.map(label_items).to_numpy()
+    row_ranks = labels.map(label_ranks).fillna(0).to_numpy()
+    
+    # Код строки РСБУ надежнее названия
+    code_column = next((col for col in df.columns if _is_code_header(col)), None)
+    if code_column is not None:
+        codes = df[code_column]
+        if not isinstance(codes, pd.DataFrame):
+            code_items = codes.map({code: line_code_item(code) for code in pd.unique(codes)}).to_numpy()
+            has_code = pd.notna(code_items)
+            row_items = np.where(has_code, code_items, row_items)
+            row_ranks = np.where(has_code, 2, row_ranks)
+    matched = pd.notna(row_items)
+    
+    if not matched.any():
+        return financial_data
+    
+    # Нечеткое совпадение (подстрока, соседняя статья) не заменяет строку статьи,
+    # найденную по коду или точному названию: остаются только самые надежные строки
+    ranks = pd.Series(row_ranks[matched])
+    best = ranks.groupby(row_items[matched]).transform('max').to_numpy()
+    matched[np.flatnonzero(matched)[ranks.to_numpy() < best]] = False
+    
+    row_items = row_items[matched]
+    row_positions = np.flatnonzero(matched)
+    
+    # Переводим столбцы периодов в числа целиком и отбрасываем пустые и нулевые значения
+    columns_by_period = {}
+    for period_idx, period in enumerate(periods):
+        values = _column_to_numeric(df, period['column'])
+        if values is None:
+            continue
+        values = values[matched]
+        valid = pd.notna(values) & (values != 0)
+        columns_by_period.setdefault(period['formatted'], []).append((period_idx, values, valid))
+    
+    for period_key, columns in columns_by_period.items():
+        if len(columns) == 1:
+            _, values, valid = columns[0]
+            financial_data[period_key].update(zip(row_items[valid], values[valid]))
+            continue
+        
+        # Несколько столбцов с одной датой: сохраняем построчный порядок записи
+        rows = np.concatenate([row_positions[valid] for _, _, valid in columns])
+        order = np.concatenate([np.full(valid.sum(), period_idx) for period_idx, _, valid in columns])
+        items = np.concatenate([row_items[valid] for _, _, valid in columns])
+        values = np.concatenate([values[valid] for _, values, valid in columns])
+        sequence = np.lexsort((order, rows))
+        financial_data[period_key].update(zip(items[sequence], values[sequence]))
+    
+    return financial_data
+
+def _column_to_numeric(df, column):
+    """Переводит столбец периода в массив чисел (нечисловые значения становятся NaN)"""
+    series = df[column]
+    if isinstance(series, pd.DataFrame):
+        # Повторяющиеся заголовки не поддерживаются
+        return None
+    try:
+        return pd.to_numeric(series, errors='coerce').to_numpy()
+    except (TypeError, ValueError):
+        return series.map(_cell_to_numeric).to_numpy(dtype=float)
+
+def _cell_to_numeric(value):
+    try:
+        return float(pd.to_numeric(value, errors='coerce'))
+    except (TypeError, ValueError):
+        return np.nan
+
+def use_streaming_reader(source, file_format):
+    """Нужно ли читать файл потоково (только .xlsx)"""
+    if file_format == XLS or EXCEL_INGEST_MODE == 'pandas':
+        return False
+    if EXCEL_INGEST_MODE == 'stream':
+        return True
+    return source_size(source) >= EXCEL_STREAMING_MIN_MB * 1024 * 1024
+
+def parse_sheet(source, file_format, sheet_name=None, header_row=0):
+    """Читает один лист и извлекает данные по периодам (выполняется в пуле процессов)
+
+    Возвращает данные по периодам листа и длительность этапов в секундах.
+    """
+    timings = {}
+    started = time.perf_counter()
+    
+    df = None
+    if use_streaming_reader(source, file_format):
+        try:
+            df = read_excel_streaming(source, sheet_name=sheet_name)
+        except Exception as e:
+            print(f"Потоковое чтение не удалось, читаю через pandas: {e}")
+    if df is None:
+        df = read_excel_file(source, file_format, 0 if sheet_name is None else sheet_name, header_row)
+    timings['read'], started = time.perf_counter() - started, time.perf_counter()
+    
+    periods = detect_periods(df)
+    timings['detect_periods'], started = time.perf_counter() - started, time.perf_counter()
+    if not periods:
+        return {}, timings
+    
+    periods_data = extract_financial_data_by_period(df, periods)
+    timings['extract'] = time.perf_counter() - started
+    return periods_data, timings
+
+def plan_workbook(source, file_format):
+    """Находит листы с отчетностью; если лист один, сразу его разбирает (выполняется в пуле процессов)
+
+    Возвращает список листов и результат parse_sheet либо None, если листов
+    несколько и их нужно разобрать отдельными задачами.
+    """
+    started = time.perf_counter()
+    try:
+        sheets = find_data_sheets(source, file_format)
+    except Exception as e:
+        print(f"Не удалось просмотреть листы, читаю первый: {e}")
+        sheets = []
+    sniff_seconds = time.perf_counter() - started
+    
+    if len(sheets) > 1:
+        return sheets, None
+    
+    # Ни один лист не похож на отчетность - как раньше, читаем первый
+    sheet_name, header_row = sheets[0] if sheets else (None, 0)
+    periods_data, timings = parse_sheet(source, file_format, sheet_name, header_row)
+    timings['sniff'] = sniff_seconds
+    return sheets, (periods_data, timings)
+
+def merge_periods_data(sheets_data):
+    """Объединяет данные листов в один словарь по периодам в порядке дат"""
+    merged = {}
+    for periods_data in sheets_data:
+        for period, data in periods_data.items():
+            merged.setdefault(period, {}).update(data)
+    return dict(sorted(merged.items(), key=lambda item: datetime.strptime(item[0], '%d.%m.%Y')))
+
+# Функции, которые процессы analysis_worker.py выполняют по имени из очереди задач
+JOB_FUNCTIONS = {func.__name__: func for func in (plan_workbook, parse_sheet)}
@@ -0,0 +1,303 @@
+"""Локальная заглушка Telegram Bot API для проверки бота без сети
+
+Сервер отвечает на основные методы Bot API, доставляет боту входящие
+сообщения через getUpdates или вебхук и запоминает ответы бота, чтобы
+можно было измерить задержку ответа.
+
+Запуск заглушки с нагрузкой (бот запускается отдельно):
+
+    python -m tools.fake_telegram --port 8081 --chats 50 --messages 4
+
+    TELEGRAM_BOT_TOKEN=123:test TELEGRAM_API_BASE_URL=http://127.0.0.1:8081 \\
+        BOT_MODE=webhook WEBHOOK_URL=http://127.0.0.1:8443 python bot_full.py
+"""
+import argparse
+import itertools
+import json
+import statistics
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeTelegram:
+    """Состояние заглушки: очередь обновлений, файлы и ответы бота"""
+
+    def __init__(self, host='127.0.0.1', port=8081, webhook_connections=40):
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.fake = self
+        self.base_url = f"http://{host}:{self.server.server_address[1]}"
+        self.webhook_url = None
+        self.webhook_secret = None
+        self.bot_ready = threading.Event()
+        self.files = {}
+        self.sent = []
+        self._updates = []
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._cond = threading.Condition()
+        self._delivery = ThreadPoolExecutor(max_workers=webhook_connections)
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self._delivery.shutdown(wait=False)
+
+    # === Входящие сообщения для бота ===
+
+    def send_text(self, chat_id, text):
+        """Отправляет боту текстовое сообщение от пользователя chat_id"""
+        message = self._message(chat_id)
+        message['text'] = text
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        return self._push({'message': message})
+
+    def send_document(self, chat_id, file_name, data, media_group_id=None):
+        """Отправляет боту файл от пользователя chat_id"""
+        file_id = f"file{len(self.files) + 1}"
+        self.files[file_id] = data
+        message = self._message(chat_id)
+        message['document'] = {
+            'file_id': file_id,
+            'file_unique_id': f"u{abs(hash(data)) % 10 ** 12}",
+            'file_name': file_name,
+            'file_size': len(data),
+        }
+        if media_group_id:
+            message['media_group_id'] = media_group_id
+        return self._push({'message': message})
+
+    def press_button(self, chat_id, data, message=None):
+        """Нажатие кнопки встроенной клавиатуры с callback_data data под сообщением бота message"""
+        message = message or self._message(chat_id)
+        return self._push({'callback_query': {
+            'id': str(next(self._message_ids)),
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': f"User {chat_id}"},
+            'message': message,
+            'chat_instance': str(chat_id),
+            'data': data,
+        }})
+
+    def replies(self, chat_id):
+        with self._cond:
+            return [item for item in self.sent if item['chat_id'] == chat_id]
+
+    def wait_replies(self, chat_id, count, timeout=60):
+        """Ждет count ответов бота в чат и возвращает их"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while len([item for item in self.sent if item['chat_id'] == chat_id]) < count:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return [item for item in self.sent if item['chat_id'] == chat_id]
+
+    def _message(self, chat_id):
+        return {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': f"User {chat_id}"},
+        }
+
+    def _push(self, update):
+        update['update_id'] = next(self._update_ids)
+        sent_at = time.perf_counter()
+        if self.webhook_url:
+            self._delivery.submit(self._deliver, update)
+        else:
+            with self._cond:
+                self._updates.append(update)
+                self._cond.notify_all()
+        return sent_at
+
+    def _deliver(self, update):
+        request = urllib.request.Request(
+            self.webhook_url, data=json.dumps(update).encode('utf-8'),
+            headers={'Content-Type': 'application/json'}
+        )
+        if self.webhook_secret:
+            request.add_header('X-Telegram-Bot-Api-Secret-Token', self.webhook_secret)
+        try:
+            urllib.request.urlopen(request, timeout=30).read()
+        except OSError as e:
+            print(f"❌ Не удалось доставить обновление {update['update_id']}: {e}")
+
+    # === Методы Bot API ===
+
+    def call(self, method, params):
+        handler = getattr(self, f"api_{method.lower()}", None)
+        if handler is None:
+            return True
+        return handler(params)
+
+    def api_getme(self, params):
+        self.bot_ready.set()
+        return {'id': 1, 'is_bot': True, 'first_name': 'Fake', 'username': 'fake_bot',
+                'can_join_groups': False, 'can_read_all_group_messages': False,
+                'supports_inline_queries': False}
+
+    def api_setwebhook(self, params):
+        self.webhook_url = params.get('url')
+        self.webhook_secret = params.get('secret_token')
+        self.bot_ready.set()
+        return True
+
+    def api_deletewebhook(self, params):
+        self.webhook_url = None
+        return True
+
+    def api_getupdates(self, params):
+        self.bot_ready.set()
+        offset = int(params.get('offset') or 0)
+        timeout = min(float(params.get('timeout') or 0), 5)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._updates = [u for u in self._updates if u['update_id'] >= offset]
+            while not self._updates and time.monotonic() < deadline:
+                self._cond.wait(deadline - time.monotonic())
+            return list(self._updates)
+
+    def api_getfile(self, params):
+        file_id = params['file_id']
+        return {'file_id': file_id, 'file_unique_id': file_id,
+                'file_size': len(self.files.get(file_id, b'')), 'file_path': f"documents/{file_id}"}
+
+    def api_sendmessage(self, params):
+        return self._record(params, text=params.get('text'), reply_markup=params.get('reply_markup'))
+
+    def api_senddocument(self, params):
+        document = params.get('document')
+        return self._record(params, document=document)
+
+    def api_editmessagetext(self, params):
+        return self._record(params, text=params.get('text'), reply_markup=params.get('reply_markup'), edited=True)
+
+    def _record(self, params, **payload):
+        chat_id = int(params['chat_id'])
+        message = self._message(chat_id)
+        message['from'] = {'id': 1, 'is_bot': True, 'first_name': 'Fake'}
+        if payload.get('text'):
+            message['text'] = payload['text']
+        with self._cond:
+            self.sent.append({'chat_id': chat_id, 'time': time.perf_counter(), 'message': message, **payload})
+            self._cond.notify_all()
+        return message
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        fake = self.server.fake
+        path = urlparse(self.path).path
+        if path.startswith('/file/'):
+            data = fake.files.get(path.rsplit('/', 1)[-1])
+            if data is None:
+                return self._reply(404, b'not found', 'text/plain')
+            return self._reply(200, data, 'application/octet-stream')
+        self._api(path, parse_qs(urlparse(self.path).query))
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length)
+        self._api(urlparse(self.path).path, self._parse_body(body))
+
+    def _parse_body(self, body):
+        content_type = self.headers.get('Content-Type', '')
+        if content_type.startswith('application/json'):
+            return json.loads(body or b'{}')
+        if content_type.startswith('multipart/form-data'):
+            message = BytesParser(policy=policy.default).parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+            params = {}
+            for part in message.iter_parts():
+                name = part.get_param('name', header='content-disposition')
+                filename = part.get_filename()
+                payload = part.get_payload(decode=True)
+                params[name] = {'filename': filename, 'data': payload} if filename else payload.decode('utf-8')
+            return params
+        return {key: values[-1] for key, values in parse_qs(body.decode('utf-8')).items()}
+
+    def _api(self, path, params):
+        params = {key: (value[-1] if isinstance(value, list) else value) for key, value in params.items()}
+        method = path.rsplit('/', 1)[-1]
+        try:
+            result = self.server.fake.call(method, params)
+            payload = {'ok': True, 'result': result}
+        except Exception as e:
+            payload = {'ok': False, 'error_code': 400, 'description': str(e)}
+        self._reply(200, json.dumps(payload).encode('utf-8'), 'application/json')
+
+    def _reply(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def run_load(fake, chats, messages, text, timeout):
+    """Шлет messages сообщений в каждый из chats чатов и измеряет задержку ответа"""
+    latencies = []
+    started = time.perf_counter()
+    sent = {}
+    for round_idx in range(messages):
+        for chat_id in range(1, chats + 1):
+            sent.setdefault(chat_id, []).append(fake.send_text(chat_id, text))
+
+    for chat_id, sent_times in sent.items():
+        replies = fake.wait_replies(chat_id, len(sent_times), timeout=timeout)
+        for sent_at, reply in zip(sent_times, replies):
+            latencies.append(reply['time'] - sent_at)
+    elapsed = time.perf_counter() - started
+
+    if not latencies:
+        print("❌ Бот не ответил ни на одно сообщение")
+        return
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"Ответов: {len(latencies)} из {chats * messages} за {elapsed:.2f} с "
+          f"({len(latencies) / elapsed:.0f}/с)")
+    print(f"Задержка: p50 {statistics.median(latencies) * 1000:.1f} мс, p95 {p95 * 1000:.1f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная заглушка Telegram Bot API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--chats', type=int, default=0, help="число чатов для нагрузки (0 - только сервер)")
+    parser.add_argument('--messages', type=int, default=1, help="сообщений на чат")
+    parser.add_argument('--text', default='/help')
+    parser.add_argument('--timeout', type=float, default=60)
+    args = parser.parse_args()
+
+    fake = FakeTelegram(args.host, args.port).start()
+    print(f"🧪 Заглушка Bot API: {fake.base_url}")
+
+    if not args.chats:
+        threading.Event().wait()
+
+    print("⏳ Жду подключения бота...")
+    fake.bot_ready.wait()
+    # Даем боту завершить запуск (setWebhook / первый getUpdates)
+    time.sleep(1)
+    run_load(fake, args.chats, args.messages, args.text, args.timeout)
+    fake.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+class WaitStats:
+    """Статистика ожидания обновлений в очереди перед обработкой"""
+
+    def __init__(self, window=1000, log_every=500):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.log_every = log_every
+        self._recent = deque(maxlen=window)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self._recent.append(seconds)
+        if self.log_every and self.count % self.log_every == 0:
+            logger.info("Ожидание обновлений: %s", self.format())
+
+    def snapshot(self):
+        """Количество, среднее, p50/p95 по последним наблюдениям и максимум (в секундах)"""
+        recent = sorted(self._recent)
+        if not recent:
+            return {'count': 0, 'avg': 0.0, 'p50': 0.0, 'p95': 0.0, 'max': 0.0}
+        return {
+            'count': self.count,
+            'avg': self.total / self.count,
+            'p50': recent[len(recent) // 2],
+            'p95': recent[min(len(recent) - 1, int(len(recent) * 0.95))],
+            'max': self.max,
+        }
+
+    def format(self):
+        stats = self.snapshot()
+        return (f"{stats['count']} шт., среднее {stats['avg'] * 1000:.1f} мс, "
+                f"p50 {stats['p50'] * 1000:.1f} мс, p95 {stats['p95'] * 1000:.1f} мс, "
+                f"макс {stats['max'] * 1000:.1f} мс")
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """Параллельная обработка обновлений с сохранением порядка внутри чата
+
+    Обновления разных чатов обрабатываются одновременно, но не более
+    ``max_concurrent`` сразу; обновления одного чата выполняются строго по
+    очереди, так что загрузка файла и следующее нажатие кнопки не
+    перепутаются. ``max_pending`` ограничивает общее число обновлений,
+    принятых в работу (ожидающих и выполняющихся).
+    """
+
+    def __init__(self, max_concurrent=16, max_pending=1024):
+        super().__init__(max(max_pending, max_concurrent, 2))
+        self.max_concurrent = max_concurrent
+        self.wait_stats = WaitStats()
+        self._active = None
+        self._chat_locks = {}
+
+    async def initialize(self):
+        self._active = asyncio.Semaphore(self.max_concurrent)
+
+    async def shutdown(self):
+        self._chat_locks.clear()
+
+    @property
+    def pending_chats(self):
+        """Число чатов, у которых есть обновления в работе"""
+        return len(self._chat_locks)
+
+    async def do_process_update(self, update, coroutine):
+        received = time.perf_counter()
+        chat_id = self._chat_key(update)
+
+        if chat_id is None:
+            async with self._active:
+                self.wait_stats.observe(time.perf_counter() - received)
+                await coroutine
+            return
+
+        lock, users = self._chat_locks.get(chat_id, (None, 0))
+        if lock is None:
+            lock = asyncio.Lock()
+        self._chat_locks[chat_id] = (lock, users + 1)
+        try:
+            # Сначала очередь чата, затем общий лимит: ожидающие своей очереди
+            # обновления одного чата не занимают слоты других чатов
+            async with lock:
+                async with self._active:
+                    self.wait_stats.observe(time.perf_counter() - received)
+                    await coroutine
+        finally:
+            lock, users = self._chat_locks[chat_id]
+            if users > 1:
+                self._chat_locks[chat_id] = (lock, users - 1)
+            else:
+                del self._chat_locks[chat_id]
+
+    @staticmethod
+    def _chat_key(update):
+        if not isinstance(update, Update):
+            return None
+        if update.effective_chat is not None:
+            return update.effective_chat.id
+        if update.effective_user is not None:
+            return update.effective_user.id
+        return None
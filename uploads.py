@@ -0,0 +1,118 @@
+import logging
+import mmap
+import os
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# Форматы Excel и их сигнатуры: .xlsx - ZIP-архив, .xls - составной документ OLE2
+XLSX, XLS = 'xlsx', 'xls'
+XLSX_MAGIC = b'PK\x03\x04'
+XLS_MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+
+
+class FileTooLargeError(Exception):
+    """Файл больше разрешенного размера"""
+
+
+def sniff_format(data):
+    """Формат Excel по первым байтам содержимого: XLSX, XLS или None"""
+    head = bytes(data[:len(XLS_MAGIC)])
+    if head.startswith(XLSX_MAGIC):
+        return XLSX
+    if head.startswith(XLS_MAGIC):
+        return XLS
+    return None
+
+
+def check_size(size, max_bytes):
+    if max_bytes and size and size > max_bytes:
+        raise FileTooLargeError(f"Файл больше {max_bytes / 1024 / 1024:g} МБ")
+
+
+class Upload:
+    """Загруженный файл: содержимое без копирования и, если файл на диске, путь к нему
+
+    Скачанный файл отображается в память (mmap), ``data`` - memoryview на
+    отображение: хэш и сигнатура считаются без копии в куче. Процессам
+    анализа передается ``source`` - путь к файлу, а не его содержимое.
+    Файл удаляется при ``close()``.
+    """
+
+    def __init__(self, content=None, path=None):
+        self.path = path
+        self._content = content
+        self._mapping = None
+        if path is not None and os.path.getsize(path):
+            with open(path, 'rb') as f:
+                self._mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.data = memoryview(self._mapping if self._mapping is not None else content or b'')
+        self.format = sniff_format(self.data)
+
+    @property
+    def size(self):
+        return self.data.nbytes
+
+    @property
+    def source(self):
+        """Что передать в процесс анализа: путь к файлу или байты"""
+        return self.path if self.path is not None else self._content
+
+    def close(self):
+        self.data.release()
+        if self._mapping is not None:
+            self._mapping.close()
+            self._mapping = None
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except OSError as e:
+                logger.warning("Не удалось удалить временный файл %s: %s", self.path, e)
+            self.path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+async def download_upload(document, directory, max_bytes=0):
+    """Скачивает документ Telegram во временный файл в directory
+
+    Размер проверяется до скачивания (по данным Telegram) и после него.
+    """
+    check_size(document.file_size, max_bytes)
+    telegram_file = await document.get_file()
+    check_size(telegram_file.file_size, max_bytes)
+
+    fd, path = tempfile.mkstemp(suffix='.upload', dir=directory)
+    os.close(fd)
+    try:
+        await telegram_file.download_to_drive(path)
+        check_size(os.path.getsize(path), max_bytes)
+        with open(path, 'rb') as f:
+            file_format = sniff_format(f.read(len(XLS_MAGIC)))
+        if file_format is not None:
+            # openpyxl открывает файл по пути, только если знает его расширение
+            renamed = f"{os.path.splitext(path)[0]}.{file_format}"
+            os.replace(path, renamed)
+            path = renamed
+        return Upload(path=path)
+    except BaseException:
+        os.remove(path)
+        raise
+
+
+async def download_spooled(document, max_memory, directory, max_bytes=0):
+    """Скачивает документ Telegram в SpooledTemporaryFile (для архивов)"""
+    check_size(document.file_size, max_bytes)
+    telegram_file = await document.get_file()
+    output = tempfile.SpooledTemporaryFile(max_size=max_memory, dir=directory)
+    try:
+        await telegram_file.download_to_memory(out=output)
+    except BaseException:
+        output.close()
+        raise
+    output.seek(0)
+    return output